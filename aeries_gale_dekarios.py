@@ -1,32 +1,35 @@
 from kiss_utils import get_kiss_entries
-from aeries_gale_dekarios_uuids import pop_one_uuid, pop_n_uuids
+from aeries_gale_dekarios_uuids import pop_one_uuid, pop_n_uuids, uuid_allocator
 from kiss_data import ast_kiss_data, wyll_kiss_data, gale_last_kiss_data
 from dialog_tree_objects import NewDialogNode, NewTaggedText, NewTagTexts,NewTagText
 from kiss_edits import KissEdits, DialogTextEntry
 from dialog_and_timeline_utils import GaleHugCinematicContext, DialogAndTimelineContext, add_kisses, ShadowheartHugCinematicContext, add_timeline_nodes_for_companion_response
 from companion_utils import companion_REALLY_tags
-
-aeries_gale_context = DialogAndTimelineContext(
-    timeline_path = r"Y:\bg3\multitool\UnpackedMods\Gustav\Public\GustavDev\Timeline\Generated\Gale_InParty2_Nested_RomanticFeelings.lsf.lsx",
-    scene_path = r"Y:\bg3\multitool\UnpackedMods\Gustav\Public\GustavDev\Timeline\Generated\Gale_InParty2_Nested_RomanticFeelings_Scene.lsf.lsx",
-    dialog_path = r"Y:\bg3\multitool\UnpackedMods\Gustav\Mods\GustavDev\Story\DialogsBinary\Companions\Gale_InParty2_Nested_RomanticFeelings.lsf.lsx",
-    pop_one_uuid=pop_one_uuid,
-    pop_n_uuids=pop_n_uuids,
-)
-new_post_kiss_response_node = aeries_gale_context.pop_one_uuid()
-
-new_leave_node = aeries_gale_context.pop_one_uuid()
-modded_kisses_entry_dialog_node_uuid= aeries_gale_context.pop_one_uuid()
-aeries_kiss_edits = KissEdits(
-    modded_kisses_entry_dialog_node_uuid=modded_kisses_entry_dialog_node_uuid,
-    companion_response_node_uuid=pop_one_uuid(),
-    modded_kiss_response_destination_node_uuid=new_post_kiss_response_node,
-    global_flags_for_modded_kisses=[],
-    companion_REALLY_tag=companion_REALLY_tags["gale"],
-    existing_companion_leave_node_uuid=new_leave_node,
-)
+from pak_utils import PakBuilder, virtual_path_for
 
 def run():
+    # everything that loads trees or hands out uuids happens in here, worker processes re-import this module
+    aeries_gale_context = DialogAndTimelineContext(
+        timeline_path = r"Y:\bg3\multitool\UnpackedMods\Gustav\Public\GustavDev\Timeline\Generated\Gale_InParty2_Nested_RomanticFeelings.lsf.lsx",
+        scene_path = r"Y:\bg3\multitool\UnpackedMods\Gustav\Public\GustavDev\Timeline\Generated\Gale_InParty2_Nested_RomanticFeelings_Scene.lsf.lsx",
+        dialog_path = r"Y:\bg3\multitool\UnpackedMods\Gustav\Mods\GustavDev\Story\DialogsBinary\Companions\Gale_InParty2_Nested_RomanticFeelings.lsf.lsx",
+        pop_one_uuid=pop_one_uuid,
+        pop_n_uuids=pop_n_uuids,
+    )
+    uuid_allocator.assert_no_collisions(trees=[aeries_gale_context.timeline_tree, aeries_gale_context.scene_tree, aeries_gale_context.dialog_tree])
+    new_post_kiss_response_node = aeries_gale_context.pop_one_uuid()
+
+    new_leave_node = aeries_gale_context.pop_one_uuid()
+    modded_kisses_entry_dialog_node_uuid= aeries_gale_context.pop_one_uuid()
+    aeries_kiss_edits = KissEdits(
+        modded_kisses_entry_dialog_node_uuid=modded_kisses_entry_dialog_node_uuid,
+        companion_response_node_uuid=pop_one_uuid(),
+        modded_kiss_response_destination_node_uuid=new_post_kiss_response_node,
+        global_flags_for_modded_kisses=[],
+        companion_REALLY_tag=companion_REALLY_tags["gale"],
+        existing_companion_leave_node_uuid=new_leave_node,
+    )
+
     all_kisses = get_kiss_entries(
         kiss_datas=[ast_kiss_data, wyll_kiss_data, gale_last_kiss_data],
         print_info=True,
@@ -202,9 +205,16 @@ def run():
         phase_index_to_copy=phase_index_to_copy
     )
 
-    aeries_gale_context.timeline_tree.write_tree(output_file_path=r"Y:\bg3\mycode\galeromantic_timeline.lsx")
-    aeries_gale_context.scene_tree.write_tree(output_file_path=r"Y:\bg3\mycode\galeromantic_timeline_scene.lsx")
-    aeries_gale_context.dialog_tree.write_tree(output_file_path=r"Y:\bg3\mycode\galeromantic_dialog.lsx")
+    aeries_gale_context.timeline_tree.write_tree(output_file_path=r"Y:\bg3\mycode\galeromantic_timeline.lsx", incremental=True)
+    aeries_gale_context.scene_tree.write_tree(output_file_path=r"Y:\bg3\mycode\galeromantic_timeline_scene.lsx", incremental=True)
+    aeries_gale_context.dialog_tree.write_tree(output_file_path=r"Y:\bg3\mycode\galeromantic_dialog.lsx", incremental=True)
+
+    pak = PakBuilder()
+    pak.add_tree(virtual_path_for(aeries_gale_context.timeline_path), aeries_gale_context.timeline_tree)
+    pak.add_tree(virtual_path_for(aeries_gale_context.scene_path), aeries_gale_context.scene_tree)
+    pak.add_tree(virtual_path_for(aeries_gale_context.dialog_path), aeries_gale_context.dialog_tree)
+    pak.write(output_file_path=r"Y:\bg3\mycode\galeromantic.pak")
+    uuid_allocator.save_ledger()
 
 
 if __name__ == '__main__':
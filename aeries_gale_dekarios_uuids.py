@@ -1,3 +1,5 @@
+from uuid_allocator import UuidAllocator
+
 pregenned_uuids = ["bf891b0e-b6ad-44e8-a8e5-c67d6139676f",
 "0f443f04-164d-40ec-8273-b410ee5e46de",
 "688c77c0-52c8-46e4-8520-284aa042773b",
@@ -1322,19 +1324,13 @@ pregenned_uuids = ["bf891b0e-b6ad-44e8-a8e5-c67d6139676f",
 "662a2fc5-a32b-49a5-b771-cb675170f0e0",
 ]
 
-as_set = set(pregenned_uuids)
-assert len(as_set) == len(pregenned_uuids), "No dups"
+uuid_allocator = UuidAllocator(mod_name="aeries_gale_dekarios", pregenerated=pregenned_uuids)
 
 def pop_one_uuid() -> str:
-	global pregenned_uuids
-	assert len(pregenned_uuids) > 0
-	one = pregenned_uuids[0]
-	pregenned_uuids = pregenned_uuids[1:]
-	return one
+	return uuid_allocator.pop_one_uuid()
 
 def pop_n_uuids(n: int) -> list[str]:
-	global pregenned_uuids
-	assert len(pregenned_uuids) >= n
-	n_uuids = pregenned_uuids[:n]
-	pregenned_uuids = pregenned_uuids[n:]
-	return n_uuids
+	return uuid_allocator.pop_n_uuids(n=n)
+
+def uuid_for_key(key: str) -> str:
+	return uuid_allocator.uuid_for_key(key=key)
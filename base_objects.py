@@ -1,7 +1,11 @@
 from dataclasses import dataclass, field
 import xml.etree.ElementTree as ET
+import weakref
+from weakref import WeakKeyDictionary
 from typing import Self
-from typing import TypeAlias, Literal
+from typing import TypeAlias, Literal, TypeVar
+
+from lsx_incremental import mark_dirty
 
 # ================ TypeAliases ================
 Guid: TypeAlias = str
@@ -71,6 +75,235 @@ def create_comment(msg: str) -> ET.Element:
     return ET.Comment(text=f"Edited - {msg}")
 
 
+# ================ Child Positions ================
+# element -> position index per container, so inserting next to a known element doesn't need a list(...).index() scan.
+# positions below valid_until are known to be correct. inserts and removals only move valid_until back,
+# the tail gets repaired lazily the next time something past it is looked up.
+# all of them mark the container dirty for the incremental writer.
+
+@dataclass
+class ChildPositions:
+    positions: dict[ET.Element, int] = field(default_factory=dict)
+    valid_until: int = 0
+
+_child_positions: WeakKeyDictionary[ET.Element, ChildPositions] = WeakKeyDictionary()
+
+def _get_child_positions(container: ET.Element) -> ChildPositions:
+    child_positions = _child_positions.get(container)
+    if child_positions is None:
+        child_positions = ChildPositions()
+        _child_positions[container] = child_positions
+    return child_positions
+
+# ================ Tree Versions ================
+# replaced whenever the child helpers below add or remove an element, or a guid attribute gets a new value. caches of what's in a subtree keep the version they were built with and rebuild once it's been replaced.
+# a fresh object rather than a counter, so a cache that went through the tree cache never matches.
+# every parsed tree has its own, so edits in one tree leave the caches of the others alone. elements that aren't in
+# one (eg new nodes that haven't been inserted yet) share _detached_versions
+
+class TreeVersions:
+    __slots__ = ("structure", "guid")
+    def __init__(self) -> None:
+        self.structure = object()
+        self.guid = object()
+
+_detached_versions = TreeVersions()
+
+def _get_versions(element: ET.Element) -> TreeVersions:
+    parsed_indexes = _tree_indexes.get(element)
+    return _detached_versions if parsed_indexes is None else parsed_indexes.versions
+
+def structure_version(element: ET.Element) -> object:
+    return _get_versions(element).structure
+
+def guid_version(element: ET.Element) -> object:
+    return _get_versions(element).guid
+
+def set_attribute_value(node: ET.Element, attribute_element: ET.Element, new_value: str) -> None:
+    # attribute elements aren't tracked on their own, the node they're in gets rewritten
+    attribute_element.attrib["value"] = new_value
+    mark_dirty(node)
+    parsed_indexes = _tree_indexes.get(node)
+    if parsed_indexes is None:
+        if attribute_element.attrib.get("type") == "guid":
+            _detached_versions.guid = object()
+        return
+    if len(parsed_indexes.value_wrappers) > 0:
+        parsed_indexes.value_wrappers.clear()
+    if attribute_element.attrib.get("type") == "guid":
+        parsed_indexes.versions.guid = object()
+
+# ================ Parsed Indexes ================
+# the attribute map of each node and the children of each <children> container by node id, so wrappers don't have to
+# scan their element again. both are built the first time they're needed, most nodes never get a wrapper.
+# read_lsf_bytes fills in the children indexes while it parses since it has them anyway.
+# they're kept per tree in plain dicts, _tree_indexes finds the tree of a node or container without weak keys for
+# every element. it's only ever indexed, never iterated, so trees getting collected in the middle of a lookup is fine.
+# the child helpers below keep the indexes current, and add what gets inserted to the tree it's inserted into
+
+class ParsedIndexes:
+    # an attribute map is None until the node gets wrapped, a children index is None once its container was changed in
+    # a way that can't be followed
+    def __init__(self, attribute_indexes: dict[ET.Element, dict[str, ET.Element] | None], children_indexes: dict[ET.Element, dict[str, list[ET.Element]] | None]) -> None:
+        self.attribute_indexes = attribute_indexes
+        self.children_indexes = children_indexes
+        # number of children each index was built for, a container changed behind the helpers' back gets reindexed
+        self.children_index_sizes = {container: len(container) for container in children_indexes if children_indexes[container] is not None}
+        # wrapper class -> element -> wrapper, see cached_wrapper
+        self.wrappers: dict[type, dict[ET.Element, "BaseNode"]] = {}
+        self.value_wrappers: dict[type, dict[ET.Element, "BaseNode"]] = {}
+        self.versions = TreeVersions()
+
+# node or <children> container -> indexes of the tree it's in
+_tree_indexes: dict[ET.Element, ParsedIndexes] = {}
+
+def _drop_tree_indexes(parsed_indexes: ParsedIndexes) -> None:
+    # elements that were moved to another tree since belong to that one now
+    for elements in (parsed_indexes.attribute_indexes, parsed_indexes.children_indexes):
+        for element in elements:
+            if _tree_indexes.get(element) is parsed_indexes:
+                del _tree_indexes[element]
+
+def add_parsed_indexes(root: ET.Element, attribute_indexes: dict[ET.Element, dict[str, ET.Element] | None], children_indexes: dict[ET.Element, dict[str, list[ET.Element]] | None]) -> None:
+    parsed_indexes = ParsedIndexes(attribute_indexes, children_indexes)
+    _tree_indexes.update(dict.fromkeys(attribute_indexes, parsed_indexes))
+    _tree_indexes.update(dict.fromkeys(children_indexes, parsed_indexes))
+    weakref.finalize(root, _drop_tree_indexes, parsed_indexes)
+
+def index_tree(root: ET.Element) -> None:
+    add_parsed_indexes(root, dict.fromkeys(root.iter("node")), dict.fromkeys(root.iter("children")))
+
+def _add_to_tree(parsed_indexes: ParsedIndexes, parent: ET.Element, element: ET.Element) -> None:
+    # element was just inserted into parent, which is a node or container of this tree
+    if element.tag == "attribute":
+        attribute_elements = parsed_indexes.attribute_indexes.get(parent)
+        if attribute_elements is not None and "id" in element.attrib:
+            attribute_elements[element.attrib["id"]] = element
+        return
+    if element.tag == "children":
+        _tree_indexes[element] = parsed_indexes
+        parsed_indexes.children_indexes[element] = None
+    for node in element.iter("node"):
+        if _tree_indexes.get(node) is not parsed_indexes:
+            _tree_indexes[node] = parsed_indexes
+            parsed_indexes.attribute_indexes[node] = None
+        for child in node:
+            if child.tag == "children" and _tree_indexes.get(child) is not parsed_indexes:
+                _tree_indexes[child] = parsed_indexes
+                parsed_indexes.children_indexes[child] = None
+
+def _get_attribute_index(parsed_indexes: ParsedIndexes, element: ET.Element) -> dict[str, ET.Element]:
+    attribute_elements = parsed_indexes.attribute_indexes[element]
+    if attribute_elements is None:
+        attribute_elements = {x.attrib["id"]: x for x in element if x.tag == "attribute"}
+        parsed_indexes.attribute_indexes[element] = attribute_elements
+    return attribute_elements
+
+def _get_children_index(container: ET.Element) -> dict[str, list[ET.Element]]:
+    parsed_indexes = _tree_indexes.get(container)
+    children_index = None if parsed_indexes is None else parsed_indexes.children_indexes.get(container)
+    if children_index is None or parsed_indexes.children_index_sizes.get(container) != len(container):
+        children_index = {}
+        for child in container:
+            children_index.setdefault(child.attrib.get("id", ""), []).append(child)
+        if parsed_indexes is not None and container in parsed_indexes.children_indexes:
+            parsed_indexes.children_indexes[container] = children_index
+            parsed_indexes.children_index_sizes[container] = len(container)
+    return children_index
+
+def _drop_children_index(parsed_indexes: ParsedIndexes, container: ET.Element) -> None:
+    if container in parsed_indexes.children_indexes:
+        parsed_indexes.children_indexes[container] = None
+        parsed_indexes.children_index_sizes.pop(container, None)
+
+# ---------------- Wrapper Cache ----------------
+# getters that wrap the same parsed elements on every call hand out the wrapper they built last time instead.
+# a tree's wrappers are dropped once an element was added to or removed from it, and the ones that copied attribute
+# values when they were built also once any attribute in it got a new value. elements that aren't in a parsed tree get
+# a new wrapper every time
+
+T = TypeVar("T", bound="BaseNode")
+
+def cached_wrapper(element: ET.Element, wrapper_type: type[T], copies_values: bool = False) -> T:
+    parsed_indexes = _tree_indexes.get(element)
+    if parsed_indexes is None:
+        return wrapper_type(element)
+    wrappers_by_type = parsed_indexes.value_wrappers if copies_values else parsed_indexes.wrappers
+    wrappers = wrappers_by_type.get(wrapper_type)
+    if wrappers is None:
+        wrappers = wrappers_by_type[wrapper_type] = {}
+    wrapper = wrappers.get(element)
+    if wrapper is None:
+        wrapper = wrappers[element] = wrapper_type(element)
+    return wrapper
+
+def index_of_child(container: ET.Element, element: ET.Element) -> int:
+    child_positions = _get_child_positions(container)
+    position = child_positions.positions.get(element)
+    if position is not None and position < child_positions.valid_until:
+        if position < len(container) and container[position] is element:
+            return position
+        # container was changed without going through these helpers, start over
+        child_positions.valid_until = 0
+
+    for i in range(child_positions.valid_until, len(container)):
+        child = container[i]
+        child_positions.positions[child] = i
+        if child is element:
+            child_positions.valid_until = i + 1
+            return i
+    child_positions.valid_until = len(container)
+    raise ValueError(f"{element} is not a child of {container}")
+
+def _changed_structure(container: ET.Element, element: ET.Element, was_added: bool) -> ParsedIndexes | None:
+    mark_dirty(container)
+    parsed_indexes = _tree_indexes.get(container)
+    if parsed_indexes is None:
+        _detached_versions.structure = object()
+        return None
+    parsed_indexes.versions.structure = object()
+    if len(parsed_indexes.wrappers) > 0:
+        parsed_indexes.wrappers.clear()
+    if len(parsed_indexes.value_wrappers) > 0:
+        parsed_indexes.value_wrappers.clear()
+    if was_added:
+        _add_to_tree(parsed_indexes, container, element)
+    return parsed_indexes
+
+def insert_child(container: ET.Element, index: int, element: ET.Element) -> None:
+    if index < 0:
+        index = max(0, index + len(container))
+    index = min(index, len(container))
+    container.insert(index, element)
+    parsed_indexes = _changed_structure(container, element, was_added=True)
+    if parsed_indexes is not None:
+        _drop_children_index(parsed_indexes, container)
+    child_positions = _get_child_positions(container)
+    child_positions.valid_until = min(child_positions.valid_until, index)
+
+def append_child(container: ET.Element, element: ET.Element) -> None:
+    child_positions = _get_child_positions(container)
+    if child_positions.valid_until == len(container):
+        child_positions.positions[element] = len(container)
+        child_positions.valid_until += 1
+    container.append(element)
+    parsed_indexes = _changed_structure(container, element, was_added=True)
+    if parsed_indexes is not None:
+        children_index = parsed_indexes.children_indexes.get(container)
+        if children_index is not None and parsed_indexes.children_index_sizes.get(container) == len(container) - 1:
+            children_index.setdefault(element.attrib.get("id", ""), []).append(element)
+            parsed_indexes.children_index_sizes[container] = len(container)
+
+def remove_child(container: ET.Element, element: ET.Element) -> None:
+    index = index_of_child(container, element)
+    del container[index]
+    parsed_indexes = _changed_structure(container, element, was_added=False)
+    if parsed_indexes is not None:
+        _drop_children_index(parsed_indexes, container)
+    child_positions = _get_child_positions(container)
+    del child_positions.positions[element]
+    child_positions.valid_until = min(child_positions.valid_until, index)
+
 
 @dataclass
 class NewAttribute:
@@ -100,6 +333,8 @@ class NewAttribute:
 # existing node
 @dataclass
 class BaseNode:
+    # every wrapper class declares its fields as slots, there can be hundreds of thousands of them alive at once
+    __slots__ = ("_node", "_attribute_elements", "_children_element_container")
     _node: ET.Element
     _attribute_elements: dict[str, ET.Element]
     _children_element_container: ET.Element | None
@@ -107,29 +342,34 @@ class BaseNode:
     def __init__(self, element: ET.Element) -> None:
         assert isinstance(element, ET.Element), f"Wrong type {type(element)}"
         self._node = element
-        attributes = element.findall("attribute") or []
-        self._attribute_elements = { x.attrib["id"]: x for x in attributes}
+        parsed_indexes = _tree_indexes.get(element)
+        if parsed_indexes is not None and element in parsed_indexes.attribute_indexes:
+            # shared with every other wrapper of this element, attributes added through one show up in all of them
+            self._attribute_elements = _get_attribute_index(parsed_indexes, element)
+        else:
+            attributes = element.findall("attribute") or []
+            self._attribute_elements = { x.attrib["id"]: x for x in attributes}
         self._children_element_container = element.find("children")
 
     def add_child_node(self, node: ET.Element, child_index: int, debug_comment: str | None = None) -> None:
         if self._children_element_container is None:
             self._children_element_container = ET.Element("children")
-            self._node.append(self._children_element_container)
+            append_child(self._node, self._children_element_container)
 
         if child_index == -1:
-            self._children_element_container.append(node)
+            append_child(self._children_element_container, node)
         elif child_index < 0:
-            child_index += len(list(self._children_element_container))
-            self._children_element_container.insert(child_index, node)
+            child_index += len(self._children_element_container)
+            insert_child(self._children_element_container, child_index, node)
         else:
-            self._children_element_container.insert(child_index, node)
+            insert_child(self._children_element_container, child_index, node)
         comment_str = "Added child node"
         if debug_comment is not None:
             comment_str = f"{debug_comment} - {comment_str}"
         if child_index == -1:
-            self._children_element_container.append(create_comment(comment_str))
+            append_child(self._children_element_container, create_comment(comment_str))
         else:
-            self._children_element_container.insert(child_index, create_comment(comment_str))
+            insert_child(self._children_element_container, child_index, create_comment(comment_str))
 
     def get_attribute_value_nonnil(self, name: str) -> str:
         element = self._attribute_elements.get(name)
@@ -155,38 +395,43 @@ class BaseNode:
             self.update_value_for_attribute(name=attr.id_str, new_value=attr.value, debug_comment=attr.debug_comment)
         else:
             new_element = attr.create_attribute_element()
-            any_element = list(self._attribute_elements.values())[0]
-            any_element_index = list(self._node).index(any_element)
-            self._node.insert(any_element_index + 1, new_element)
+            any_element = next(iter(self._attribute_elements.values()))
+            any_element_index = index_of_child(self._node, any_element)
+            insert_child(self._node, any_element_index + 1, new_element)
             comment_str = "Added new attribute"
             if attr.debug_comment is not None:
                 comment_str = f"{attr.debug_comment} - {comment_str}"
-            self._node.insert(any_element_index + 1, create_comment(comment_str))
+            insert_child(self._node, any_element_index + 1, create_comment(comment_str))
             self._attribute_elements[attr.id_str] = new_element
 
     def _delete_child(self, child_element: ET.Element) -> None:
-        child_index = list(self._children_element_container).index(child_element)
-        self._children_element_container.remove(child_element)
-        self._children_element_container.insert(child_index+1, create_comment(msg=f"Deleted child element {child_element.attrib}"))
+        child_index = index_of_child(self._children_element_container, child_element)
+        remove_child(self._children_element_container, child_element)
+        insert_child(self._children_element_container, child_index+1, create_comment(msg=f"Deleted child element {child_element.attrib}"))
 
     def _num_children(self) -> int:
-        return len(list(self._children_element_container))
+        return len(self._children_element_container)
     
     def _get_children_elements(self, child_type: str | None = None) -> list[ET.Element]:
         if self._children_element_container is None:
             return []
-        return [x for x in self._children_element_container if child_type is None or child_type == x.attrib.get("id", "")]
+        if child_type is None:
+            return list(self._children_element_container)
+        return list(_get_children_index(self._children_element_container).get(child_type, ()))
     
+    def _set_attribute_value(self, attribute_element: ET.Element, new_value: str) -> None:
+        set_attribute_value(self._node, attribute_element, new_value)
+
     def update_value_for_attribute(self, name: str, new_value: str, debug_comment: str | None = None) -> None:
         attribute_node = self._get_attribute_node(name=name)
         old_value = attribute_node.attrib["value"]
-        attribute_node.attrib["value"] = new_value
+        self._set_attribute_value(attribute_node, new_value)
 
-        attribute_node_index = list(self._node).index(attribute_node)
+        attribute_node_index = index_of_child(self._node, attribute_node)
         comment_str = f"Updated attribute {name} value from {old_value} to {new_value}"
         if debug_comment is not None:
             comment_str = f"{debug_comment} - {comment_str}"
-        self._node.insert(attribute_node_index, create_comment(comment_str))
+        insert_child(self._node, attribute_node_index, create_comment(comment_str))
         self._attribute_elements[name] = attribute_node
 
 
@@ -0,0 +1,196 @@
+import hashlib
+import io
+import marshal
+import os
+import pickle
+import shutil
+import sys
+import types
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Callable, TypeVar
+
+from base_objects import index_tree
+
+# bump this when the pickled layout changes in a way the source fingerprint won't catch
+CACHE_VERSION = 3
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tree_cache")
+# compressed pak entries, see pak_utils
+PAK_ENTRY_CACHE_DIR_NAME = "pak_entries"
+
+T = TypeVar("T")
+
+@dataclass
+class CacheKey:
+    file_path: str
+    size: int
+    mtime_ns: int
+    content_hash: str
+    code_fingerprint: str
+
+# ================ Helpers ================
+
+def _hash_file(file_path: str) -> str:
+    h = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _local_modules(module_name: str) -> list[str]:
+    # the module and every module next to this one it uses, directly or through another one. anything they define can
+    # end up in a snapshot, eg the LsxSource from lsx_incremental or the elements lsx_loader/lsf_parser built
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    ret: set[str] = set()
+    pending = [module_name]
+    while len(pending) > 0:
+        name = pending.pop()
+        module = sys.modules.get(name)
+        module_file = getattr(module, "__file__", None)
+        if name in ret or module_file is None or os.path.dirname(os.path.abspath(module_file)) != local_dir:
+            continue
+        ret.add(name)
+        for value in vars(module).values():
+            dependency = value.__name__ if isinstance(value, types.ModuleType) else getattr(value, "__module__", None)
+            if isinstance(dependency, str):
+                pending.append(dependency)
+    return sorted(ret)
+
+_code_fingerprints: dict[str, str] = {}
+
+def _code_fingerprint(cls: type) -> str:
+    # the snapshot holds pickled wrapper objects, so any change to the code that built them invalidates it
+    module_name = cls.__module__
+    if module_name not in _code_fingerprints:
+        h = hashlib.sha1(str(CACHE_VERSION).encode())
+        for name in _local_modules(module_name):
+            h.update(name.encode())
+            with open(sys.modules[name].__file__, "rb") as f:
+                h.update(f.read())
+        _code_fingerprints[module_name] = h.hexdigest()
+    return _code_fingerprints[module_name]
+
+def _snapshot_path(file_path: str, cls: type) -> str:
+    name = hashlib.sha1(f"{cls.__module__}.{cls.__qualname__}:{file_path}".encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"{name}.pickle")
+
+# ================ Snapshot Format ================
+# the xml tree is stored flat (preorder tags, attributes, child counts, text, tail) with marshal, rebuilding it from that
+# is faster than both ET.parse and unpickling Elements. the wrapper objects get pickled with every Element they
+# reference replaced by its preorder index, so their indexes don't need to be rebuilt either
+
+class _SnapshotPickler(pickle.Pickler):
+    def __init__(self, file: io.BufferedWriter, element_indexes: dict[int, int]) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._element_indexes = element_indexes
+
+    def persistent_id(self, obj: object) -> int | None:
+        if isinstance(obj, ET.Element):
+            return self._element_indexes.get(id(obj))
+        return None
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file: io.BufferedReader, elements: list[ET.Element]) -> None:
+        super().__init__(file)
+        self._elements = elements
+
+    def persistent_load(self, pid: int) -> ET.Element:
+        return self._elements[pid]
+
+def _find_root(value: object) -> ET.Element:
+    tree_ref = getattr(value, "_tree_ref", None)
+    assert isinstance(tree_ref, ET.ElementTree), f"{type(value)} has no _tree_ref to snapshot"
+    return tree_ref.getroot()
+
+def _flatten_tree(root: ET.Element) -> tuple[list[ET.Element], tuple]:
+    elements = list(root.iter())
+    tags = []
+    for e in elements:
+        assert isinstance(e.tag, str), "comments and processing instructions can't be snapshotted"
+        tags.append(e.tag)
+    return elements, (
+        tags,
+        [e.attrib for e in elements],
+        [len(e) for e in elements],
+        [e.text for e in elements],
+        [e.tail for e in elements],
+    )
+
+def _build_tree(flat_tree: tuple) -> list[ET.Element]:
+    tags, attribs, child_counts, texts, tails = flat_tree
+    elements = [ET.Element(tag, attrib) for tag, attrib in zip(tags, attribs)]
+    # stack of [parent, children left to attach]
+    stack: list[list] = []
+    for element, child_count, text, tail in zip(elements, child_counts, texts, tails):
+        element.text = text
+        element.tail = tail
+        if len(stack) > 0:
+            top = stack[-1]
+            top[0].append(element)
+            top[1] -= 1
+            if top[1] == 0:
+                stack.pop()
+        if child_count > 0:
+            stack.append([element, child_count])
+    return elements
+
+def _write_snapshot(snapshot_path: str, key: CacheKey, value: object) -> None:
+    elements, flat_tree = _flatten_tree(_find_root(value))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # marshal.load on a file object reads a few bytes at a time, store the size so it can be read in one go
+        flat_tree_bytes = marshal.dumps(flat_tree)
+        f.write(len(flat_tree_bytes).to_bytes(8, "little"))
+        f.write(flat_tree_bytes)
+        _SnapshotPickler(f, element_indexes={id(e): i for i, e in enumerate(elements)}).dump(value)
+    os.replace(tmp_path, snapshot_path)
+
+def _read_snapshot_value(f: io.BufferedReader) -> object:
+    size = int.from_bytes(f.read(8), "little")
+    elements = _build_tree(marshal.loads(f.read(size)))
+    index_tree(elements[0])
+    return _SnapshotUnpickler(f, elements=elements).load()
+
+# ================ Snapshot Cache ================
+
+def load_cached(file_path: str, cls: type[T], build: Callable[[], T]) -> T:
+    # build() has to return a tree wrapper with a _tree_ref, eg TimelineTree.
+    # returns a fresh copy of whatever build() returned for this file last time, as long as the file didn't change.
+    # size + mtime are checked first, the content hash only when those differ (eg the file got touched or copied)
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    code_fingerprint = _code_fingerprint(cls)
+    snapshot_path = _snapshot_path(file_path, cls)
+
+    content_hash = None
+    if os.path.exists(snapshot_path):
+        try:
+            with open(snapshot_path, "rb") as f:
+                key: CacheKey = pickle.load(f)
+                if key.file_path == file_path and key.code_fingerprint == code_fingerprint:
+                    if key.size == stat.st_size and key.mtime_ns == stat.st_mtime_ns:
+                        return _read_snapshot_value(f)
+                    content_hash = _hash_file(file_path)
+                    if key.content_hash == content_hash:
+                        value = _read_snapshot_value(f)
+                        _write_snapshot(snapshot_path, CacheKey(file_path, stat.st_size, stat.st_mtime_ns, content_hash, code_fingerprint), value)
+                        return value
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+            print(f"Ignoring unreadable tree cache for {file_path}: {e}")
+
+    value = build()
+    if content_hash is None:
+        content_hash = _hash_file(file_path)
+    _write_snapshot(snapshot_path, CacheKey(file_path, stat.st_size, stat.st_mtime_ns, content_hash, code_fingerprint), value)
+    return value
+
+def clear_cache() -> None:
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith(".pickle"):
+            os.remove(os.path.join(CACHE_DIR, name))
+        elif name == PAK_ENTRY_CACHE_DIR_NAME:
+            shutil.rmtree(os.path.join(CACHE_DIR, name))
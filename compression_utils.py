@@ -0,0 +1,344 @@
+import struct
+import zlib
+
+try:
+    import lz4.block
+except ImportError:
+    # optional, the plain python lz4 below is used without it
+    lz4 = None
+
+# compression flags as stored in lsf/pak headers, low nibble is the method, high nibble the level
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZ4 = 2
+COMPRESSION_ZSTD = 3
+
+COMPRESSION_LEVEL_FAST = 0x10
+COMPRESSION_LEVEL_DEFAULT = 0x20
+COMPRESSION_LEVEL_MAX = 0x40
+
+# what the writers use unless told otherwise. without the lz4 package zlib is both faster and smaller than the plain
+# python lz4 compressor, and LSLib and the game read either
+DEFAULT_COMPRESSION_METHOD = COMPRESSION_LZ4 if lz4 is not None else COMPRESSION_ZLIB
+
+LZ4_FRAME_MAGIC = 0x184D2204
+# frames we write use independent blocks of at most 64KB
+_LZ4_FRAME_BLOCK_SIZE = 1 << 16
+_LZ4_MAX_OFFSET = 0xFFFF
+# the last 5 bytes are always literals and the last match has to start 12 bytes before the end
+_LZ4_LAST_LITERALS = 5
+_LZ4_MATCH_FIND_LIMIT = 12
+
+def compression_method(compression_flags: int) -> int:
+    return compression_flags & 0x0F
+
+def compression_level(compression_flags: int) -> int:
+    return compression_flags & 0xF0
+
+# ================ LZ4 ================
+# plain python, lz4 isn't a dependency of the scripts. the lz4 package is used instead when it's installed
+
+def _lz4_block_decompress_into(src: bytes | memoryview, dst: bytearray) -> None:
+    # appends the decompressed block to dst, matches can reach back into whatever dst already holds
+    # (that's how linked frame blocks work)
+    i = 0
+    n = len(src)
+    while i < n:
+        token = src[i]
+        i += 1
+        literal_length = token >> 4
+        if literal_length == 15:
+            while True:
+                b = src[i]
+                i += 1
+                literal_length += b
+                if b != 255:
+                    break
+        if literal_length > 0:
+            dst += src[i:i + literal_length]
+            i += literal_length
+        if i >= n:
+            # the last sequence only has literals
+            break
+
+        offset = src[i] | (src[i + 1] << 8)
+        i += 2
+        match_length = token & 15
+        if match_length == 15:
+            while True:
+                b = src[i]
+                i += 1
+                match_length += b
+                if b != 255:
+                    break
+        match_length += 4
+        start = len(dst) - offset
+        assert offset > 0 and start >= 0, f"Invalid lz4 match offset {offset}"
+        if offset >= match_length:
+            dst += dst[start:start + match_length]
+        else:
+            # overlapping match, repeats the last offset bytes
+            pattern = dst[start:]
+            repeats, remainder = divmod(match_length, offset)
+            dst += pattern * repeats + pattern[:remainder]
+
+def lz4_block_decompress(src: bytes, uncompressed_size: int) -> bytes:
+    if lz4 is not None:
+        ret = lz4.block.decompress(src, uncompressed_size=uncompressed_size)
+        assert len(ret) == uncompressed_size, f"lz4 block decompressed to {len(ret)} bytes, expected {uncompressed_size}"
+        return ret
+    dst = bytearray()
+    _lz4_block_decompress_into(src, dst)
+    assert len(dst) == uncompressed_size, f"lz4 block decompressed to {len(dst)} bytes, expected {uncompressed_size}"
+    return bytes(dst)
+
+def lz4_frame_decompress(src: bytes) -> bytes:
+    view = memoryview(src)
+    dst = bytearray()
+    pos = 0
+    while pos < len(src):
+        (magic,) = struct.unpack_from("<I", src, pos)
+        if magic & 0xFFFFFFF0 == 0x184D2A50:
+            # skippable frame
+            (size,) = struct.unpack_from("<I", src, pos + 4)
+            pos += 8 + size
+            continue
+        assert magic == LZ4_FRAME_MAGIC, f"Not an lz4 frame: {magic:#x}"
+        flags = src[pos + 4]
+        assert flags >> 6 == 1, f"Unsupported lz4 frame version {flags >> 6}"
+        has_block_checksum = flags & 0x10 != 0
+        has_content_size = flags & 0x08 != 0
+        has_content_checksum = flags & 0x04 != 0
+        has_dict_id = flags & 0x01 != 0
+        # BD, 4 is 64KB up to 7 for 4MB
+        max_block_size = 1 << (8 + 2 * ((src[pos + 5] >> 4) & 0x07))
+        # magic, FLG, BD, optional content size and dict id, header checksum
+        pos += 6 + (8 if has_content_size else 0) + (4 if has_dict_id else 0) + 1
+        while True:
+            (block_size,) = struct.unpack_from("<I", src, pos)
+            pos += 4
+            if block_size == 0:
+                break
+            is_uncompressed = block_size & 0x80000000 != 0
+            block_size &= 0x7FFFFFFF
+            block = view[pos:pos + block_size]
+            if is_uncompressed:
+                dst += block
+            elif lz4 is not None:
+                # linked blocks can match into the previous 64KB
+                dst += lz4.block.decompress(block, uncompressed_size=max_block_size, dict=dst[-(_LZ4_MAX_OFFSET + 1):])
+            else:
+                _lz4_block_decompress_into(block, dst)
+            pos += block_size + (4 if has_block_checksum else 0)
+        pos += 4 if has_content_checksum else 0
+    return bytes(dst)
+
+def _lz4_write_length(out: bytearray, length: int) -> None:
+    # the part of a length that didn't fit in the token nibble
+    length -= 15
+    while length >= 255:
+        out.append(255)
+        length -= 255
+    out.append(length)
+
+def _lz4_write_sequence(out: bytearray, literals: bytes | memoryview, offset: int, match_length: int) -> None:
+    literal_length = len(literals)
+    match_code = match_length - 4
+    out.append((min(literal_length, 15) << 4) | min(match_code, 15))
+    if literal_length >= 15:
+        _lz4_write_length(out, literal_length)
+    out += literals
+    out.append(offset & 0xFF)
+    out.append(offset >> 8)
+    if match_code >= 15:
+        _lz4_write_length(out, match_code)
+
+def _lz4_block_compress_python(src: bytes, compression_level: int) -> bytes:
+    # greedy matcher on a table of the last position of each 4 byte string, output is a plain lz4 block.
+    # the fast level skips ahead quicker through data that doesn't match
+    n = len(src)
+    out = bytearray()
+    anchor = 0
+    match_find_end = n - _LZ4_MATCH_FIND_LIMIT
+    match_end_limit = n - _LZ4_LAST_LITERALS
+    skip_shift = 4 if compression_level == COMPRESSION_LEVEL_FAST else 6
+    last_seen: dict[bytes, int] = {}
+    misses = 0
+    i = 0
+    while i <= match_find_end:
+        key = src[i:i + 4]
+        candidate = last_seen.get(key)
+        last_seen[key] = i
+        if candidate is None or i - candidate > _LZ4_MAX_OFFSET:
+            misses += 1
+            i += 1 + (misses >> skip_shift)
+            continue
+        misses = 0
+
+        # 4 bytes are known to match, extend in big steps first
+        j = i + 4
+        k = candidate + 4
+        step = 64
+        while step > 0:
+            while j + step <= match_end_limit and src[j:j + step] == src[k:k + step]:
+                j += step
+                k += step
+            step >>= 2
+        while i > anchor and candidate > 0 and src[i - 1] == src[candidate - 1]:
+            i -= 1
+            candidate -= 1
+
+        _lz4_write_sequence(out, src[anchor:i], i - candidate, j - i)
+        if j - 2 > i:
+            # so the next match can start right behind this one
+            last_seen[src[j - 2:j + 2]] = j - 2
+        anchor = i = j
+
+    literal_length = n - anchor
+    out.append(min(literal_length, 15) << 4)
+    if literal_length >= 15:
+        _lz4_write_length(out, literal_length)
+    out += src[anchor:]
+    return bytes(out)
+
+def lz4_block_compress(src: bytes | memoryview, compression_level: int = COMPRESSION_LEVEL_DEFAULT) -> bytes:
+    # the lz4 package is a lot faster and releases the gil, use it if it's there
+    if lz4 is None:
+        return _lz4_block_compress_python(bytes(src), compression_level)
+    if compression_level == COMPRESSION_LEVEL_MAX:
+        return lz4.block.compress(src, mode="high_compression", store_size=False)
+    return lz4.block.compress(src, store_size=False)
+
+# ---------------- xxh32 ----------------
+# only needed for the frame header checksum
+
+_XXH_PRIME32_1 = 2654435761
+_XXH_PRIME32_2 = 2246822519
+_XXH_PRIME32_3 = 3266489917
+_XXH_PRIME32_4 = 668265263
+_XXH_PRIME32_5 = 374761393
+_MASK32 = 0xFFFFFFFF
+
+def _rotl32(x: int, r: int) -> int:
+    return ((x << r) | (x >> (32 - r))) & _MASK32
+
+def xxh32(data: bytes, seed: int = 0) -> int:
+    n = len(data)
+    pos = 0
+    if n >= 16:
+        accumulators = [
+            (seed + _XXH_PRIME32_1 + _XXH_PRIME32_2) & _MASK32,
+            (seed + _XXH_PRIME32_2) & _MASK32,
+            seed,
+            (seed - _XXH_PRIME32_1) & _MASK32,
+        ]
+        while pos + 16 <= n:
+            lanes = struct.unpack_from("<4I", data, pos)
+            for lane in range(4):
+                accumulators[lane] = (_rotl32((accumulators[lane] + lanes[lane] * _XXH_PRIME32_2) & _MASK32, 13) * _XXH_PRIME32_1) & _MASK32
+            pos += 16
+        h = (_rotl32(accumulators[0], 1) + _rotl32(accumulators[1], 7) + _rotl32(accumulators[2], 12) + _rotl32(accumulators[3], 18)) & _MASK32
+    else:
+        h = (seed + _XXH_PRIME32_5) & _MASK32
+    h = (h + n) & _MASK32
+    while pos + 4 <= n:
+        (lane,) = struct.unpack_from("<I", data, pos)
+        h = (_rotl32((h + lane * _XXH_PRIME32_3) & _MASK32, 17) * _XXH_PRIME32_4) & _MASK32
+        pos += 4
+    while pos < n:
+        h = (_rotl32((h + data[pos] * _XXH_PRIME32_5) & _MASK32, 11) * _XXH_PRIME32_1) & _MASK32
+        pos += 1
+    h ^= h >> 15
+    h = (h * _XXH_PRIME32_2) & _MASK32
+    h ^= h >> 13
+    h = (h * _XXH_PRIME32_3) & _MASK32
+    h ^= h >> 16
+    return h
+
+def lz4_frame_compress(src: bytes, compression_level: int = COMPRESSION_LEVEL_DEFAULT) -> bytes:
+    # version 1, independent blocks, 64KB max block size, no checksums besides the header one
+    descriptor = bytes((0x60, 0x40))
+    out = bytearray(struct.pack("<I", LZ4_FRAME_MAGIC))
+    out += descriptor
+    out.append((xxh32(descriptor) >> 8) & 0xFF)
+    view = memoryview(src)
+    for start in range(0, len(src), _LZ4_FRAME_BLOCK_SIZE):
+        block = view[start:start + _LZ4_FRAME_BLOCK_SIZE]
+        compressed = lz4_block_compress(block, compression_level)
+        if len(compressed) < len(block):
+            out += struct.pack("<I", len(compressed))
+            out += compressed
+        else:
+            out += struct.pack("<I", len(block) | 0x80000000)
+            out += block
+    out += struct.pack("<I", 0)
+    return bytes(out)
+
+# ================ Zstd ================
+
+def _zstd_decompress(src: bytes, uncompressed_size: int) -> bytes:
+    try:
+        from compression import zstd # python 3.14+
+        return zstd.decompress(src)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        assert False, "zstd compressed data needs python 3.14 or the zstandard package"
+    return zstandard.ZstdDecompressor().decompress(src, max_output_size=uncompressed_size)
+
+_zstd_levels = {COMPRESSION_LEVEL_FAST: 1, COMPRESSION_LEVEL_DEFAULT: 3, COMPRESSION_LEVEL_MAX: 19}
+
+def _zstd_compress(src: bytes, compression_level: int) -> bytes:
+    level = _zstd_levels.get(compression_level, 3)
+    try:
+        from compression import zstd # python 3.14+
+        return zstd.compress(src, level=level)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        assert False, "zstd compression needs python 3.14 or the zstandard package"
+    return zstandard.ZstdCompressor(level=level).compress(src)
+
+# ================ Decompress ================
+
+def decompress(src: bytes, uncompressed_size: int, compression_flags: int, chunked: bool) -> bytes:
+    # chunked data is an lz4 frame instead of a single lz4 block, the other methods don't care
+    method = compression_method(compression_flags)
+    if method == COMPRESSION_NONE:
+        return src
+    if method == COMPRESSION_ZLIB:
+        ret = zlib.decompress(src)
+    elif method == COMPRESSION_LZ4:
+        if not chunked:
+            return lz4_block_decompress(src, uncompressed_size)
+        ret = lz4_frame_decompress(src)
+    elif method == COMPRESSION_ZSTD:
+        ret = _zstd_decompress(src, uncompressed_size)
+    else:
+        assert False, f"Unknown compression method {method}"
+    assert len(ret) == uncompressed_size, f"Decompressed to {len(ret)} bytes, expected {uncompressed_size}"
+    return ret
+
+# ================ Compress ================
+
+_zlib_levels = {COMPRESSION_LEVEL_FAST: 1, COMPRESSION_LEVEL_DEFAULT: 6, COMPRESSION_LEVEL_MAX: 9}
+
+def compress(src: bytes, compression_flags: int, chunked: bool) -> bytes:
+    # inverse of decompress
+    method = compression_method(compression_flags)
+    level = compression_level(compression_flags)
+    if method == COMPRESSION_NONE:
+        return src
+    if method == COMPRESSION_ZLIB:
+        return zlib.compress(src, _zlib_levels.get(level, 6))
+    if method == COMPRESSION_LZ4:
+        if chunked:
+            return lz4_frame_compress(src, level)
+        return lz4_block_compress(src, level)
+    if method == COMPRESSION_ZSTD:
+        return _zstd_compress(src, level)
+    assert False, f"Unknown compression method {method}"
@@ -1,9 +1,11 @@
-from timeline_parser import TimelineTree, TimelinePrintInfoContext, EmotionData
-from dataclasses import dataclass
+from timeline_parser import TimelineTree, TimelinePrintInfoContext, EmotionData, ActorMapContext, PhaseDepdenencies
+from dataclasses import dataclass, field
 from dialog_tree_objects import DialogTree, DialogNode, NewDialogNode, NewDialogFlagGroup, NewTaggedText, NewFlag, NewTagTexts,NewTagText
-from print_info_utils import create_speaker_labels, create_strings_map, get_dialog_node_id_to_text_entry, create_sound_banks_duration_mapping
+from print_info_utils import create_speaker_labels, create_strings_map, get_dialog_node_id_to_text_entry, create_sound_banks_duration_mapping, SoundBanksDuration
 from companion_utils import companion_REALLY_tags, companion_uuids
 from typing import Callable
+from collections.abc import Mapping
+from functools import cache
 from kiss_edits import KissEdits, DialogTextEntry
 from kiss_utils import KissEntry, body_type_ordering_in_dialog, BODYTYPE, KISSTYPE, body_type_to_tag
 from timeline_scene_parser import TimelineSceneTree
@@ -22,6 +24,9 @@ class DialogAndTimelineBaseContext:
                  scene_path: str,
                 dialog_path: str
             ) -> None:
+        self.timeline_path = timeline_path
+        self.scene_path = scene_path
+        self.dialog_path = dialog_path
         self.timeline_tree = TimelineTree.create(file_path=timeline_path)
         self.scene_tree = TimelineSceneTree.create(file_path=scene_path)
         self.dialog_tree = DialogTree.create(file_path=dialog_path)
@@ -42,7 +47,32 @@ class DialogAndTimelineContext(DialogAndTimelineBaseContext):
         self.pop_n_uuids = pop_n_uuids
 
 
-durations = create_sound_banks_duration_mapping()
+# ================ Lazy Resources ================
+# soundbank durations and loca strings are only loaded the first time something needs them
+
+@cache
+def get_durations() -> SoundBanksDuration:
+    return create_sound_banks_duration_mapping()
+
+@cache
+def get_strings_mapping() -> Mapping[str, str]:
+    return create_strings_map()
+
+def prefetch_resources(durations: bool = True, strings_mapping: bool = True) -> None:
+    # for builds that know they need these, load them up front instead of in the middle of the first edit
+    if durations:
+        get_durations()
+    if strings_mapping:
+        get_strings_mapping()
+
+def __getattr__(name: str):
+    # keeps dialog_and_timeline_utils.durations / .strings_mapping working for existing scripts
+    if name == "durations":
+        return get_durations()
+    if name == "strings_mapping":
+        return get_strings_mapping()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def add_timeline_nodes_for_companion_response(
         context: DialogAndTimelineContext,
         companion_response_dialog_uuid: str,
@@ -56,7 +86,7 @@ def add_timeline_nodes_for_companion_response(
     for i, dialog_entry in enumerate(dialog):
         reference_id = None if i == 0 else dialog_entry.line_id
         text_uuid = dialog_entry.text_uuid
-        duration_for_text = durations[text_uuid][0]
+        duration_for_text = get_durations()[text_uuid][0]
 
         if VERBOSE:
             print(f"!Updating {n_nodes} uuids in nodes for astarion")
@@ -93,24 +123,19 @@ class CinematicContext:
         companion_mapping = {}
         if companion_key != self.companion_key:
             companion_mapping = {companion_uuids[self.companion_key]: companion_uuids[companion_key]}
+        copy_jobs: list[CopyPhaseJob] = []
         for phase_index, body_types in self.phase_to_bodytypes.items():
             hug_cinematic_node_uuid = context.pop_one_uuid()
             hug_cinematic_node_uuids.append(hug_cinematic_node_uuid)
-            copy_phase(from_timeline=self.timeline_tree, 
-                from_phase_index=phase_index, 
-                from_timeline_scene=self.scene_tree, 
-                to_timeline=context.timeline_tree, 
-                to_timeline_scene=context.scene_tree, 
+            copy_jobs.append(CopyPhaseJob(
+                from_timeline=self.timeline_tree,
+                from_phase_index=phase_index,
+                from_timeline_scene=self.scene_tree,
                 dialog_node_uuid_for_new_phase=hug_cinematic_node_uuid,
-                pop_n_uuids=context.pop_n_uuids,
+                emotions_map=emotions_map,
                 companion_mapping=companion_mapping,
-                should_replace_uuids=False,
-                should_reverse_actor_map=False,
                 pull_in_camera=True,
-            )
-            for actor, actor_emotions_map in emotions_map.items():
-                context.timeline_tree.content.effect.effect_component_phases[-1].map_emotions(actor=actor,
-                                        emotion_map=actor_emotions_map)
+            ))
             check_flags = []
             if len(body_types) > 0:
                 check_flags.append(NewDialogFlagGroup(
@@ -132,6 +157,7 @@ class CinematicContext:
             )
 
             context.dialog_tree.content.dialog_nodes.add_dialog_node(hug_cinematic)
+        copy_phases(jobs=copy_jobs, to_timeline=context.timeline_tree, to_timeline_scene=context.scene_tree)
         
         # pre hug response from companion
         pre_hug_response_node = NewDialogNode(
@@ -274,12 +300,10 @@ class GaleHugCinematicContext(CinematicContext):
             phase_to_bodytypes=phase_to_bodytypes,
             companion_key="gale",
         )
-strings_mapping = create_strings_map()
-
 def create_print_info_context(context: DialogAndTimelineBaseContext) -> TimelinePrintInfoContext:
     camera_mapping = context.scene_tree.content.get_camera_id_to_name_mapping()
     speaker_labels = create_speaker_labels(context.dialog_tree.content.speaker_list)
-    dialog_text_map = get_dialog_node_id_to_text_entry(dialog_tree=context.dialog_tree, strings_map=strings_mapping)
+    dialog_text_map = get_dialog_node_id_to_text_entry(dialog_tree=context.dialog_tree, strings_map=get_strings_mapping())
     camera_actor_labels = context.timeline_tree.content.get_actor_id_to_descriptive_name(camera_id_to_name=camera_mapping)
     return TimelinePrintInfoContext(
         dialog_text_map=dialog_text_map,
@@ -290,76 +314,150 @@ def create_print_info_context(context: DialogAndTimelineBaseContext) -> Timeline
     )
       
 
-def copy_phase(from_timeline: TimelineTree, 
-               from_phase_index: int, 
-               from_timeline_scene: TimelineSceneTree, 
-               to_timeline: TimelineTree, 
-               to_timeline_scene: TimelineSceneTree, 
-               dialog_node_uuid_for_new_phase: str,
-               pop_n_uuids: Callable[[int], list[str]],
-               emotions_map: dict[str, dict[EmotionData, EmotionData]] = {},
-               companion_mapping: dict[str, str] = {},
-               should_replace_uuids: bool = False,
-               should_reverse_actor_map: bool = False,
-               pull_in_camera: bool = False) -> None:
-    # generate mapping for speaker and peanut uuids
-    actor_map_context = to_timeline.content.generate_actor_map(
-        other_tree=from_timeline,
-        reverse_map=should_reverse_actor_map,
-    )
+@dataclass
+class CopyPhaseJob:
+    from_timeline: TimelineTree
+    from_phase_index: int
+    from_timeline_scene: TimelineSceneTree
+    dialog_node_uuid_for_new_phase: str
+    emotions_map: dict[str, dict[EmotionData, EmotionData]] = field(default_factory=dict)
+    companion_mapping: dict[str, str] = field(default_factory=dict)
+    # new uuids for the copied nodes, for when copying from the same tree so there are no dups
+    new_node_ids: list[str] | None = None
+    should_reverse_actor_map: bool = False
+    pull_in_camera: bool = False
+
+def _append_copied_phase(job: CopyPhaseJob, actor_map_context: ActorMapContext, to_timeline: TimelineTree) -> None:
     # phase nodes we are copying from
-    phase_node = from_timeline.content.effect.effect_component_phases[from_phase_index]
-
-    # all the nodes we need to copy
-    dependencies = from_timeline.content.get_dependency_nodes_used_in_phase(phase_index=from_phase_index, scene_tree=from_timeline_scene, companion_mapping=companion_mapping)
-    if should_replace_uuids:
-        # if we are copying nodes from the same tree, we need to change the uuids so there's no dups
-        # it actually works fine without this but this keeps things clean
-        to_timeline.content.append_new_phase(
-            existing_phase_to_append=phase_node,
-            actor_map_context=actor_map_context,
-            new_dialog_node_id=dialog_node_uuid_for_new_phase,
-            update_node_ids=pop_n_uuids(n=len(phase_node.phase_nodes))
-        )
-    else:
-        to_timeline.content.append_new_phase(
-            existing_phase_to_append=phase_node,
-            actor_map_context=actor_map_context,
-            new_dialog_node_id=dialog_node_uuid_for_new_phase
-        )
-
+    phase_node = job.from_timeline.content.effect.effect_component_phases[job.from_phase_index]
+    to_timeline.content.append_new_phase(
+        existing_phase_to_append=phase_node,
+        actor_map_context=actor_map_context,
+        new_dialog_node_id=job.dialog_node_uuid_for_new_phase,
+        update_node_ids=job.new_node_ids,
+        should_write_duration=False,
+    )
     # map emotions
-    for actor, actor_emotion_map in emotions_map.items():
+    for actor, actor_emotion_map in job.emotions_map.items():
         to_timeline.content.effect.effect_component_phases[-1].map_emotions(actor=actor,
                                 emotion_map=actor_emotion_map)
-        
+
+def _add_copied_dependencies(job: CopyPhaseJob, dependencies: PhaseDepdenencies, actor_map_context: ActorMapContext, to_timeline: TimelineTree, to_timeline_scene: TimelineSceneTree) -> None:
+    # what's already in the target gets merged by the add_* calls, so every job makes them even for shared nodes
     # copy scenecams
     for actor_node in dependencies.actor_nodes:
         if actor_node.values[0].actor_type_id == "scenecam":
             if VERBOSE:
                 print(f"Adding actornode {actor_node.actor_data_uuid} {actor_node.values[0].actor_type_id} {actor_node.values[0].camera}")
             to_timeline.content.actor_data.add_actor_object(actor_object=actor_node, guid_map=actor_map_context.create_map(node_type=None))
-    
+
     # copy stages
     for stage in dependencies.stage_nodes:
         if VERBOSE:
             print(f"Adding stage {stage.name} {stage.identifier}")
-        if not should_replace_uuids:
+        if job.new_node_ids is None:
             assert stage.variation_conditions_id is None, f"TODO handle stages with variations"
         to_timeline_scene.content.add_stage(stage=stage)
     # copy cameras
     for camera in dependencies.camera_nodes:
         if VERBOSE:
             print(f"Adding camera {camera.map_key} {camera.camera.name}")
-        to_timeline_scene.content.cameras.add_camera_object(camera, stage_ids=dependencies.switch_stage_ids, pull_in_camera=pull_in_camera)
-    
+        to_timeline_scene.content.cameras.add_camera_object(camera, stage_ids=dependencies.switch_stage_ids, pull_in_camera=job.pull_in_camera)
+
     # copy scene actors
     for actor in dependencies.scene_actor_nodes:
         if VERBOSE:
             print(f"Adding scene actor {actor.template_id}")
         to_timeline_scene.content.actors.add_actors_node(node=actor)
 
+def copy_phases(jobs: list[CopyPhaseJob],
+                to_timeline: TimelineTree,
+                to_timeline_scene: TimelineSceneTree) -> None:
+    # copies every phase in one go: one actor map and one dependency lookup per source tree
+    if any(job.from_timeline is to_timeline or job.from_timeline_scene is to_timeline_scene for job in jobs):
+        # copying within the target, each job has to see what the jobs before it added. one at a time like copy_phase
+        for job in jobs:
+            # generate mapping for speaker and peanut uuids
+            actor_map_context = to_timeline.content.generate_actor_map(
+                other_tree=job.from_timeline,
+                reverse_map=job.should_reverse_actor_map,
+            )
+            # all the nodes we need to copy
+            dependencies = job.from_timeline.content.get_dependency_nodes_used_in_phase(phase_index=job.from_phase_index, scene_tree=job.from_timeline_scene, companion_mapping=job.companion_mapping)
+            _append_copied_phase(job=job, actor_map_context=actor_map_context, to_timeline=to_timeline)
+            to_timeline.content.effect.write_duration()
+            _add_copied_dependencies(job=job, dependencies=dependencies, actor_map_context=actor_map_context, to_timeline=to_timeline, to_timeline_scene=to_timeline_scene)
+        return
+
+    actor_maps: dict[tuple[int, bool], ActorMapContext] = {}
+    for job in jobs:
+        key = (id(job.from_timeline), job.should_reverse_actor_map)
+        if key not in actor_maps:
+            # generate mapping for speaker and peanut uuids
+            actor_maps[key] = to_timeline.content.generate_actor_map(
+                other_tree=job.from_timeline,
+                reverse_map=job.should_reverse_actor_map,
+            )
 
+    # all the nodes we need to copy, grouped by source. the sources don't change while copying so they can be looked
+    # up before anything gets added
+    job_groups: dict[tuple, list[int]] = {}
+    for i, job in enumerate(jobs):
+        key = (id(job.from_timeline), id(job.from_timeline_scene), tuple(job.companion_mapping.items()))
+        job_groups.setdefault(key, []).append(i)
+    job_dependencies: list[PhaseDepdenencies | None] = [None] * len(jobs)
+    for job_indexes in job_groups.values():
+        first_job = jobs[job_indexes[0]]
+        group_dependencies = first_job.from_timeline.content.get_dependency_nodes_used_in_phases(
+            phase_indexes=[jobs[i].from_phase_index for i in job_indexes],
+            scene_tree=first_job.from_timeline_scene,
+            companion_mapping=first_job.companion_mapping,
+        )
+        for i, dependencies in zip(job_indexes, group_dependencies):
+            job_dependencies[i] = dependencies
+
+    for job in jobs:
+        _append_copied_phase(job=job, actor_map_context=actor_maps[(id(job.from_timeline), job.should_reverse_actor_map)], to_timeline=to_timeline)
+    if len(jobs) > 0:
+        to_timeline.content.effect.write_duration()
+
+    # every container only gets added to here, so going job by job gives the same order as copying one phase at a time
+    for job, dependencies in zip(jobs, job_dependencies):
+        _add_copied_dependencies(job=job, dependencies=dependencies, actor_map_context=actor_maps[(id(job.from_timeline), job.should_reverse_actor_map)], to_timeline=to_timeline, to_timeline_scene=to_timeline_scene)
+
+def copy_phase(from_timeline: TimelineTree, 
+               from_phase_index: int, 
+               from_timeline_scene: TimelineSceneTree, 
+               to_timeline: TimelineTree, 
+               to_timeline_scene: TimelineSceneTree, 
+               dialog_node_uuid_for_new_phase: str,
+               pop_n_uuids: Callable[[int], list[str]],
+               emotions_map: dict[str, dict[EmotionData, EmotionData]] = {},
+               companion_mapping: dict[str, str] = {},
+               should_replace_uuids: bool = False,
+               should_reverse_actor_map: bool = False,
+               pull_in_camera: bool = False) -> None:
+    new_node_ids = None
+    if should_replace_uuids:
+        # if we are copying nodes from the same tree, we need to change the uuids so there's no dups
+        # it actually works fine without this but this keeps things clean
+        n_nodes = len(from_timeline.content.effect.effect_component_phases[from_phase_index].phase_nodes)
+        new_node_ids = pop_n_uuids(n=n_nodes)
+    copy_phases(
+        jobs=[CopyPhaseJob(
+            from_timeline=from_timeline,
+            from_phase_index=from_phase_index,
+            from_timeline_scene=from_timeline_scene,
+            dialog_node_uuid_for_new_phase=dialog_node_uuid_for_new_phase,
+            emotions_map=emotions_map,
+            companion_mapping=companion_mapping,
+            new_node_ids=new_node_ids,
+            should_reverse_actor_map=should_reverse_actor_map,
+            pull_in_camera=pull_in_camera,
+        )],
+        to_timeline=to_timeline,
+        to_timeline_scene=to_timeline_scene,
+    )
 
 
 def add_kisses(
@@ -373,6 +471,7 @@ def add_kisses(
         body_type_filter: list[tuple[BODYTYPE]] | None = None) -> tuple[list[str], list[DialogNode]]:
     kiss_cinematic_nodes = []
     kiss_type_to_kiss_uuids: dict[tuple[KISSTYPE, tuple[BODYTYPE,...]], str] = {}
+    copy_jobs: list[CopyPhaseJob] = []
     for kiss_type, kiss_entries in zip(["A", "B", "C", "D"], kiss_entries):
         for kiss_entry in kiss_entries:
             if body_type_filter is not None:
@@ -397,18 +496,24 @@ def add_kisses(
                     companion_mapping = {from_key: to_key}
 
             print(f"\n\nAdding kiss entry {kiss_entry.companion} {kiss_type} {uuid_for_this_kiss} {kiss_entry.kiss_body_types} {kiss_entry.kiss_timeline_phase_index}")
-            copy_phase(from_timeline=kiss_entry.timeline, 
-                from_phase_index=kiss_entry.kiss_timeline_phase_index, 
-                from_timeline_scene=kiss_entry.scene, 
-                to_timeline=context.timeline_tree, 
-                to_timeline_scene=context.scene_tree, 
+            new_node_ids = None
+            if kiss_entry.companion == companion_name_key:
+                # popped here so the uuids come out in the same order as when each kiss was copied right away
+                n_nodes = len(kiss_entry.timeline.content.effect.effect_component_phases[kiss_entry.kiss_timeline_phase_index].phase_nodes)
+                new_node_ids = context.pop_n_uuids(n=n_nodes)
+            copy_jobs.append(CopyPhaseJob(
+                from_timeline=kiss_entry.timeline,
+                from_phase_index=kiss_entry.kiss_timeline_phase_index,
+                from_timeline_scene=kiss_entry.scene,
                 dialog_node_uuid_for_new_phase=uuid_for_this_kiss,
-                pop_n_uuids=context.pop_n_uuids,
+                emotions_map=emotions_map,
                 companion_mapping=companion_mapping,
-                should_replace_uuids= kiss_entry.companion == companion_name_key,
+                new_node_ids=new_node_ids,
                 should_reverse_actor_map=reverse,
-                emotions_map=emotions_map)
-            
+            ))
+
+    copy_phases(jobs=copy_jobs, to_timeline=context.timeline_tree, to_timeline_scene=context.scene_tree)
+
     # we want to add kisses in a specific order to match how the game does it, ordered by body tags, with no body tags at the very end
     body_type_ordering_in_dialog_map = { body_type: i for i, body_type in enumerate(body_type_ordering_in_dialog)}
     kiss_uuids: list[tuple[tuple[KISSTYPE, tuple[BODYTYPE]],str]] = list(kiss_type_to_kiss_uuids.items())
@@ -1,5 +1,9 @@
 from dataclasses import dataclass, field
-from base_objects import BaseNode, NewBaseNode, NewAttribute, Guid
+from base_objects import BaseNode, NewBaseNode, NewAttribute, Guid, insert_child, cached_wrapper
+from cache_utils import load_cached
+from lsf_writer import write_resource_file
+from lsf_parser import parse_resource_file_with_source
+from lsx_incremental import LsxSource
 import xml.etree.ElementTree as ET
 
 
@@ -7,6 +11,7 @@ import xml.etree.ElementTree as ET
 
 @dataclass
 class DialogSpeakerNode(BaseNode):
+    __slots__ = ("index", "speaker_actor_id", "list_id")
     index: int
     speaker_actor_id: str
     list_id: str
@@ -23,6 +28,7 @@ class DialogSpeakerNode(BaseNode):
         
 @dataclass
 class DialogSpeakerListNode(BaseNode):
+    __slots__ = ("speakers",)
     speakers: list[DialogSpeakerNode]
     def __init__(self, element: ET.Element) -> None:
         assert element.attrib["id"] == "speakerlist"
@@ -32,6 +38,7 @@ class DialogSpeakerListNode(BaseNode):
 
 @dataclass
 class FlagNode(BaseNode):
+    __slots__ = ("flag_uuid", "flag_value", "paramval")
     flag_uuid: str
     flag_value: str
     paramval:  str | None
@@ -46,6 +53,7 @@ class FlagNode(BaseNode):
 
 @dataclass
 class FlagGroupNode(BaseNode):
+    __slots__ = ("type_str", "flags")
     type_str: str
     flags: list[FlagNode]
     def __init__(self, element: ET.Element) -> None:
@@ -62,6 +70,7 @@ class FlagGroupNode(BaseNode):
 
 @dataclass
 class EditorDataNode(BaseNode):
+    __slots__ = ("key_str", "val_str")
     key_str: str
     val_str: str
     def __init__(self, element: ET.Element) -> None:
@@ -73,6 +82,7 @@ class EditorDataNode(BaseNode):
 
 @dataclass
 class TagTextNode(BaseNode):
+    __slots__ = ("tag_text", "line_id", "custom_sequence_id")
     tag_text: str
     line_id: str
     custom_sequence_id: str | None
@@ -85,6 +95,7 @@ class TagTextNode(BaseNode):
 
 @dataclass
 class TagTextsNode(BaseNode):
+    __slots__ = ("tag_texts",)
     tag_texts: list[TagTextNode]
     # todo RuleGroup
     def __init__(self, element: ET.Element) -> None:
@@ -95,6 +106,7 @@ class TagTextsNode(BaseNode):
 
 @dataclass
 class TaggedTextNode(BaseNode):
+    __slots__ = ("has_tag_rule", "tag_texts")
     has_tag_rule: str
     tag_texts: list[TagTextsNode]
     def __init__(self, element: ET.Element) -> None:
@@ -106,6 +118,7 @@ class TaggedTextNode(BaseNode):
     
 @dataclass
 class DialogNode(BaseNode):
+    __slots__ = ("constructor", "uuid", "speaker", "group_id", "group_index", "show_once", "is_root", "_dialog_list")
     constructor: str # TagGreeting TagAnswer TagQuestion TagCinematic Jump Alias
     uuid: str
     speaker: str | None
@@ -126,12 +139,14 @@ class DialogNode(BaseNode):
         self.group_index = self.get_attribute_value("GroupIndex")
         self.show_once = self.get_attribute_value("ShowOnce")
         self.is_root = self.get_attribute_value("Root")
+        # set by DialogListNodes so child edits keep its parent index up to date
+        self._dialog_list: "DialogListNodes | None" = None
 
     def get_set_flags(self) -> list[FlagGroupNode]:
         setflags_container = self._get_children_elements(child_type="setflags")
         if len(setflags_container) == 0:
             return []
-        return [FlagGroupNode(x) for x in BaseNode(setflags_container[0])._get_children_elements("flaggroup")]
+        return [cached_wrapper(x, FlagGroupNode, copies_values=True) for x in cached_wrapper(setflags_container[0], BaseNode)._get_children_elements("flaggroup")]
 
     def has_set_flag(self, flag_uuid: str) -> bool:
         set_flags = self.get_set_flags()
@@ -151,19 +166,19 @@ class DialogNode(BaseNode):
         setflags_container = self._get_children_elements(child_type="checkflags")
         if len(setflags_container) == 0:
             return []
-        return [FlagGroupNode(x) for x in BaseNode(setflags_container[0])._get_children_elements("flaggroup")]
+        return [cached_wrapper(x, FlagGroupNode, copies_values=True) for x in cached_wrapper(setflags_container[0], BaseNode)._get_children_elements("flaggroup")]
 
     def get_tagged_texts(self) -> list[TaggedTextNode]:
         text_container = self._get_children_elements(child_type="TaggedTexts")
         if len(text_container) == 0:
             return []
-        return [TaggedTextNode(x) for x in BaseNode(text_container[0])._get_children_elements("TaggedText")]
+        return [cached_wrapper(x, TaggedTextNode, copies_values=True) for x in cached_wrapper(text_container[0], BaseNode)._get_children_elements("TaggedText")]
     
     def get_editor_data(self) -> list[EditorDataNode]:
         editor_container = self._get_children_elements(child_type="editorData")
         if len(editor_container) == 0:
             return []
-        return [EditorDataNode(x) for x in BaseNode(editor_container[0])._get_children_elements("data")]
+        return [cached_wrapper(x, EditorDataNode, copies_values=True) for x in cached_wrapper(editor_container[0], BaseNode)._get_children_elements("data")]
     
     def get_children_uuids(self) -> list[str]:
         children_container = self._get_children_elements(child_type="children")[0]
@@ -178,18 +193,24 @@ class DialogNode(BaseNode):
             new_attr = ET.Element("attribute", attrib={"id": "UUID", "type":"FixedString", "value": uuid})
             new_node.append(new_attr)
             children_node.add_child_node(new_node, child_index=index)
+        if self._dialog_list is not None:
+            self._dialog_list._add_parent_entries(parent=self, children_uuids=children_uuids)
 
     # clears all children
     def remove_children_uuids(self) -> None:
         children_container = self._get_children_elements(child_type="children")[0]
         children_node = BaseNode(element=children_container)
         children_elements = children_node._get_children_elements(child_type="child")
+        removed_uuids = [BaseNode(c).get_attribute_value_nonnil("UUID") for c in children_elements]
         for c in children_elements:
             children_node._delete_child(child_element=c)
+        if self._dialog_list is not None:
+            self._dialog_list._remove_parent_entries(parent=self, children_uuids=removed_uuids)
 
 
 @dataclass
 class DialogRootNode(BaseNode):
+    __slots__ = ("root_node_id",)
     root_node_id: str
     def __init__(self, element: ET.Element) -> None:
         assert element.attrib["id"] == "RootNodes"
@@ -376,55 +397,80 @@ class NewDialogNode(NewBaseNode):
 
 @dataclass
 class DialogListNodes(BaseNode):
+    __slots__ = ("dialog_nodes", "root_nodes", "dialog_nodes_by_uuid", "dialog_uuid_to_parents")
     dialog_nodes: list[DialogNode]
     root_nodes: list[DialogRootNode]
 
-    dialog_nodes_by_uuid: dict[str, DialogNode] | None = None
-    dialog_uuid_to_parents: dict[str, list[DialogNode]] | None = None
+    dialog_nodes_by_uuid: dict[str, DialogNode] | None
+    dialog_uuid_to_parents: dict[str, list[DialogNode]] | None
     def __init__(self, element: ET.Element) -> None:
         assert element.attrib["id"] == "nodes"
         super().__init__(element=element)
         self.dialog_nodes = [DialogNode(n) for n in self._get_children_elements(child_type="node")]
         self.root_nodes = [DialogRootNode(n) for n in self._get_children_elements(child_type="RootNodes")]
+        self.dialog_nodes_by_uuid = None
+        self.dialog_uuid_to_parents = None
+        for node in self.dialog_nodes:
+            node._dialog_list = self
 
     def insert_child_node(self, node_uuid: str, child_uuids: list[str], index: int) -> None:
-        for dialog_node in self.dialog_nodes:
-            if dialog_node.uuid == node_uuid:
-                dialog_node.insert_children_uuids(children_uuids=child_uuids, index=index)
-                return
+        self._build_uuid_index()
+        dialog_node = self.dialog_nodes_by_uuid.get(node_uuid)
+        assert dialog_node is not None, f"did not find node with uuid {node_uuid}"
+        dialog_node.insert_children_uuids(children_uuids=child_uuids, index=index)
 
-        
-        assert False, f"did not find node with uuid {node_uuid}"
-
-    def get_node_by_uuid(self, node_uuid: str) -> ET.Element:
+    # both indexes are built on first use and then kept up to date by add_dialog_node and the DialogNode child edits
+    def _build_uuid_index(self) -> None:
         if self.dialog_nodes_by_uuid is None:
             self.dialog_nodes_by_uuid = {}
             for node in self.dialog_nodes:
                 assert node.uuid not in self.dialog_nodes_by_uuid
                 self.dialog_nodes_by_uuid[node.uuid] = node
+
+    def _add_parent_entries(self, parent: DialogNode, children_uuids: list[str]) -> None:
+        if self.dialog_uuid_to_parents is None:
+            return
+        for child in children_uuids:
+            if child not in self.dialog_uuid_to_parents:
+                self.dialog_uuid_to_parents[child] = [parent]
+            else:
+                self.dialog_uuid_to_parents[child].append(parent)
+
+    def _remove_parent_entries(self, parent: DialogNode, children_uuids: list[str]) -> None:
+        if self.dialog_uuid_to_parents is None:
+            return
+        for child in children_uuids:
+            parents = self.dialog_uuid_to_parents[child]
+            parents.remove(parent)
+            if len(parents) == 0:
+                del self.dialog_uuid_to_parents[child]
+
+    def get_node_by_uuid(self, node_uuid: str) -> DialogNode:
+        self._build_uuid_index()
         return self.dialog_nodes_by_uuid[node_uuid]
     
     def get_parents_by_child_uuid(self, child_uuid: str) -> list[DialogNode]:
         if self.dialog_uuid_to_parents is None:
             self.dialog_uuid_to_parents = {}
             for node in self.dialog_nodes:
-                children = node.get_children_uuids()
-                for child in children:
-
-                    if child not in self.dialog_uuid_to_parents:
-                        self.dialog_uuid_to_parents[child] = [node]
-                    else:
-                        self.dialog_uuid_to_parents[child].append(node)
+                self._add_parent_entries(parent=node, children_uuids=node.get_children_uuids())
         return self.dialog_uuid_to_parents[child_uuid]
 
     def add_dialog_node(self, new_node: NewDialogNode) -> None:
         element = new_node.create()
-        self._children_element_container.insert(0, element)
-        self.dialog_nodes.append(DialogNode(element=element))
+        insert_child(self._children_element_container, 0, element)
+        dialog_node = DialogNode(element=element)
+        dialog_node._dialog_list = self
+        self.dialog_nodes.append(dialog_node)
+        if self.dialog_nodes_by_uuid is not None:
+            assert dialog_node.uuid not in self.dialog_nodes_by_uuid
+            self.dialog_nodes_by_uuid[dialog_node.uuid] = dialog_node
+        self._add_parent_entries(parent=dialog_node, children_uuids=new_node.children_uuids)
 
 
 @dataclass
 class DialogContent(BaseNode):
+    __slots__ = ("speaker_list", "dialog_nodes")
     speaker_list: DialogSpeakerListNode
     dialog_nodes: DialogListNodes
     def __init__(self, element: ET.Element) -> None:
@@ -437,14 +483,19 @@ class DialogContent(BaseNode):
 class DialogTree:
     _tree_ref: ET.ElementTree
     content: DialogContent
+    _source: LsxSource | None = None
 
     @classmethod
-    def create(cls, file_path: str) -> "DialogTree":
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        assert root.tag == "save"
-        return DialogTree(_tree_ref=tree, content=DialogContent(element=root.find("region").find("node")))
-
-    def write_tree(self, output_file_path: str) -> None:
-        ET.indent(self._tree_ref, space="\t", level=0)
-        self._tree_ref.write(output_file_path, encoding='utf-8', method='xml', xml_declaration=True)
\ No newline at end of file
+    def create(cls, file_path: str, use_cache: bool = True) -> "DialogTree":
+        def parse() -> "DialogTree":
+            tree, source = parse_resource_file_with_source(file_path)
+            root = tree.getroot()
+            assert root.tag == "save"
+            return DialogTree(_tree_ref=tree, content=DialogContent(element=root.find("region").find("node")), _source=source)
+        if not use_cache:
+            return parse()
+        return load_cached(file_path=file_path, cls=cls, build=parse)
+
+    def write_tree(self, output_file_path: str, incremental: bool = False) -> None:
+        # incremental copies whatever the edits didn't touch straight from the source .lsx
+        write_resource_file(self._tree_ref, output_file_path, source=self._source if incremental else None)
\ No newline at end of file
@@ -5,6 +5,7 @@ from timeline_parser import TimelineTree
 from kiss_data import KissData
 from typing import Literal, TypeAlias
 from timeline_scene_parser import TimelineSceneTree
+from timeline_scan import PhaseSummary, TimelineScan, scan_executor
 
 KISSTYPE: TypeAlias = Literal["A", "B", "C", "D"]
 kiss_type_to_flag: dict[KISSTYPE, str] = {
@@ -70,7 +71,15 @@ class KissEntry:
             return f"{self.kiss_type}_{extra_flags}"
         return self.kiss_type
 
-def identify_kiss_nodes(dialog_tree: DialogTree, timeline_tree: TimelineTree, timeline_scene_tree: TimelineSceneTree, companion: str) -> list[KissEntry]:
+@dataclass
+class _KissCinematic:
+    kiss_type: KISSTYPE
+    kiss_body_types: tuple[BODYTYPE, ...]
+    kiss_cinematic_uuid: str
+    kiss_extra_flags: list[str]
+
+def _find_kiss_cinematics(dialog_tree: DialogTree) -> list[_KissCinematic]:
+    # the kiss TagCinematic nodes of a dialog, everything identify_kiss_nodes needs apart from the timeline
     kisses = []
     for node in dialog_tree.content.dialog_nodes.dialog_nodes:
         if node.constructor != "TagCinematic":
@@ -111,21 +120,66 @@ def identify_kiss_nodes(dialog_tree: DialogTree, timeline_tree: TimelineTree, ti
                 if parent.has_check_flag(extra_kiss_types["vampirelord"]):
                     kiss_extra_flags.append("vampirelord")
                     break
-            phase_index = timeline_tree.content.phases.get_phase_index_by_dialog_uuid(dialog_uuid=kiss_uuid)
-            entry = KissEntry(
+            kisses.append(_KissCinematic(
                 kiss_type=kiss_type,
                 kiss_body_types=tuple(seen_body_types),
                 kiss_cinematic_uuid=kiss_uuid,
-                kiss_timeline_phase_index=phase_index,
                 kiss_extra_flags=kiss_extra_flags,
-                companion=companion,
-                dialog_tree=dialog_tree,
-                timeline=timeline_tree,
-                scene=timeline_scene_tree
-            )
-            kisses.append(entry)
+            ))
+    return kisses
+
+def identify_kiss_nodes(dialog_tree: DialogTree, timeline_tree: TimelineTree, timeline_scene_tree: TimelineSceneTree, companion: str) -> list[KissEntry]:
+    kisses = []
+    for kiss in _find_kiss_cinematics(dialog_tree=dialog_tree):
+        phase_index = timeline_tree.content.phases.get_phase_index_by_dialog_uuid(dialog_uuid=kiss.kiss_cinematic_uuid)
+        entry = KissEntry(
+            kiss_type=kiss.kiss_type,
+            kiss_body_types=kiss.kiss_body_types,
+            kiss_cinematic_uuid=kiss.kiss_cinematic_uuid,
+            kiss_timeline_phase_index=phase_index,
+            kiss_extra_flags=kiss.kiss_extra_flags,
+            companion=companion,
+            dialog_tree=dialog_tree,
+            timeline=timeline_tree,
+            scene=timeline_scene_tree
+        )
+        kisses.append(entry)
     return kisses
 
+@dataclass
+class KissPhase:
+    # read only counterpart of KissEntry, from a timeline summary instead of the full trees
+    kiss_type: KISSTYPE
+    kiss_body_types: tuple[BODYTYPE, ...]
+    kiss_cinematic_uuid: str
+    kiss_timeline_phase_index: int
+    kiss_extra_flags: list[str]
+    companion: str
+    # None if the phase has no EffectComponents
+    phase: PhaseSummary | None
+
+def scan_kiss_phases(kiss_datas: list[KissData], max_workers: int | None = None) -> dict[str, list[KissPhase]]:
+    # kisses of every companion and the timeline phase each one plays. the timelines get parsed in worker processes,
+    # the dialogs here in the meantime. has to be called behind `if __name__ == '__main__'`
+    ret = {}
+    with scan_executor(max_workers=max_workers) as executor:
+        timeline_scans = [TimelineScan(file_path=x.timeline_path, executor=executor) for x in kiss_datas]
+        kiss_cinematics = [_find_kiss_cinematics(dialog_tree=DialogTree.create(file_path=x.dialog_path)) for x in kiss_datas]
+        for kiss_data, timeline_scan, kisses in zip(kiss_datas, timeline_scans, kiss_cinematics):
+            timeline_summary = timeline_scan.result()
+            ret[kiss_data.character_name] = [
+                KissPhase(
+                    kiss_type=kiss.kiss_type,
+                    kiss_body_types=kiss.kiss_body_types,
+                    kiss_cinematic_uuid=kiss.kiss_cinematic_uuid,
+                    kiss_timeline_phase_index=timeline_summary.phase_index_by_dialog_uuid[kiss.kiss_cinematic_uuid],
+                    kiss_extra_flags=kiss.kiss_extra_flags,
+                    companion=kiss_data.character_name,
+                    phase=timeline_summary.get_phase_by_dialog_uuid(kiss.kiss_cinematic_uuid),
+                )
+                for kiss in kisses
+            ]
+    return ret
 
 
 def get_kiss_entries(kiss_datas: list[KissData], print_info: bool = True) -> dict[str, dict[str, list[KissEntry]]]:
@@ -0,0 +1,125 @@
+import os
+import pickle
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Callable
+
+from base_objects import BaseNode
+from cache_utils import CACHE_DIR
+
+# bump when the per-file label layout changes
+LABEL_REGISTRY_VERSION = 1
+
+characters_files = [
+    r"Y:\bg3\multitool\UnpackedMods\Gustav\Mods\Gustav\Globals\WLD_Main_A\Characters\_merged.lsf.lsx",
+    r"Y:\bg3\multitool\UnpackedData\Gustav\Mods\GustavDev\Globals\BGO_Main_A\Characters\_merged.lsf.lsx",
+    r"Y:\bg3\multitool\UnpackedData\Gustav\Mods\GustavDev\Globals\CTY_Main_A\Characters\_merged.lsf.lsx",
+    r"Y:\bg3\multitool\UnpackedData\Gustav\Mods\GustavDev\Levels\CTY_Main_A\Characters\_merged.lsf.lsx",
+]
+speaker_groups_files = [
+    r"Y:\bg3\multitool\UnpackedData\Shared\Public\Shared\Voice\SpeakerGroups.lsf.lsx",
+]
+effects_files = [
+    r"Y:\bg3\multitool\UnpackedData\Shared\Public\SharedDev\Content\Assets\Effects\Effects\[PAK]_Cinematic\_merged.lsf.lsx",
+    r"Y:\bg3\multitool\UnpackedData\Shared\Public\SharedDev\Content\Assets\Effects\Effects\[PAK]_Status\_merged.lsf.lsx",
+    r"Y:\bg3\multitool\UnpackedData\Shared\Public\Shared\Content\Assets\Effects\Effects\[PAK]_Combat\_merged.lsf.lsx",
+    r"Y:\bg3\multitool\UnpackedData\Shared\Public\Shared\Content\Assets\Effects\Effects\[PAK]_Cinematics\_merged.lsf.lsx",
+]
+
+# ================ Readers ================
+# each reads the labels out of one source file, uuid -> label
+
+def _read_templates_node(file_path: str) -> BaseNode:
+    tree = ET.parse(file_path)
+    root = tree.getroot()
+    assert root.tag == "save"
+    return BaseNode(element=root.find("region").find("node"))
+
+def read_character_labels(file_path: str) -> dict[str, str]:
+    ret = {}
+    templates = _read_templates_node(file_path)
+    for node in [BaseNode(x) for x in templates._get_children_elements("GameObjects")]:
+        if node.get_attribute_value_nonnil("Type") == "character":
+            ret[node.get_attribute_value_nonnil("MapKey")] = node.get_attribute_value_nonnil("Name")
+    return ret
+
+def read_speaker_group_labels(file_path: str) -> dict[str, tuple[str, str]]:
+    # uuid -> (name, description)
+    ret = {}
+    templates = _read_templates_node(file_path)
+    for node in [BaseNode(x) for x in templates._get_children_elements("SpeakerGroup")]:
+        ret[node.get_attribute_value_nonnil("UUID")] = (node.get_attribute_value_nonnil("Name"), node.get_attribute_value_nonnil("Description"))
+    return ret
+
+def read_effect_labels(file_path: str) -> dict[str, str]:
+    ret = {}
+    templates = _read_templates_node(file_path)
+    for node in [BaseNode(x) for x in templates._get_children_elements("Resource")]:
+        ret[node.get_attribute_value_nonnil("ID")] = node.get_attribute_value_nonnil("Name")
+    return ret
+
+# ================ Registry ================
+
+@dataclass
+class SourceLabels:
+    size: int
+    mtime_ns: int
+    labels: dict
+
+@dataclass
+class LabelRegistry:
+    characters: dict[str, str]
+    speaker_groups: dict[str, tuple[str, str]]
+    effects: dict[str, str]
+
+    def get_speaker_group_labels(self, verbose: bool = False) -> dict[str, str]:
+        if verbose:
+            return {uuid: f"{name} - {description}" for uuid, (name, description) in self.speaker_groups.items()}
+        return {uuid: name for uuid, (name, _) in self.speaker_groups.items()}
+
+_registry_path = os.path.join(CACHE_DIR, "labels.pickle")
+# every source file that feeds the registry and how to read it
+_sources: list[tuple[str, list[str], Callable[[str], dict]]] = [
+    ("characters", characters_files, read_character_labels),
+    ("speaker_groups", speaker_groups_files, read_speaker_group_labels),
+    ("effects", effects_files, read_effect_labels),
+]
+_source_labels: dict[str, SourceLabels] | None = None
+_registry: LabelRegistry | None = None
+
+def get_label_registry() -> LabelRegistry:
+    # built once and kept on disk, only the source files whose size or mtime changed are parsed again.
+    # within a process this is just a stat per source file
+    global _source_labels, _registry
+    if _source_labels is None:
+        _source_labels = {}
+        if os.path.exists(_registry_path):
+            with open(_registry_path, "rb") as f:
+                version, source_labels = pickle.load(f)
+            if version == LABEL_REGISTRY_VERSION:
+                _source_labels = source_labels
+
+    is_changed = False
+    for _, files, reader in _sources:
+        for file_path in files:
+            stat = os.stat(file_path)
+            source = _source_labels.get(file_path)
+            if source is None or source.size != stat.st_size or source.mtime_ns != stat.st_mtime_ns:
+                _source_labels[file_path] = SourceLabels(size=stat.st_size, mtime_ns=stat.st_mtime_ns, labels=reader(file_path))
+                is_changed = True
+
+    if is_changed:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{_registry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((LABEL_REGISTRY_VERSION, _source_labels), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, _registry_path)
+    if is_changed or _registry is None:
+        # later files win, same as the old per-call mappings
+        merged: dict[str, dict] = {}
+        for kind, files, _ in _sources:
+            merged[kind] = {}
+            for file_path in files:
+                merged[kind].update(_source_labels[file_path].labels)
+        _registry = LabelRegistry(characters=merged["characters"], speaker_groups=merged["speaker_groups"], effects=merged["effects"])
+    return _registry
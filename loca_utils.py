@@ -0,0 +1,146 @@
+import hashlib
+import mmap
+import os
+import struct
+import xml.etree.ElementTree as ET
+from bisect import bisect_left
+from collections.abc import Iterator, Mapping
+
+from cache_utils import CACHE_DIR
+
+# ================ Index Format ================
+# a one-time build of the .loca.xml files into one binary file that gets memory-mapped, so lookups don't need the
+# whole loca in a dict.
+#   header: magic, number of entries, sha1 of the source files' (path, size, mtime)
+#   hashes: n sorted u64, first 8 bytes of blake2b of the contentuid
+#   offsets: n+1 u64 into the blob, entry i is blob[offsets[i]:offsets[i+1]]
+#   blob: per entry a has-text byte, the contentuid, a 0 byte, then the utf-8 text
+
+LOCA_INDEX_MAGIC = b"LOCAIDX1"
+_header = struct.Struct("<8sQ20s")
+
+def _hash_contentuid(contentuid: str) -> int:
+    return int.from_bytes(hashlib.blake2b(contentuid.encode(), digest_size=8).digest(), "little")
+
+def _sources_key(source_files: list[str]) -> bytes:
+    h = hashlib.sha1()
+    for file in source_files:
+        stat = os.stat(file)
+        h.update(f"{os.path.abspath(file)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return h.digest()
+
+def _read_loca_entries(source_files: list[str]) -> dict[str, str | None]:
+    # later files override earlier ones, same as building the dict directly
+    entries: dict[str, str | None] = {}
+    for file in source_files:
+        root = None
+        for event, element in ET.iterparse(file, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = element
+                    assert root.tag == "contentList"
+                continue
+            if element is root:
+                continue
+            entries[element.attrib["contentuid"]] = element.text
+            root.clear()
+    return entries
+
+def build_loca_index(source_files: list[str], index_path: str) -> None:
+    entries = _read_loca_entries(source_files)
+    hashed = sorted((_hash_contentuid(contentuid), contentuid, text) for contentuid, text in entries.items())
+
+    blob = bytearray()
+    offsets = [0]
+    for _, contentuid, text in hashed:
+        blob += b"\x01" if text is not None else b"\x00"
+        blob += contentuid.encode()
+        blob += b"\x00"
+        if text is not None:
+            blob += text.encode()
+        offsets.append(len(blob))
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_header.pack(LOCA_INDEX_MAGIC, len(hashed), _sources_key(source_files)))
+        f.write(struct.pack(f"<{len(hashed)}Q", *[x[0] for x in hashed]))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        f.write(blob)
+    os.replace(tmp_path, index_path)
+
+# ================ Index Lookup ================
+
+class LocaIndex(Mapping[str, str | None]):
+    # read-only contentuid -> text mapping, drop-in for the dict create_strings_map used to return
+    def __init__(self, index_path: str) -> None:
+        self._file = open(index_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, _ = _header.unpack_from(self._mmap, 0)
+        assert magic == LOCA_INDEX_MAGIC, f"{index_path} is not a loca index"
+        self._count = count
+        hashes_start = _header.size
+        offsets_start = hashes_start + 8 * count
+        self._blob_start = offsets_start + 8 * (count + 1)
+        view = memoryview(self._mmap)
+        self._hashes = view[hashes_start:offsets_start].cast("Q")
+        self._offsets = view[offsets_start:self._blob_start].cast("Q")
+
+    @classmethod
+    def open(cls, source_files: list[str], index_path: str | None = None) -> "LocaIndex":
+        # builds the index if it doesn't exist or any of the source files changed since
+        if index_path is None:
+            index_path = os.path.join(CACHE_DIR, "english.loca.idx")
+        sources_key = _sources_key(source_files)
+        is_current = False
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                header = f.read(_header.size)
+            if len(header) == _header.size:
+                magic, _, stored_sources_key = _header.unpack(header)
+                is_current = magic == LOCA_INDEX_MAGIC and stored_sources_key == sources_key
+        if not is_current:
+            print(f"Building loca index {index_path}")
+            build_loca_index(source_files=source_files, index_path=index_path)
+        return cls(index_path)
+
+    def _read_entry(self, i: int) -> tuple[str, str | None]:
+        start = self._blob_start + self._offsets[i]
+        end = self._blob_start + self._offsets[i + 1]
+        separator = self._mmap.find(b"\x00", start + 1, end)
+        contentuid = self._mmap[start + 1:separator].decode()
+        if self._mmap[start] == 0:
+            return contentuid, None
+        return contentuid, self._mmap[separator + 1:end].decode()
+
+    def _find(self, contentuid: str) -> int | None:
+        h = _hash_contentuid(contentuid)
+        i = bisect_left(self._hashes, h)
+        # 64 bit hashes can still collide, check the stored contentuid
+        while i < self._count and self._hashes[i] == h:
+            if self._read_entry(i)[0] == contentuid:
+                return i
+            i += 1
+        return None
+
+    def __getitem__(self, contentuid: str) -> str | None:
+        i = self._find(contentuid)
+        if i is None:
+            raise KeyError(contentuid)
+        return self._read_entry(i)[1]
+
+    def __contains__(self, contentuid: object) -> bool:
+        return isinstance(contentuid, str) and self._find(contentuid) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._count):
+            yield self._read_entry(i)[0]
+
+    def close(self) -> None:
+        self._hashes.release()
+        self._offsets.release()
+        self._mmap.close()
+        self._file.close()
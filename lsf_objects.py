@@ -0,0 +1,166 @@
+import struct
+from dataclasses import dataclass
+
+# ================ LSF Format ================
+# layout of the binary .lsf resources, as read and written by LSLib
+
+LSF_MAGIC = b"LSOF"
+
+LSF_VERSION_INITIAL = 1
+LSF_VERSION_CHUNKED_COMPRESS = 2 # nodes/attributes/values are lz4 frames instead of blocks
+LSF_VERSION_EXTENDED_NODES = 3 # long node and attribute entries, if the metadata says so
+LSF_VERSION_BG3 = 4
+LSF_VERSION_BG3_EXTENDED_HEADER = 5 # 64 bit engine version
+LSF_VERSION_BG3_ADDITIONAL_BLOB = 6 # keys section sizes in the metadata
+LSF_VERSION_BG3_PATCH3 = 7
+LSF_MAX_VERSION = 7
+
+# metadata format, how nodes and attributes link up and whether there is a keys section
+LSF_METADATA_NONE = 0
+LSF_METADATA_KEYS_AND_ADJACENCY = 1
+LSF_METADATA_NONE2 = 2
+
+magic_struct = struct.Struct("<4sI")
+header_v4_struct = struct.Struct("<i") # engine version, before LSF_VERSION_BG3_EXTENDED_HEADER
+header_v5_struct = struct.Struct("<q")
+# strings, nodes, attributes, values (uncompressed size, size on disk), compression flags, 3 unknown bytes, metadata format
+metadata_v5_struct = struct.Struct("<8IBBHI")
+# same with the keys section after strings
+metadata_v6_struct = struct.Struct("<10IBBHI")
+
+# name hash table index, parent index, next sibling index, first attribute index
+node_entry_v3_struct = struct.Struct("<Iiii")
+# name hash table index, first attribute index, parent index
+node_entry_v2_struct = struct.Struct("<Iii")
+# name hash table index, type and length, next attribute index, value offset
+attribute_entry_v3_struct = struct.Struct("<IIiI")
+# name hash table index, type and length, node index
+attribute_entry_v2_struct = struct.Struct("<IIi")
+# node index, key name hash table index
+key_entry_struct = struct.Struct("<II")
+
+@dataclass
+class LsfMetadata:
+    version: int
+    engine_version: int
+    strings_uncompressed_size: int
+    strings_size_on_disk: int
+    keys_uncompressed_size: int
+    keys_size_on_disk: int
+    nodes_uncompressed_size: int
+    nodes_size_on_disk: int
+    attributes_uncompressed_size: int
+    attributes_size_on_disk: int
+    values_uncompressed_size: int
+    values_size_on_disk: int
+    compression_flags: int
+    metadata_format: int
+
+    def has_adjacency(self) -> bool:
+        return self.version >= LSF_VERSION_EXTENDED_NODES and self.metadata_format == LSF_METADATA_KEYS_AND_ADJACENCY
+
+# major, minor, revision, build as shown in the lsx <version> node
+def unpack_engine_version(engine_version: int, version: int) -> tuple[int, int, int, int]:
+    if version >= LSF_VERSION_BG3_EXTENDED_HEADER:
+        return ((engine_version >> 55) & 0x7F, (engine_version >> 47) & 0xFF, (engine_version >> 31) & 0xFFFF, engine_version & 0x7FFFFFFF)
+    return ((engine_version >> 28) & 0x0F, (engine_version >> 24) & 0x0F, (engine_version >> 16) & 0xFF, engine_version & 0xFFFF)
+
+# names are stored in a hash table, the index packs the bucket and the position in it
+def split_name_index(name_index: int) -> tuple[int, int]:
+    return name_index >> 16, name_index & 0xFFFF
+
+# ================ Attribute Types ================
+# type id -> the type string lsx uses
+
+attribute_type_names = [
+    "None", "uint8", "int16", "uint16", "int32", "uint32", "float", "double",
+    "ivec2", "ivec3", "ivec4", "fvec2", "fvec3", "fvec4",
+    "mat2x2", "mat3x3", "mat3x4", "mat4x3", "mat4x4",
+    "bool", "string", "path", "FixedString", "LSString",
+    "uint64", "ScratchBuffer", "old_int64", "int8",
+    "TranslatedString", "WString", "LSWString", "guid", "int64", "TranslatedFSString",
+]
+attribute_type_ids = {name: i for i, name in enumerate(attribute_type_names)}
+
+TYPE_NONE = 0
+TYPE_FLOAT = 6
+TYPE_DOUBLE = 7
+TYPE_BOOL = 19
+TYPE_SCRATCH_BUFFER = 25
+TYPE_TRANSLATED_STRING = 28
+TYPE_GUID = 31
+TYPE_TRANSLATED_FS_STRING = 33
+string_type_ids = {20, 21, 22, 23, 29, 30}
+
+# fixed size types, struct format and whether the values are floats
+scalar_formats: dict[int, tuple[str, bool]] = {
+    1: ("<B", False), 2: ("<h", False), 3: ("<H", False), 4: ("<i", False), 5: ("<I", False),
+    6: ("<f", True), 7: ("<d", True),
+    8: ("<2i", False), 9: ("<3i", False), 10: ("<4i", False),
+    11: ("<2f", True), 12: ("<3f", True), 13: ("<4f", True),
+    14: ("<4f", True), 15: ("<9f", True), 16: ("<12f", True), 17: ("<12f", True), 18: ("<16f", True),
+    19: ("<B", False),
+    24: ("<Q", False), 26: ("<q", False), 27: ("<b", False), 32: ("<q", False),
+}
+scalar_structs = {type_id: struct.Struct(fmt) for type_id, (fmt, _) in scalar_formats.items()}
+# byte size of every fixed size type
+value_sizes = {type_id: scalar_struct.size for type_id, scalar_struct in scalar_structs.items()} | {TYPE_GUID: 16}
+
+# ================ Value Formatting ================
+# lsx values are written the way .NET formats them, so a tree read from .lsf matches the exported .lsx
+
+def _format_digits(is_negative: bool, digits: str, scale: int, max_digits: int) -> str:
+    # digits without leading/trailing zeros, value is 0.digits * 10^scale. same rules as .NET's "G" format
+    sign = "-" if is_negative else ""
+    if scale > max(len(digits), max_digits) or scale < -3:
+        exponent = scale - 1
+        mantissa = digits[0] if len(digits) == 1 else f"{digits[0]}.{digits[1:]}"
+        return f"{sign}{mantissa}E{'+' if exponent >= 0 else '-'}{abs(exponent):02d}"
+    if scale <= 0:
+        return f"{sign}0.{'0' * -scale}{digits}"
+    if scale >= len(digits):
+        return f"{sign}{digits}{'0' * (scale - len(digits))}"
+    return f"{sign}{digits[:scale]}.{digits[scale:]}"
+
+def _format_shortest(value: float, shortest: str, max_digits: int) -> str:
+    # shortest is a round-tripping "d.ddde+xx" string for value
+    if value in (float("inf"), float("-inf")):
+        return "Infinity" if value > 0 else "-Infinity"
+    is_negative = shortest.startswith("-")
+    if value == 0:
+        return "-0" if is_negative else "0"
+    mantissa, exponent = shortest.lstrip("-").split("e")
+    digits = mantissa.replace(".", "").rstrip("0")
+    return _format_digits(is_negative, digits, int(exponent) + 1, max_digits)
+
+_float32 = struct.Struct("<f")
+
+def format_float32(value: float) -> str:
+    # value has to be exactly representable as float32 (ie it came out of struct "<f")
+    if value != value:
+        return "NaN"
+    packed = _float32.pack(value)
+    for precision in range(0, 9):
+        candidate = f"{value:.{precision}e}"
+        try:
+            if _float32.pack(float(candidate)) == packed:
+                return _format_shortest(value, candidate, max_digits=9)
+        except OverflowError:
+            # rounded up past the largest float32
+            continue
+    return _format_shortest(value, f"{value:.8e}", max_digits=9)
+
+def format_float64(value: float) -> str:
+    if value != value:
+        return "NaN"
+    for precision in range(0, 17):
+        candidate = f"{value:.{precision}e}"
+        if float(candidate) == value:
+            return _format_shortest(value, candidate, max_digits=15)
+    return _format_shortest(value, f"{value:.16e}", max_digits=15)
+
+def format_guid(data: bytes) -> str:
+    # .NET Guid byte order, then the last 8 bytes swapped in pairs (lslib's bswap_guids)
+    d1, d2, d3 = struct.unpack_from("<IHH", data, 0)
+    tail = bytes((data[9], data[8], data[11], data[10], data[13], data[12], data[15], data[14])).hex()
+    return f"{d1:08x}-{d2:04x}-{d3:04x}-{tail[:4]}-{tail[4:]}"
@@ -0,0 +1,287 @@
+import base64
+from sys import intern
+import xml.etree.ElementTree as ET
+
+from base_objects import add_parsed_indexes
+from compression_utils import decompress, compression_method, COMPRESSION_NONE
+from lsf_objects import (
+    LSF_MAGIC, LSF_MAX_VERSION, LSF_VERSION_INITIAL, LSF_VERSION_CHUNKED_COMPRESS, LSF_VERSION_BG3, LSF_VERSION_BG3_EXTENDED_HEADER, LSF_VERSION_BG3_ADDITIONAL_BLOB,
+    LSF_METADATA_KEYS_AND_ADJACENCY, LSF_METADATA_NONE2, LsfMetadata,
+    magic_struct, header_v4_struct, header_v5_struct, metadata_v5_struct, metadata_v6_struct,
+    node_entry_v2_struct, node_entry_v3_struct, attribute_entry_v2_struct, attribute_entry_v3_struct, key_entry_struct,
+    attribute_type_names, scalar_formats, scalar_structs, string_type_ids, value_sizes,
+    TYPE_NONE, TYPE_BOOL, TYPE_SCRATCH_BUFFER, TYPE_TRANSLATED_STRING, TYPE_GUID, TYPE_TRANSLATED_FS_STRING,
+    unpack_engine_version, format_float32, format_float64, format_guid,
+)
+from lsx_incremental import LsxSource
+from lsx_loader import load_lsx
+
+# ================ LSF Reader ================
+# reads a binary .lsf into the same ElementTree ET.parse gives for its .lsf.lsx export, so the tree wrappers
+# work on either
+
+# ---------------- Headers and sections ----------------
+
+def read_lsf_metadata(data: bytes) -> tuple[LsfMetadata, int]:
+    # returns the metadata and where the first section starts
+    magic, version = magic_struct.unpack_from(data, 0)
+    assert magic == LSF_MAGIC, f"Not an lsf file, magic is {magic}"
+    assert LSF_VERSION_INITIAL <= version <= LSF_MAX_VERSION, f"Unsupported lsf version {version}"
+    pos = magic_struct.size
+    if version >= LSF_VERSION_BG3_EXTENDED_HEADER:
+        (engine_version,) = header_v5_struct.unpack_from(data, pos)
+        pos += header_v5_struct.size
+    else:
+        (engine_version,) = header_v4_struct.unpack_from(data, pos)
+        pos += header_v4_struct.size
+
+    if version >= LSF_VERSION_BG3_ADDITIONAL_BLOB:
+        (strings_uncompressed, strings_on_disk, keys_uncompressed, keys_on_disk, nodes_uncompressed, nodes_on_disk,
+         attributes_uncompressed, attributes_on_disk, values_uncompressed, values_on_disk,
+         compression_flags, _, _, metadata_format) = metadata_v6_struct.unpack_from(data, pos)
+        pos += metadata_v6_struct.size
+    else:
+        (strings_uncompressed, strings_on_disk, nodes_uncompressed, nodes_on_disk,
+         attributes_uncompressed, attributes_on_disk, values_uncompressed, values_on_disk,
+         compression_flags, _, _, metadata_format) = metadata_v5_struct.unpack_from(data, pos)
+        keys_uncompressed, keys_on_disk = 0, 0
+        pos += metadata_v5_struct.size
+
+    return LsfMetadata(
+        version=version,
+        engine_version=engine_version,
+        strings_uncompressed_size=strings_uncompressed,
+        strings_size_on_disk=strings_on_disk,
+        keys_uncompressed_size=keys_uncompressed,
+        keys_size_on_disk=keys_on_disk,
+        nodes_uncompressed_size=nodes_uncompressed,
+        nodes_size_on_disk=nodes_on_disk,
+        attributes_uncompressed_size=attributes_uncompressed,
+        attributes_size_on_disk=attributes_on_disk,
+        values_uncompressed_size=values_uncompressed,
+        values_size_on_disk=values_on_disk,
+        compression_flags=compression_flags,
+        metadata_format=metadata_format,
+    ), pos
+
+def _read_section(data: bytes, pos: int, size_on_disk: int, uncompressed_size: int, metadata: LsfMetadata, allow_chunked: bool) -> tuple[bytes, int]:
+    # returns the section and where the next one starts
+    if uncompressed_size == 0:
+        return b"", pos
+    if size_on_disk == 0:
+        # stored as is
+        return data[pos:pos + uncompressed_size], pos + uncompressed_size
+    if compression_method(metadata.compression_flags) == COMPRESSION_NONE:
+        return data[pos:pos + uncompressed_size], pos + uncompressed_size
+    chunked = metadata.version >= LSF_VERSION_CHUNKED_COMPRESS and allow_chunked
+    section = decompress(data[pos:pos + size_on_disk], uncompressed_size, metadata.compression_flags, chunked=chunked)
+    return section, pos + size_on_disk
+
+def _read_names(strings: bytes) -> list[list[str]]:
+    names = []
+    bucket_count = int.from_bytes(strings[:4], "little")
+    pos = 4
+    for _ in range(bucket_count):
+        bucket = []
+        string_count = int.from_bytes(strings[pos:pos + 2], "little")
+        pos += 2
+        for _ in range(string_count):
+            length = int.from_bytes(strings[pos:pos + 2], "little")
+            pos += 2
+            # node and attribute ids, interned like in lsx_loader
+            bucket.append(intern(strings[pos:pos + length].decode("utf-8", errors="replace")))
+            pos += length
+        names.append(bucket)
+    return names
+
+# ---------------- Values ----------------
+
+def _read_string(values: bytes, offset: int, length: int) -> str:
+    # length counts the 0 terminator
+    if length == 0:
+        return ""
+    return values[offset:offset + length - 1].decode("utf-8", errors="replace")
+
+def _read_length_prefixed_string(values: bytes, offset: int) -> tuple[str, int]:
+    length = int.from_bytes(values[offset:offset + 4], "little", signed=True)
+    return _read_string(values, offset + 4, length), offset + 4 + length
+
+def _read_translated_fs_string(values: bytes, offset: int, is_bg3: bool, element: ET.Element) -> int:
+    # fills in value/handle/arguments on element and returns the offset after the string. bg3 stores a version
+    # instead of the value, LSLib doesn't export it for these so neither do we
+    if is_bg3:
+        offset += 2
+        value = ""
+    else:
+        value, offset = _read_length_prefixed_string(values, offset)
+    handle, offset = _read_length_prefixed_string(values, offset)
+    argument_count = int.from_bytes(values[offset:offset + 4], "little", signed=True)
+    offset += 4
+    element.set("value", value)
+    element.set("handle", handle)
+    element.set("arguments", str(argument_count))
+    if argument_count > 0:
+        arguments = ET.SubElement(element, "arguments")
+        for _ in range(argument_count):
+            key, offset = _read_length_prefixed_string(values, offset)
+            argument = ET.SubElement(arguments, "argument", {"key": key})
+            string = ET.Element("string")
+            offset = _read_translated_fs_string(values, offset, is_bg3, string)
+            argument_value, offset = _read_length_prefixed_string(values, offset)
+            argument.set("value", argument_value)
+            argument.append(string)
+    return offset
+
+def _format_value(type_id: int, raw: bytes) -> str:
+    # value string of a fixed size type, raw is exactly its bytes
+    if type_id == TYPE_GUID:
+        return intern(format_guid(raw))
+    if type_id == TYPE_BOOL:
+        return "True" if raw[0] != 0 else "False"
+    unpacked = scalar_structs[type_id].unpack(raw)
+    if not scalar_formats[type_id][1]:
+        return " ".join(map(str, unpacked))
+    if scalar_formats[type_id][0].endswith("f"):
+        return " ".join(map(format_float32, unpacked))
+    return " ".join(map(format_float64, unpacked))
+
+def _add_attribute_element(parent: ET.Element, attribute_id: str, type_id: int, values: bytes, offset: int, length: int, is_bg3: bool, value_strings: dict[int, dict[bytes, str]]) -> None:
+    # value_strings is type -> raw bytes -> value string for the fixed size types. the same few floats, vectors and
+    # guids repeat all over a file, so each one is only formatted once
+    type_name = attribute_type_names[type_id]
+    type_strings = value_strings.get(type_id)
+    if type_strings is not None:
+        raw = values[offset:offset + value_sizes[type_id]]
+        value = type_strings.get(raw)
+        if value is None:
+            value = type_strings[raw] = _format_value(type_id, raw)
+        ET.SubElement(parent, "attribute", {"id": attribute_id, "type": type_name, "value": value})
+        return
+    if type_id in string_type_ids:
+        ET.SubElement(parent, "attribute", {"id": attribute_id, "type": type_name, "value": _read_string(values, offset, length)})
+        return
+    if type_id == TYPE_TRANSLATED_STRING:
+        if is_bg3:
+            version = int.from_bytes(values[offset:offset + 2], "little")
+            handle, _ = _read_length_prefixed_string(values, offset + 2)
+            ET.SubElement(parent, "attribute", {"id": attribute_id, "type": type_name, "handle": handle, "version": str(version)})
+        else:
+            value, offset = _read_length_prefixed_string(values, offset)
+            handle, _ = _read_length_prefixed_string(values, offset)
+            ET.SubElement(parent, "attribute", {"id": attribute_id, "type": type_name, "handle": handle, "value": value})
+    elif type_id == TYPE_TRANSLATED_FS_STRING:
+        element = ET.SubElement(parent, "attribute", {"id": attribute_id, "type": type_name})
+        _read_translated_fs_string(values, offset, is_bg3, element)
+    elif type_id == TYPE_SCRATCH_BUFFER:
+        ET.SubElement(parent, "attribute", {"id": attribute_id, "type": type_name, "value": base64.b64encode(values[offset:offset + length]).decode("ascii")})
+    else:
+        assert type_id == TYPE_NONE, f"Unknown attribute type {type_id}"
+        ET.SubElement(parent, "attribute", {"id": attribute_id, "type": type_name})
+
+# ---------------- Tree ----------------
+
+def _lslib_meta(metadata: LsfMetadata) -> str:
+    meta = ["v1", "bswap_guids"]
+    if metadata.metadata_format == LSF_METADATA_KEYS_AND_ADJACENCY:
+        meta.append("lsf_keys_adjacency")
+    elif metadata.metadata_format == LSF_METADATA_NONE2:
+        meta.append("lsf_adjacency")
+    return ",".join(meta)
+
+def read_lsf_bytes(data: bytes) -> ET.ElementTree:
+    metadata, pos = read_lsf_metadata(data)
+    strings, pos = _read_section(data, pos, metadata.strings_size_on_disk, metadata.strings_uncompressed_size, metadata, allow_chunked=False)
+    nodes, pos = _read_section(data, pos, metadata.nodes_size_on_disk, metadata.nodes_uncompressed_size, metadata, allow_chunked=True)
+    attributes, pos = _read_section(data, pos, metadata.attributes_size_on_disk, metadata.attributes_uncompressed_size, metadata, allow_chunked=True)
+    values, pos = _read_section(data, pos, metadata.values_size_on_disk, metadata.values_uncompressed_size, metadata, allow_chunked=True)
+    keys = b""
+    if metadata.metadata_format == LSF_METADATA_KEYS_AND_ADJACENCY:
+        keys, pos = _read_section(data, pos, metadata.keys_size_on_disk, metadata.keys_uncompressed_size, metadata, allow_chunked=True)
+
+    # name index -> name, so every entry is a single lookup
+    names = {(bucket << 16) | position: name for bucket, bucket_names in enumerate(_read_names(strings)) for position, name in enumerate(bucket_names)}
+
+    has_adjacency = metadata.has_adjacency()
+    # (name, parent index, first attribute index) per node
+    if has_adjacency:
+        node_entries = [(names[name], parent, first_attribute) for name, parent, _, first_attribute in node_entry_v3_struct.iter_unpack(nodes)]
+    else:
+        node_entries = [(names[name], parent, first_attribute) for name, first_attribute, parent in node_entry_v2_struct.iter_unpack(nodes)]
+
+    # (name, type, length, value offset, next attribute index) per attribute
+    attribute_entries: list[tuple[str, int, int, int, int]] = []
+    if has_adjacency:
+        attribute_entries = [(names[name], type_and_length & 0x3F, type_and_length >> 6, offset, next_attribute)
+                             for name, type_and_length, next_attribute, offset in attribute_entry_v3_struct.iter_unpack(attributes)]
+    else:
+        # the old entries only know their node, values are back to back and attributes of a node are chained in order
+        offset = 0
+        last_attribute_of_node: dict[int, int] = {}
+        for i, (name, type_and_length, node_index) in enumerate(attribute_entry_v2_struct.iter_unpack(attributes)):
+            length = type_and_length >> 6
+            previous = last_attribute_of_node.get(node_index)
+            if previous is not None:
+                entry = attribute_entries[previous]
+                attribute_entries[previous] = (entry[0], entry[1], entry[2], entry[3], i)
+            last_attribute_of_node[node_index] = i
+            attribute_entries.append((names[name], type_and_length & 0x3F, length, offset, -1))
+            offset += length
+
+    node_keys: dict[int, str] = {}
+    for node_index, key_name in key_entry_struct.iter_unpack(keys):
+        node_keys[node_index] = names[key_name]
+
+    root = ET.Element("save")
+    major, minor, revision, build = unpack_engine_version(metadata.engine_version, metadata.version)
+    ET.SubElement(root, "version", {"major": str(major), "minor": str(minor), "revision": str(revision), "build": str(build), "lslib_meta": _lslib_meta(metadata)})
+
+    is_bg3 = metadata.version >= LSF_VERSION_BG3
+    value_strings: dict[int, dict[bytes, str]] = {type_id: {} for type_id in value_sizes}
+    node_elements: list[ET.Element] = []
+    # the <children> element of each node, made when its first child shows up so it comes after the attributes
+    children_elements: dict[int, ET.Element] = {}
+    # see "Parsed Indexes" in base_objects, the children indexes come for free here
+    attribute_indexes: dict[ET.Element, dict[str, ET.Element] | None] = {}
+    children_indexes: dict[ET.Element, dict[str, list[ET.Element]]] = {}
+    for node_index, (name, parent, first_attribute) in enumerate(node_entries):
+        node_attrib = {"id": name}
+        if node_index in node_keys:
+            node_attrib["key"] = node_keys[node_index]
+        element = ET.Element("node", node_attrib)
+        attribute_index = first_attribute
+        while attribute_index != -1:
+            attribute_name, type_id, length, offset, attribute_index = attribute_entries[attribute_index]
+            _add_attribute_element(element, attribute_name, type_id, values, offset, length, is_bg3, value_strings)
+        attribute_indexes[element] = None
+
+        if parent == -1:
+            region = ET.SubElement(root, "region", {"id": name})
+            region.append(element)
+        else:
+            children = children_elements.get(parent)
+            if children is None:
+                parent_element = node_elements[parent]
+                children = ET.SubElement(parent_element, "children")
+                children_elements[parent] = children
+                children_indexes[children] = {}
+            children.append(element)
+            children_indexes[children].setdefault(name, []).append(element)
+        node_elements.append(element)
+    add_parsed_indexes(root, attribute_indexes, children_indexes)
+    return ET.ElementTree(root)
+
+def read_lsf(file_path: str) -> ET.ElementTree:
+    with open(file_path, "rb") as f:
+        return read_lsf_bytes(f.read())
+
+def parse_resource_file(file_path: str) -> ET.ElementTree:
+    # binary .lsf or its .lsx export
+    if file_path.lower().endswith(".lsf"):
+        return read_lsf(file_path)
+    return ET.parse(file_path)
+
+def parse_resource_file_with_source(file_path: str) -> tuple[ET.ElementTree, LsxSource | None]:
+    # an .lsx also records where each element came from, so it can be written back incrementally
+    if file_path.lower().endswith(".lsf"):
+        return read_lsf(file_path), None
+    return load_lsx(file_path)
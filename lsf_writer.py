@@ -0,0 +1,219 @@
+import base64
+import struct
+import uuid
+import xml.etree.ElementTree as ET
+import zlib
+
+from compression_utils import compress, compression_method, COMPRESSION_NONE, COMPRESSION_LEVEL_DEFAULT, DEFAULT_COMPRESSION_METHOD
+from lsf_objects import (
+    LSF_MAGIC, LSF_VERSION_BG3_PATCH3, LSF_METADATA_KEYS_AND_ADJACENCY,
+    magic_struct, header_v5_struct, metadata_v6_struct, node_entry_v3_struct, attribute_entry_v3_struct, key_entry_struct,
+    attribute_type_ids, scalar_formats, scalar_structs, string_type_ids,
+    TYPE_NONE, TYPE_BOOL, TYPE_SCRATCH_BUFFER, TYPE_TRANSLATED_STRING, TYPE_GUID, TYPE_TRANSLATED_FS_STRING,
+)
+from lsx_incremental import LsxSource, write_lsx_incremental
+from lsx_writer import write_lsx
+
+# ================ LSF Writer ================
+# writes a tree in the .lsf.lsx layout straight to a binary .lsf, the same way LSLib converts it:
+# latest BG3 version, keys and adjacency metadata, lz4 compressed sections (zlib without the lz4 package)
+
+LSF_DEFAULT_COMPRESSION = DEFAULT_COMPRESSION_METHOD | COMPRESSION_LEVEL_DEFAULT
+# buckets of the name hash table
+_NAME_BUCKET_COUNT = 0x200
+
+_u16 = struct.Struct("<H")
+_i32 = struct.Struct("<i")
+
+class _NameTable:
+    # interns node/attribute/key names, each one is stored once and referenced by bucket << 16 | position
+    def __init__(self) -> None:
+        self._buckets: list[list[str]] = [[] for _ in range(_NAME_BUCKET_COUNT)]
+        self._indexes: dict[str, int] = {}
+
+    def index_of(self, name: str) -> int:
+        ret = self._indexes.get(name)
+        if ret is None:
+            h = zlib.crc32(name.encode("utf-8"))
+            bucket_index = (h & 0x1FF) ^ ((h >> 9) & 0x1FF) ^ ((h >> 18) & 0x1FF) ^ ((h >> 27) & 0x1FF)
+            bucket = self._buckets[bucket_index]
+            assert len(bucket) < 0x10000, "Too many names in one bucket"
+            ret = (bucket_index << 16) | len(bucket)
+            bucket.append(name)
+            self._indexes[name] = ret
+        return ret
+
+    def to_bytes(self) -> bytes:
+        out = bytearray(struct.pack("<I", len(self._buckets)))
+        for bucket in self._buckets:
+            out += _u16.pack(len(bucket))
+            for name in bucket:
+                encoded = name.encode("utf-8")
+                out += _u16.pack(len(encoded))
+                out += encoded
+        return bytes(out)
+
+# ---------------- Values ----------------
+
+def _string_bytes(value: str) -> bytes:
+    return value.encode("utf-8") + b"\0"
+
+def _length_prefixed_string_bytes(value: str) -> bytes:
+    encoded = _string_bytes(value)
+    return _i32.pack(len(encoded)) + encoded
+
+def _guid_bytes(value: str) -> bytes:
+    # inverse of lsf_objects.format_guid
+    data = uuid.UUID(value).bytes_le
+    return data[:8] + bytes((data[9], data[8], data[11], data[10], data[13], data[12], data[15], data[14]))
+
+def _translated_fs_string_bytes(element: ET.Element) -> bytes:
+    out = bytearray(_u16.pack(int(element.get("version", "0"))))
+    out += _length_prefixed_string_bytes(element.get("handle", ""))
+    arguments = element.find("arguments")
+    argument_elements = [] if arguments is None else arguments.findall("argument")
+    out += _i32.pack(len(argument_elements))
+    for argument in argument_elements:
+        out += _length_prefixed_string_bytes(argument.get("key", ""))
+        string = argument.find("string")
+        assert string is not None, f"TranslatedFSString argument {argument.get('key')} has no string"
+        out += _translated_fs_string_bytes(string)
+        out += _length_prefixed_string_bytes(argument.get("value", ""))
+    return bytes(out)
+
+def _attribute_value_bytes(element: ET.Element, type_id: int) -> bytes:
+    value = element.get("value", "")
+    if type_id in string_type_ids:
+        return _string_bytes(value)
+    if type_id == TYPE_GUID:
+        return _guid_bytes(value)
+    if type_id == TYPE_BOOL:
+        return b"\1" if value.lower() in ("true", "1") else b"\0"
+    if type_id in scalar_structs:
+        is_float = scalar_formats[type_id][1]
+        parts = [float(x) if is_float else int(x) for x in value.split()]
+        return scalar_structs[type_id].pack(*parts)
+    if type_id == TYPE_TRANSLATED_STRING:
+        return _u16.pack(int(element.get("version", "0"))) + _length_prefixed_string_bytes(element.get("handle", ""))
+    if type_id == TYPE_TRANSLATED_FS_STRING:
+        return _translated_fs_string_bytes(element)
+    if type_id == TYPE_SCRATCH_BUFFER:
+        return base64.b64decode(value)
+    assert type_id == TYPE_NONE, f"Unknown attribute type {type_id}"
+    return b""
+
+# ---------------- Tree ----------------
+
+class _LsfSections:
+    def __init__(self) -> None:
+        self.names = _NameTable()
+        # [name, parent, next sibling, first attribute] per node, in document order
+        self.nodes: list[list[int]] = []
+        # [name, type and length, next attribute, value offset] per attribute
+        self.attributes: list[list[int]] = []
+        self.values = bytearray()
+        self.keys: list[tuple[int, int]] = []
+
+    def add_node(self, element: ET.Element, parent_index: int) -> int:
+        node_index = len(self.nodes)
+        node_entry = [self.names.index_of(element.get("id")), parent_index, -1, -1]
+        self.nodes.append(node_entry)
+        key = element.get("key")
+        if key is not None:
+            self.keys.append((node_index, self.names.index_of(key)))
+
+        previous_attribute = None
+        children = None
+        for child in element:
+            if child.tag == "attribute":
+                type_name = child.get("type")
+                type_id = attribute_type_ids.get(type_name)
+                assert type_id is not None, f"Unknown attribute type {type_name} on {child.get('id')}"
+                value = _attribute_value_bytes(child, type_id)
+                attribute_index = len(self.attributes)
+                self.attributes.append([self.names.index_of(child.get("id")), type_id | (len(value) << 6), -1, len(self.values)])
+                self.values += value
+                if previous_attribute is None:
+                    node_entry[3] = attribute_index
+                else:
+                    self.attributes[previous_attribute][2] = attribute_index
+                previous_attribute = attribute_index
+            elif child.tag == "children":
+                children = child
+
+        if children is not None:
+            previous_child = None
+            for child in children:
+                # comments and such
+                if child.tag != "node":
+                    continue
+                child_index = self.add_node(child, node_index)
+                if previous_child is not None:
+                    self.nodes[previous_child][2] = child_index
+                previous_child = child_index
+        return node_index
+
+def _pack_engine_version(version_element: ET.Element) -> int:
+    major, minor, revision, build = (int(version_element.get(x, "0")) for x in ("major", "minor", "revision", "build"))
+    return (major << 55) | (minor << 47) | (revision << 31) | build
+
+def write_lsf_bytes(tree: ET.ElementTree | ET.Element, compression_flags: int = LSF_DEFAULT_COMPRESSION) -> bytes:
+    root = tree.getroot() if isinstance(tree, ET.ElementTree) else tree
+    assert root.tag == "save"
+    version_element = root.find("version")
+    assert version_element is not None, "lsf needs the engine version from <version>"
+
+    sections = _LsfSections()
+    for region in root.findall("region"):
+        region_node = region.find("node")
+        assert region_node is not None and region_node.get("id") == region.get("id"), f"Region {region.get('id')} doesn't start with its own node"
+        sections.add_node(region_node, -1)
+
+    strings = sections.names.to_bytes()
+    nodes = b"".join(node_entry_v3_struct.pack(*x) for x in sections.nodes)
+    attributes = b"".join(attribute_entry_v3_struct.pack(*x) for x in sections.attributes)
+    values = bytes(sections.values)
+    keys = b"".join(key_entry_struct.pack(*x) for x in sections.keys)
+
+    is_compressed = compression_method(compression_flags) != COMPRESSION_NONE
+    # (uncompressed size, size on disk, data), size on disk is 0 for a section stored as is
+    def section(data: bytes, chunked: bool) -> tuple[int, int, bytes]:
+        if not is_compressed or len(data) == 0:
+            return len(data), 0, data
+        compressed = compress(data, compression_flags, chunked=chunked)
+        return len(data), len(compressed), compressed
+
+    strings_section = section(strings, chunked=False)
+    keys_section = section(keys, chunked=True)
+    nodes_section = section(nodes, chunked=True)
+    attributes_section = section(attributes, chunked=True)
+    values_section = section(values, chunked=True)
+
+    out = bytearray(magic_struct.pack(LSF_MAGIC, LSF_VERSION_BG3_PATCH3))
+    out += header_v5_struct.pack(_pack_engine_version(version_element))
+    out += metadata_v6_struct.pack(
+        strings_section[0], strings_section[1],
+        keys_section[0], keys_section[1],
+        nodes_section[0], nodes_section[1],
+        attributes_section[0], attributes_section[1],
+        values_section[0], values_section[1],
+        compression_flags if is_compressed else COMPRESSION_NONE, 0, 0, LSF_METADATA_KEYS_AND_ADJACENCY,
+    )
+    # same order the reader expects them in
+    for _, _, data in (strings_section, nodes_section, attributes_section, values_section, keys_section):
+        out += data
+    return bytes(out)
+
+def write_lsf(tree: ET.ElementTree | ET.Element, output_file_path: str, compression_flags: int = LSF_DEFAULT_COMPRESSION) -> None:
+    data = write_lsf_bytes(tree, compression_flags)
+    with open(output_file_path, "wb") as f:
+        f.write(data)
+
+def write_resource_file(tree: ET.ElementTree | ET.Element, output_file_path: str, source: LsxSource | None = None) -> None:
+    # binary .lsf or an .lsx, by extension. with a source the .lsx reuses the bytes of everything that wasn't edited
+    if output_file_path.lower().endswith(".lsf"):
+        write_lsf(tree, output_file_path)
+    elif source is not None:
+        write_lsx_incremental(tree, output_file_path, source)
+    else:
+        write_lsx(tree, output_file_path)
@@ -0,0 +1,166 @@
+import os
+import re
+import xml.etree.ElementTree as ET
+from array import array
+from weakref import WeakSet
+
+from lsx_writer import _Indentations, _write_element, write_lsx
+
+# ================ Dirty Marks ================
+# elements changed since they were parsed. the mutation helpers in base_objects mark the node or container whose
+# own content changed, the incremental writer rewrites those and everything above them and copies the rest. once it's
+# written a tree, the output is that tree's source and its marks get cleared
+
+_dirty_elements: WeakSet[ET.Element] = WeakSet()
+
+def mark_dirty(element: ET.Element) -> None:
+    _dirty_elements.add(element)
+
+def is_dirty(element: ET.Element) -> bool:
+    return element in _dirty_elements
+
+# ================ Source Spans ================
+# markup of the source file in order. comments, processing instructions, CDATA and the doctype don't become elements,
+# so they're matched only to be skipped. for tags: the "/" of an end tag, the name, and the "/" of an empty element tag
+_markup = re.compile(rb"""<(?:!--.*?-->|\?.*?\?>|!\[CDATA\[.*?\]\]>|!DOCTYPE(?:[^>\[]|\[.*?\])*>|(/?)([^\s/>!?]+)(?:\s+[^\s=/>]+\s*=\s*(?:"[^"]*"|'[^']*'))*\s*(/?)>)""", re.S)
+
+class LsxSource:
+    # every element parsed from an .lsx in document order. where each of them is in the file is only worked out by
+    # read_spans, when something gets written incrementally: starts/ends are the byte range of elements[i] and
+    # parents[i] the index of its parent or -1
+    def __init__(self, file_path: str, size: int, mtime_ns: int, elements: list[ET.Element]) -> None:
+        self.file_path = file_path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.elements = elements
+        self.newline = "\n"
+        self.starts: array | None = None
+        self.ends: array | None = None
+        self.parents: array | None = None
+        self._indexes: dict[ET.Element, int] | None = None
+
+    def __getstate__(self) -> dict:
+        # the index and spans are cheap to rebuild, no need to have them in the tree cache
+        state = self.__dict__.copy()
+        state["_indexes"] = None
+        state["starts"] = state["ends"] = state["parents"] = None
+        return state
+
+    def index_of(self, element: ET.Element) -> int | None:
+        # attributes belong to their node, they're never copied on their own since changing one only marks the node
+        if self._indexes is None:
+            self._indexes = {e: i for i, e in enumerate(self.elements) if e.tag != "attribute"}
+        return self._indexes.get(element)
+
+    def read_source(self) -> bytes | None:
+        # None if the file changed since it was parsed, the spans don't mean anything then
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        if stat.st_size != self.size or stat.st_mtime_ns != self.mtime_ns:
+            return None
+        with open(self.file_path, "rb") as f:
+            return f.read()
+
+    def read_spans(self, data: bytes) -> bool:
+        # pairs the tags in data up with the parsed elements. False if they don't line up, eg because of entities
+        # that expand to elements, the elements can't be copied from the source then
+        if self.starts is not None:
+            return True
+        elements = self.elements
+        starts = array("q", bytes(8 * len(elements)))
+        ends = array("q", starts)
+        parents = array("i", bytes(4 * len(elements)))
+        open_indexes: list[int] = []
+        index = 0
+        for match in _markup.finditer(data):
+            name = match.group(2)
+            if name is None:
+                continue
+            if match.group(1):
+                if len(open_indexes) == 0:
+                    return False
+                ends[open_indexes.pop()] = match.end()
+                continue
+            if index == len(elements) or elements[index].tag != name.decode("utf-8"):
+                return False
+            starts[index] = match.start()
+            parents[index] = open_indexes[-1] if len(open_indexes) > 0 else -1
+            if match.group(3):
+                ends[index] = match.end()
+            else:
+                open_indexes.append(index)
+            index += 1
+        if index != len(elements) or len(open_indexes) > 0:
+            return False
+
+        first_newline = data.find(b"\n")
+        self.newline = "\r\n" if first_newline > 0 and data[first_newline - 1] == ord("\r") else "\n"
+        self.starts, self.ends, self.parents = starts, ends, parents
+        return True
+
+    def rebase(self, file_path: str, root: ET.Element) -> None:
+        # file_path was just written from root, so later incremental writes copy from it instead and the dirty marks
+        # in this tree are done with. comments and processing instructions aren't elements once the file gets parsed
+        stat = os.stat(file_path)
+        self.file_path = file_path
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.elements = [x for x in root.iter() if isinstance(x.tag, str)]
+        self.starts = self.ends = self.parents = None
+        self._indexes = None
+        for element in list(_dirty_elements):
+            if self.index_of(element) is not None:
+                _dirty_elements.discard(element)
+
+    def tainted_indexes(self) -> set[int]:
+        # parsed elements that can't be copied as is: the dirty ones and everything above them
+        ret: set[int] = set()
+        for element in list(_dirty_elements):
+            index = self.index_of(element)
+            while index is not None and index != -1 and index not in ret:
+                ret.add(index)
+                index = self.parents[index]
+        return ret
+
+# ================ Incremental Writer ================
+
+def write_lsx_incremental(tree: ET.ElementTree | ET.Element, output_file_path: str, source: LsxSource) -> None:
+    # copies every element nothing marked dirty straight from the source bytes, everything else is written like write_lsx.
+    # falls back to write_lsx if the source file changed
+    root = tree.getroot() if isinstance(tree, ET.ElementTree) else tree
+    data = source.read_source()
+    root_index = source.index_of(root)
+    if data is None or root_index is None or not source.read_spans(data):
+        write_lsx(tree, output_file_path)
+        if root_index is not None:
+            source.rebase(output_file_path, root)
+        return
+    tainted = source.tainted_indexes()
+    view = memoryview(data)
+
+    with open(output_file_path, "wb") as f:
+        out: list[str] = []
+
+        def flush() -> None:
+            text = "".join(out)
+            if source.newline != "\n":
+                text = text.replace("\n", source.newline)
+            f.write(text.encode("utf-8", errors="xmlcharrefreplace"))
+            out.clear()
+
+        def splice(element: ET.Element) -> bool:
+            index = source.index_of(element)
+            if index is None or index in tainted:
+                return False
+            flush()
+            f.write(view[source.starts[index]:source.ends[index]])
+            return True
+
+        # declaration and anything else around the root stays as it was
+        f.write(view[:source.starts[root_index]])
+        _write_element(root, 0, out, _Indentations(), flush, splice)
+        flush()
+        f.write(view[source.ends[root_index]:])
+    source.rebase(output_file_path, root)
@@ -0,0 +1,43 @@
+import os
+from sys import intern
+import xml.etree.ElementTree as ET
+
+from base_objects import index_tree
+from lsx_incremental import LsxSource
+
+# ================ LSX Loader ================
+# parses an .lsx with the C parser and keeps what write_lsx_incremental needs to copy untouched elements from the
+# source later: the file it came from and every element in document order. where each element is in the file is only
+# worked out if something actually gets written incrementally, see LsxSource.
+# node ids, attribute ids and types, and guid values repeat all over a file and across the files loaded together, so
+# they're interned afterwards. the C parser only does that for the tag and attribute names
+
+def _intern_values(root: ET.Element) -> None:
+    for element in root.iter():
+        attrib = element.attrib
+        if "id" in attrib:
+            attrib["id"] = intern(attrib["id"])
+        if element.tag == "attribute":
+            if "type" in attrib:
+                attribute_type = attrib["type"] = intern(attrib["type"])
+                if attribute_type == "guid" and "value" in attrib:
+                    attrib["value"] = intern(attrib["value"])
+        elif "key" in attrib:
+            attrib["key"] = intern(attrib["key"])
+
+def load_lsx(file_path: str) -> tuple[ET.ElementTree, LsxSource]:
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    with open(file_path, "rb") as f:
+        source = f.read()
+    parser = ET.XMLParser()
+    parser.feed(source)
+    root = parser.close()
+    _intern_values(root)
+    index_tree(root)
+    return ET.ElementTree(root), LsxSource(
+        file_path=file_path,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        elements=list(root.iter()),
+    )
@@ -0,0 +1,84 @@
+import xml.etree.ElementTree as ET
+from typing import Callable
+
+# ================ LSX Writer ================
+# writes a tree exactly like ET.indent(tree, space="\t") followed by tree.write(encoding="utf-8", xml_declaration=True),
+# but in one pass and without touching .text/.tail, so the same tree can be written any number of times
+
+LSX_INDENT = "\t"
+XML_DECLARATION = "<?xml version='1.0' encoding='utf-8'?>\n"
+# number of pieces collected before they get joined and handed to the file
+_FLUSH_EVERY = 1 << 14
+
+# same escaping ElementTree.write uses
+_escape_attrib: Callable[[str], str] = ET._escape_attrib
+_escape_cdata: Callable[[str], str] = ET._escape_cdata
+
+class _Indentations:
+    # "\n" + level * LSX_INDENT, built once per level
+    def __init__(self) -> None:
+        self._indentations = ["\n"]
+
+    def __getitem__(self, level: int) -> str:
+        while len(self._indentations) <= level:
+            self._indentations.append(self._indentations[-1] + LSX_INDENT)
+        return self._indentations[level]
+
+def _write_element(element: ET.Element, level: int, out: list[str], indentations: _Indentations, flush: Callable[[], None], splice: Callable[[ET.Element], bool] | None = None) -> None:
+    # the element itself without its tail, the parent decides what the tail is.
+    # splice gets the first say on every element, if it returns True it already wrote it
+    if splice is not None and splice(element):
+        return
+    tag = element.tag
+    if tag is ET.Comment:
+        out.append(f"<!--{element.text}-->")
+        return
+    if tag is ET.ProcessingInstruction:
+        out.append(f"<?{element.text}?>")
+        return
+    assert isinstance(tag, str) and not tag.startswith("{"), f"can't write tag {tag!r} as lsx"
+
+    out.append(f"<{tag}")
+    for k, v in element.attrib.items():
+        out.append(f" {k}=\"{_escape_attrib(v)}\"")
+
+    text = element.text
+    child_count = len(element)
+    if child_count == 0:
+        if text:
+            out.append(f">{_escape_cdata(text)}</{tag}>")
+        else:
+            out.append(" />")
+        return
+
+    # same rules as ET.indent: whitespace-only text and tails get replaced, anything else is kept
+    child_indentation = indentations[level + 1]
+    if not text or not text.strip():
+        text = child_indentation
+    out.append(">")
+    out.append(_escape_cdata(text))
+    last = child_count - 1
+    for i, child in enumerate(element):
+        _write_element(child, level + 1, out, indentations, flush, splice)
+        tail = child.tail
+        if not tail or not tail.strip():
+            tail = child_indentation if i < last else indentations[level]
+        out.append(_escape_cdata(tail))
+    out.append(f"</{tag}>")
+    if len(out) >= _FLUSH_EVERY:
+        flush()
+
+def write_lsx(tree: ET.ElementTree | ET.Element, output_file_path: str) -> None:
+    root = tree.getroot() if isinstance(tree, ET.ElementTree) else tree
+    # same file mode ElementTree.write uses for a path, including newline translation
+    with open(output_file_path, "w", encoding="utf-8", errors="xmlcharrefreplace") as f:
+        out = [XML_DECLARATION]
+
+        def flush() -> None:
+            f.write("".join(out))
+            out.clear()
+
+        _write_element(root, 0, out, _Indentations(), flush)
+        if root.tail:
+            out.append(_escape_cdata(root.tail))
+        flush()
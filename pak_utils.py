@@ -0,0 +1,192 @@
+import hashlib
+import os
+import struct
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from cache_utils import CACHE_DIR, PAK_ENTRY_CACHE_DIR_NAME
+import compression_utils
+from compression_utils import compress, decompress, lz4_block_compress, lz4_block_decompress, compression_method, COMPRESSION_NONE, COMPRESSION_LZ4, COMPRESSION_LEVEL_DEFAULT, DEFAULT_COMPRESSION_METHOD
+from lsf_writer import write_lsf_bytes
+
+# ================ PAK Format ================
+# BG3 package, version 18 as written by LSLib: "LSPK", header, file data, then the lz4 compressed file list
+
+PAK_MAGIC = b"LSPK"
+PAK_VERSION_BG3 = 18
+PAK_DEFAULT_COMPRESSION = DEFAULT_COMPRESSION_METHOD | COMPRESSION_LEVEL_DEFAULT
+PAK_ENTRY_CACHE_DIR = os.path.join(CACHE_DIR, PAK_ENTRY_CACHE_DIR_NAME)
+# entries that no write has used for this long get removed by the next write that uses the cache
+PAK_ENTRY_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+
+# magic, version, file list offset, file list size, flags, priority, md5, number of parts.
+# the md5 is left zeroed, LSLib doesn't check it when it reads a v18 package and there's nothing else here to check it
+pak_header_struct = struct.Struct("<4sIQIBB16sH")
+# name, offset (low 32 bits, high 16 bits), archive part, compression flags, size on disk, uncompressed size (0 if stored)
+pak_file_entry_struct = struct.Struct("<256sIHBBII")
+_PAK_NAME_SIZE = 256
+pak_file_list_header_struct = struct.Struct("<II")
+
+@dataclass
+class PakEntry:
+    virtual_path: str
+    data: bytes
+
+# ================ Virtual Paths ================
+
+def virtual_path_for(source_path: str) -> str:
+    # path inside the pak for a file unpacked from the game, so the packed file replaces it.
+    # eg ...\Gustav\Public\GustavDev\Timeline\Generated\X.lsf.lsx -> Public/GustavDev/Timeline/Generated/X.lsf
+    parts = source_path.replace("\\", "/").split("/")
+    roots = [i for i, part in enumerate(parts) if part in ("Public", "Mods")]
+    assert len(roots) > 0, f"{source_path} isn't under a Public or Mods folder"
+    ret = "/".join(parts[roots[0]:])
+    if ret.lower().endswith(".lsf.lsx"):
+        ret = ret[:-len(".lsx")]
+    return ret
+
+def timeline_virtual_path(mod_folder: str, timeline_name: str) -> str:
+    return f"Public/{mod_folder}/Timeline/Generated/{timeline_name}.lsf"
+
+def dialog_virtual_path(mod_folder: str, dialog_name: str, dialog_folder: str = "Companions") -> str:
+    return f"Mods/{mod_folder}/Story/DialogsBinary/{dialog_folder}/{dialog_name}.lsf"
+
+# ================ Entry Cache ================
+# compressed entries by content hash, so a rebuild only compresses what changed
+
+def _entry_cache_path(data: bytes, compression_flags: int) -> str:
+    return os.path.join(PAK_ENTRY_CACHE_DIR, f"{hashlib.sha1(data).hexdigest()}_{compression_flags:02x}.bin")
+
+def _compress_entry(data: bytes, compression_flags: int, use_cache: bool) -> bytes:
+    if not use_cache:
+        return compress(data, compression_flags, chunked=False)
+    cache_path = _entry_cache_path(data, compression_flags)
+    if os.path.exists(cache_path):
+        # the mtime is when it was last used
+        os.utime(cache_path)
+        with open(cache_path, "rb") as f:
+            return f.read()
+    compressed = compress(data, compression_flags, chunked=False)
+    os.makedirs(PAK_ENTRY_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.{id(data)}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(compressed)
+    os.replace(tmp_path, cache_path)
+    return compressed
+
+def _prune_entry_cache() -> None:
+    # whatever this write used was just touched, so it's never old enough
+    if not os.path.isdir(PAK_ENTRY_CACHE_DIR):
+        return
+    oldest = time.time() - PAK_ENTRY_CACHE_MAX_AGE
+    for name in os.listdir(PAK_ENTRY_CACHE_DIR):
+        cache_path = os.path.join(PAK_ENTRY_CACHE_DIR, name)
+        if not name.endswith(".bin"):
+            continue
+        try:
+            if os.path.getmtime(cache_path) < oldest:
+                os.remove(cache_path)
+        except FileNotFoundError:
+            # another write pruned it first
+            pass
+
+# ================ Builder ================
+
+class PakBuilder:
+    def __init__(self) -> None:
+        self.entries: list[PakEntry] = []
+        self._entry_indexes: dict[str, int] = {}
+
+    def add_bytes(self, virtual_path: str, data: bytes) -> None:
+        virtual_path = virtual_path.replace("\\", "/")
+        assert len(virtual_path.encode("utf-8")) < _PAK_NAME_SIZE, f"Path too long for a pak: {virtual_path}"
+        index = self._entry_indexes.get(virtual_path)
+        if index is None:
+            self._entry_indexes[virtual_path] = len(self.entries)
+            self.entries.append(PakEntry(virtual_path=virtual_path, data=data))
+        else:
+            # added again, the last one wins
+            self.entries[index] = PakEntry(virtual_path=virtual_path, data=data)
+
+    def add_file(self, virtual_path: str, file_path: str) -> None:
+        # eg an .lsf written by write_tree
+        with open(file_path, "rb") as f:
+            self.add_bytes(virtual_path, f.read())
+
+    def add_tree(self, virtual_path: str, tree: object) -> None:
+        # TimelineTree, TimelineSceneTree, DialogTree or a plain ElementTree, stored as .lsf
+        if hasattr(tree, "flush_time_shifts"):
+            tree.flush_time_shifts()
+        tree_ref = tree._tree_ref if hasattr(tree, "_tree_ref") else tree
+        assert isinstance(tree_ref, (ET.ElementTree, ET.Element))
+        # the pak compresses the whole entry, compressing the sections as well would only make it bigger
+        self.add_bytes(virtual_path, write_lsf_bytes(tree_ref, compression_flags=COMPRESSION_NONE))
+
+    def write(self, output_file_path: str, compression_flags: int = PAK_DEFAULT_COMPRESSION, max_workers: int | None = None, use_cache: bool = True) -> None:
+        # entries are written in the order they were added. they're compressed on a thread pool, unless that would
+        # be the plain python lz4 which holds the gil the whole time
+        is_compressed = compression_method(compression_flags) != COMPRESSION_NONE
+        if not is_compressed:
+            compressed_entries = [entry.data for entry in self.entries]
+        elif compression_method(compression_flags) == COMPRESSION_LZ4 and compression_utils.lz4 is None:
+            compressed_entries = [_compress_entry(entry.data, compression_flags, use_cache) for entry in self.entries]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                compressed_entries = list(executor.map(lambda entry: _compress_entry(entry.data, compression_flags, use_cache), self.entries))
+
+        tmp_path = f"{output_file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(bytes(pak_header_struct.size))
+            file_list = bytearray()
+            for entry, compressed in zip(self.entries, compressed_entries):
+                # data that doesn't get smaller (eg an .lsf that's compressed already) is stored as is
+                is_entry_compressed = is_compressed and len(compressed) < len(entry.data)
+                if not is_entry_compressed:
+                    compressed = entry.data
+                offset = f.tell()
+                f.write(compressed)
+                file_list += pak_file_entry_struct.pack(
+                    entry.virtual_path.encode("utf-8"),
+                    offset & 0xFFFFFFFF, offset >> 32, 0,
+                    compression_flags if is_entry_compressed else COMPRESSION_NONE,
+                    len(compressed), len(entry.data) if is_entry_compressed else 0,
+                )
+
+            file_list_offset = f.tell()
+            compressed_file_list = lz4_block_compress(bytes(file_list))
+            f.write(pak_file_list_header_struct.pack(len(self.entries), len(compressed_file_list)))
+            f.write(compressed_file_list)
+            file_list_size = f.tell() - file_list_offset
+
+            f.seek(0)
+            f.write(pak_header_struct.pack(PAK_MAGIC, PAK_VERSION_BG3, file_list_offset, file_list_size, 0, 0, bytes(16), 1))
+        os.replace(tmp_path, output_file_path)
+        if is_compressed and use_cache:
+            _prune_entry_cache()
+
+# ================ Reader ================
+
+def read_pak(file_path: str) -> list[PakEntry]:
+    # every entry of a single part v18 pak, decompressed
+    with open(file_path, "rb") as f:
+        data = f.read()
+    magic, version, file_list_offset, _, _, _, _, _ = pak_header_struct.unpack_from(data, 0)
+    assert magic == PAK_MAGIC, f"Not a pak file, magic is {magic}"
+    assert version == PAK_VERSION_BG3, f"Unsupported pak version {version}"
+    file_count, compressed_size = pak_file_list_header_struct.unpack_from(data, file_list_offset)
+    start = file_list_offset + pak_file_list_header_struct.size
+    file_list = lz4_block_decompress(data[start:start + compressed_size], file_count * pak_file_entry_struct.size)
+
+    ret = []
+    for name, offset_low, offset_high, archive_part, compression_flags, size_on_disk, uncompressed_size in pak_file_entry_struct.iter_unpack(file_list):
+        assert archive_part == 0, "Multi part paks aren't supported"
+        offset = offset_low | (offset_high << 32)
+        stored = data[offset:offset + size_on_disk]
+        if compression_method(compression_flags) == COMPRESSION_NONE:
+            entry_data = stored
+        else:
+            entry_data = decompress(stored, uncompressed_size, compression_flags, chunked=False)
+        ret.append(PakEntry(virtual_path=name.rstrip(b"\0").decode("utf-8"), data=entry_data))
+    return ret
@@ -1,9 +1,11 @@
 from dataclasses import dataclass
-from base_objects import NewNode, NewAttribute, BaseNode
-from dataclasses import dataclass
-import xml.etree.ElementTree as ET
+from collections.abc import Mapping
+from base_objects import NewNode, NewAttribute
 from dialog_tree_objects import DialogSpeakerListNode, DialogNode, DialogTree
 from timeline_parser import TimelineTree
+from loca_utils import LocaIndex
+from soundbank_utils import SoundBankIndex
+from label_utils import get_label_registry
 
 from text_utils import TextEntry, TextKey
 
@@ -21,70 +23,15 @@ class PrintInfoContext:
     speakers: dict[str, str] | None
 
 def get_effect_name_mapping() -> dict[str,str]:
-    effects_files = [
-        r"Y:\bg3\multitool\UnpackedData\Shared\Public\SharedDev\Content\Assets\Effects\Effects\[PAK]_Cinematic\_merged.lsf.lsx",
-        r"Y:\bg3\multitool\UnpackedData\Shared\Public\SharedDev\Content\Assets\Effects\Effects\[PAK]_Status\_merged.lsf.lsx",
-        r"Y:\bg3\multitool\UnpackedData\Shared\Public\Shared\Content\Assets\Effects\Effects\[PAK]_Combat\_merged.lsf.lsx",
-        r"Y:\bg3\multitool\UnpackedData\Shared\Public\Shared\Content\Assets\Effects\Effects\[PAK]_Cinematics\_merged.lsf.lsx",
-    ]
-    ret = {}
-    for effects_file in effects_files:
-        tree = ET.parse(effects_file)
-        root = tree.getroot()
-        assert root.tag == "save"
-        templates = BaseNode(element=root.find("region").find("node"))
-        objects = templates._get_children_elements("Resource")
-        object_nodes = [BaseNode(x) for x in objects]
-        for node in object_nodes:
-            name = node.get_attribute_value_nonnil("Name")
-            uuid = node.get_attribute_value_nonnil("ID")
-            ret[uuid] = name
-    return ret
+    return get_label_registry().effects
 
 
 def get_characters_mapping(verbose: bool = False) -> dict[str, str]:
-    characters_files = [
-        r"Y:\bg3\multitool\UnpackedMods\Gustav\Mods\Gustav\Globals\WLD_Main_A\Characters\_merged.lsf.lsx", 
-        r"Y:\bg3\multitool\UnpackedData\Gustav\Mods\GustavDev\Globals\BGO_Main_A\Characters\_merged.lsf.lsx",
-        r"Y:\bg3\multitool\UnpackedData\Gustav\Mods\GustavDev\Globals\CTY_Main_A\Characters\_merged.lsf.lsx",
-        r"Y:\bg3\multitool\UnpackedData\Gustav\Mods\GustavDev\Levels\CTY_Main_A\Characters\_merged.lsf.lsx"]
     # returns a mapping of character uuids to label
-    ret = {}
-    for characters_file in characters_files:
-        tree = ET.parse(characters_file)
-        root = tree.getroot()
-        assert root.tag == "save"
-        
-        templates = BaseNode(element=root.find("region").find("node"))
-        objects = templates._get_children_elements("GameObjects")
-        object_nodes = [BaseNode(x) for x in objects]
-        for node in object_nodes:
-            if node.get_attribute_value_nonnil("Type") == "character":
-                name = node.get_attribute_value_nonnil("Name")
-                uuid = node.get_attribute_value_nonnil("MapKey")
-                ret[uuid] = name
-    return ret
+    return get_label_registry().characters
 
 def get_speaker_group_mapping(verbose: bool = False) -> dict[str,str]:
-    speakers_file = r"Y:\bg3\multitool\UnpackedData\Shared\Public\Shared\Voice\SpeakerGroups.lsf.lsx"
-    tree = ET.parse(speakers_file)
-    root = tree.getroot()
-    assert root.tag == "save"
-    
-    templates = BaseNode(element=root.find("region").find("node"))
-    objects = templates._get_children_elements("SpeakerGroup")
-    object_nodes = [BaseNode(x) for x in objects]
-    ret = {}
-    for node in object_nodes:
-        name = node.get_attribute_value_nonnil("Name")
-        description = node.get_attribute_value_nonnil("Description")
-
-        uuid = node.get_attribute_value_nonnil("UUID")
-        if verbose:
-            ret[uuid] = f"{name} - {description}"
-        else:
-            ret[uuid] = name
-    return ret
+    return get_label_registry().get_speaker_group_labels(verbose=verbose)
 
 manual_mapping = {
     "82b2b28f-c1cd-4baa-9341-71b465afd853": "S_LOW_CazadorsPalace_RitualRoom_CoffinLid"
@@ -101,20 +48,12 @@ def create_speaker_labels(node: DialogSpeakerListNode, verbose: bool = False) ->
         speaker_labels[speaker.speaker_actor_id] = label
     return speaker_labels
 
-def create_strings_map() -> dict[str, str]:
-    strings_map = {}
-    for file in english_string_files:
-        english_tree =  ET.parse(file)
-        root = english_tree.getroot()
-        assert root.tag == "contentList"
-        for child in root:
-            text_hash = child.attrib["contentuid"]
-            text_content = child.text
-            strings_map[text_hash] = text_content
-    return strings_map
+def create_strings_map() -> LocaIndex:
+    # memory-mapped index over the loca files, only built again when one of them changes
+    return LocaIndex.open(source_files=english_string_files)
 
 
-def get_dialog_node_id_to_text_entry(dialog_tree: DialogTree, strings_map: dict[str, str]) -> dict[TextKey, TextEntry]:
+def get_dialog_node_id_to_text_entry(dialog_tree: DialogTree, strings_map: Mapping[str, str]) -> dict[TextKey, TextEntry]:
     ret = {}
     for dialog_node in dialog_tree.content.dialog_nodes.dialog_nodes:
         is_first_text = True
@@ -137,7 +76,7 @@ def get_dialog_node_id_to_text_entry(dialog_tree: DialogTree, strings_map: dict[
                     is_first_text = False
     return ret
 # tuples of string, uuid, lineid
-def get_strings_for_dialog(dialog_node: DialogNode, strings_map: dict[str, str]) -> list[TextEntry]:
+def get_strings_for_dialog(dialog_node: DialogNode, strings_map: Mapping[str, str]) -> list[TextEntry]:
     ret = []
     for taggedtexts in dialog_node.get_tagged_texts():
         texts = taggedtexts.tag_texts
@@ -150,7 +89,7 @@ def get_strings_for_dialog(dialog_node: DialogNode, strings_map: dict[str, str])
                 ret.append(TextEntry(text_content, text_hash, line_id))
     return ret
 
-def walk_dialog_nodes(dialog_node: DialogNode, tree: DialogTree, timeline: TimelineTree, strings_map: dict[str, str], max_depth: int, current_depth: int) -> None:
+def walk_dialog_nodes(dialog_node: DialogNode, tree: DialogTree, timeline: TimelineTree, strings_map: Mapping[str, str], max_depth: int, current_depth: int) -> None:
     if max_depth == current_depth:
         return
     dialog_results_for_node = get_strings_for_dialog(dialog_node=dialog_node, strings_map=strings_map)
@@ -178,38 +117,17 @@ def walk_dialog_nodes(dialog_node: DialogNode, tree: DialogTree, timeline: Timel
                           max_depth=max_depth,
                           current_depth=current_depth+1)
 
-soundbanks_data_files = [
-    r"Y:\bg3\multitool\UnpackedData\VoiceMeta\Mods\Gustav\Localization\English\Soundbanks\3ed74f063c6042dc83f6f034cb47c679.lsf.lsx",
-    r"Y:\bg3\multitool\UnpackedData\VoiceMeta\Mods\Gustav\Localization\English\Soundbanks\c7c13742bacd460a8f65f864fe41f255.lsf.lsx",
-    r"Y:\bg3\multitool\UnpackedData\VoiceMeta\Mods\Gustav\Localization\English\Soundbanks\ad9af97d75da406aae137071c563f604.lsf.lsx",
-]
+soundbanks_directory = r"Y:\bg3\multitool\UnpackedData\VoiceMeta\Mods\Gustav\Localization\English\Soundbanks"
 # string uuid to tuple of duration, sourcefile, chracterid
-SoundBanksDuration = dict[str,tuple[float, str, str]]
-def create_sound_banks_duration_mapping() -> SoundBanksDuration:
-    ret = {}
-    for file in soundbanks_data_files:
-        tree = ET.parse(file)
-        root = tree.getroot()
-        assert root.tag == "save"
-        
-        templates = BaseNode(element=root.find("region").find("node"))
-        metadata = BaseNode(templates._get_children_elements("VoiceSpeakerMetaData")[0])
-        character_id = metadata.get_attribute_value_nonnil("MapKey")
-        map_value_node = BaseNode(metadata._get_children_elements("MapValue")[0])
-        voice_data = map_value_node._get_children_elements("VoiceTextMetaData")
-        for x in voice_data:
-            node = BaseNode(x)
-            text_uuid = node.get_attribute_value("MapKey")
-            metadata = BaseNode(node._get_children_elements("MapValue")[0])
-            source_file = metadata.get_attribute_value("Source")
-            duration = float(metadata.get_attribute_value("Length"))
-            ret[text_uuid] = (duration, source_file, character_id)
-    return ret
+SoundBanksDuration = Mapping[str,tuple[float, str, str]]
+def create_sound_banks_duration_mapping() -> SoundBankIndex:
+    # covers every companion's soundbank in the directory, only changed files get parsed again
+    return SoundBankIndex.open(soundbanks_directory=soundbanks_directory)
 
 
 
 
-def _walk_dialog_nodes_along_path(current_node: DialogNode, dialog_tree: DialogTree, timeline: TimelineTree, durations: SoundBanksDuration, strings_map: dict[str, str], speakers_labels: dict[int, str], choice_indices: list[int], max_depth: int, current_depth: int) -> None:
+def _walk_dialog_nodes_along_path(current_node: DialogNode, dialog_tree: DialogTree, timeline: TimelineTree, durations: SoundBanksDuration, strings_map: Mapping[str, str], speakers_labels: dict[int, str], choice_indices: list[int], max_depth: int, current_depth: int) -> None:
     if max_depth == current_depth:
         print("End")
         return
@@ -287,7 +205,7 @@ def _walk_dialog_nodes_along_path(current_node: DialogNode, dialog_tree: DialogT
 
 
 
-def walk_dialog_nodes_along_path(dialog_tree: DialogTree, timeline: TimelineTree, strings_map: dict[str, str], speakers_map: dict[str, str], choice_indices: list[int], root_node_index: int, max_depth: int) -> None:
+def walk_dialog_nodes_along_path(dialog_tree: DialogTree, timeline: TimelineTree, strings_map: Mapping[str, str], speakers_map: dict[str, str], choice_indices: list[int], root_node_index: int, max_depth: int) -> None:
     speakers = dialog_tree.content.speaker_list.speakers
     speaker_labels: dict[int, str] = {}
     for speaker_node in speakers:
@@ -310,7 +228,7 @@ def walk_dialog_nodes_along_path(dialog_tree: DialogTree, timeline: TimelineTree
                                   current_depth=0)
 
 
-def walk_all_root(dialog_tree: DialogTree, timeline_tree: TimelineTree, strings_mapping: dict[str, str], max_depth: int) -> None:
+def walk_all_root(dialog_tree: DialogTree, timeline_tree: TimelineTree, strings_mapping: Mapping[str, str], max_depth: int) -> None:
         # start with root nodes and walk down
     root_nodes = dialog_tree.content.dialog_nodes.root_nodes
     for root in root_nodes:
@@ -0,0 +1,135 @@
+import os
+import pickle
+import struct
+import xml.etree.ElementTree as ET
+from array import array
+from collections.abc import Iterator, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from base_objects import BaseNode
+from cache_utils import CACHE_DIR
+
+# bump when SoundBankFile changes
+SOUNDBANK_INDEX_VERSION = 2
+
+# string uuid to tuple of duration, sourcefile, chracterid
+SoundBankEntry = tuple[float, str, str]
+
+@dataclass
+class SoundBankFile:
+    size: int
+    mtime_ns: int
+    speaker_id: str
+    handles: list[str]
+    durations: array # doubles, already passed through _shortest_float32
+    sources: list[str]
+
+# ================ Parsing ================
+
+def _shortest_float32(value: float) -> float:
+    # durations are stored as float32, give back the shortest decimal that maps to the same float32
+    # so eg 2.345 doesn't turn into 2.3450000286102295 in the timeline
+    packed = struct.pack("<f", value)
+    for precision in range(6, 10):
+        candidate = float(f"{value:.{precision}g}")
+        if struct.pack("<f", candidate) == packed:
+            return candidate
+    return value
+
+def parse_soundbank_file(file_path: str) -> SoundBankFile:
+    # module level so it can run in a worker process
+    stat = os.stat(file_path)
+    tree = ET.parse(file_path)
+    root = tree.getroot()
+    assert root.tag == "save"
+
+    templates = BaseNode(element=root.find("region").find("node"))
+    metadata = BaseNode(templates._get_children_elements("VoiceSpeakerMetaData")[0])
+    character_id = metadata.get_attribute_value_nonnil("MapKey")
+    map_value_node = BaseNode(metadata._get_children_elements("MapValue")[0])
+    voice_data = map_value_node._get_children_elements("VoiceTextMetaData")
+    handles = []
+    durations = array("d")
+    sources = []
+    for x in voice_data:
+        node = BaseNode(x)
+        text_uuid = node.get_attribute_value("MapKey")
+        metadata = BaseNode(node._get_children_elements("MapValue")[0])
+        handles.append(text_uuid)
+        durations.append(_shortest_float32(float(metadata.get_attribute_value("Length"))))
+        sources.append(metadata.get_attribute_value("Source"))
+    return SoundBankFile(size=stat.st_size, mtime_ns=stat.st_mtime_ns, speaker_id=character_id, handles=handles, durations=durations, sources=sources)
+
+def _list_soundbank_files(soundbanks_directory: str) -> list[str]:
+    soundbanks_directory = os.path.abspath(soundbanks_directory)
+    return sorted(os.path.join(soundbanks_directory, x) for x in os.listdir(soundbanks_directory) if x.endswith(".lsf.lsx"))
+
+# ================ Index ================
+
+class SoundBankIndex(Mapping[str, SoundBankEntry]):
+    # handle -> (duration, source, character) over every soundbank in a directory, drop-in for the old durations dict.
+    # persisted per file in .tree_cache and only the files that changed get parsed again
+    def __init__(self, files: dict[str, SoundBankFile]) -> None:
+        self._files = files
+        self._file_list = list(files.values())
+        self._rows: dict[str, tuple[int, int]] = {}
+        # files are in sorted path order, later ones win like they did with the dict
+        for file_index, soundbank_file in enumerate(self._file_list):
+            for row, handle in enumerate(soundbank_file.handles):
+                self._rows[handle] = (file_index, row)
+
+    @classmethod
+    def open(cls, soundbanks_directory: str, index_path: str | None = None, max_workers: int | None = None) -> "SoundBankIndex":
+        if index_path is None:
+            index_path = os.path.join(CACHE_DIR, "soundbanks.idx")
+        cached_files: dict[str, SoundBankFile] = {}
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                version, directory, files = pickle.load(f)
+            if version == SOUNDBANK_INDEX_VERSION and directory == os.path.abspath(soundbanks_directory):
+                cached_files = files
+
+        files: dict[str, SoundBankFile | None] = {}
+        to_parse: list[str] = []
+        for file_path in _list_soundbank_files(soundbanks_directory):
+            cached = cached_files.get(file_path)
+            stat = os.stat(file_path)
+            if cached is not None and cached.size == stat.st_size and cached.mtime_ns == stat.st_mtime_ns:
+                files[file_path] = cached
+            else:
+                to_parse.append(file_path)
+                files[file_path] = None
+
+        is_changed = len(to_parse) > 0 or len(files) != len(cached_files)
+        if len(to_parse) > 0:
+            print(f"Indexing {len(to_parse)} soundbank files")
+        if len(to_parse) > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                for file_path, soundbank_file in zip(to_parse, executor.map(parse_soundbank_file, to_parse, chunksize=4)):
+                    files[file_path] = soundbank_file
+        else:
+            for file_path in to_parse:
+                files[file_path] = parse_soundbank_file(file_path)
+
+        if is_changed:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            tmp_path = f"{index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump((SOUNDBANK_INDEX_VERSION, os.path.abspath(soundbanks_directory), files), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, index_path)
+        return cls(files)
+
+    def __getitem__(self, handle: str) -> SoundBankEntry:
+        file_index, row = self._rows[handle]
+        soundbank_file = self._file_list[file_index]
+        return (soundbank_file.durations[row], soundbank_file.sources[row], soundbank_file.speaker_id)
+
+    def __contains__(self, handle: object) -> bool:
+        return handle in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
@@ -0,0 +1,79 @@
+import itertools
+import os
+import shutil
+
+import pytest
+
+import cache_utils
+from timeline_parser import TimelineTree
+from timeline_scene_parser import TimelineSceneTree
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+@pytest.fixture(autouse=True)
+def _cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "CACHE_DIR", str(tmp_path / "cache"))
+
+def _copy_fixture(tmp_path, name: str) -> str:
+    file_path = str(tmp_path / name)
+    shutil.copy(os.path.join(DATA_DIR, name), file_path)
+    return file_path
+
+def _edit_timeline(timeline: TimelineTree) -> None:
+    # touches the timing of every later phase and adds wrapped copies of a phase's nodes
+    uuids = (f"00000000-0000-4000-8000-{i:012d}" for i in itertools.count())
+    phase = timeline.content.effect.effect_component_phases[0]
+    timeline.extend_phase_duration(phase_index=0, adjustment_amount=0.75, new_nodes_for_subduration=[], extend_subdurations_of_types=[])
+    timeline.content.create_new_phase(copying_from_phase=phase, new_dialog_duration=3, new_dialog_node_id=next(uuids),
+                                      update_node_ids=[next(uuids) for _ in phase.phase_nodes], should_remove_last_subduration=False)
+
+def _written(tree: object, tmp_path, name: str) -> tuple[bytes, bytes]:
+    # full and incremental write
+    ret = []
+    for incremental in (False, True):
+        output_file_path = str(tmp_path / f"{name}.{incremental}.lsx")
+        tree.write_tree(output_file_path, incremental=incremental)
+        with open(output_file_path, "rb") as f:
+            ret.append(f.read())
+    return tuple(ret)
+
+def _snapshots() -> list[str]:
+    return [name for name in os.listdir(cache_utils.CACHE_DIR) if name.endswith(".pickle")]
+
+def test_timeline_warm_matches_cold(tmp_path):
+    file_path = _copy_fixture(tmp_path, "timeline.lsf.lsx")
+    outputs = []
+    for i, use_cache in enumerate((False, True, True)):
+        timeline = TimelineTree.create(file_path, use_cache=use_cache)
+        _edit_timeline(timeline)
+        outputs.append(_written(timeline, tmp_path, str(i)))
+    # uncached, cold (builds the snapshot) and warm (loads it)
+    assert outputs[0] == outputs[1] == outputs[2]
+    assert len(_snapshots()) == 1
+
+def test_scene_warm_matches_cold(tmp_path):
+    file_path = _copy_fixture(tmp_path, "scene.lsf.lsx")
+    outputs = [_written(TimelineSceneTree.create(file_path, use_cache=use_cache), tmp_path, str(i)) for i, use_cache in enumerate((False, True, True))]
+    assert outputs[0] == outputs[1] == outputs[2]
+
+def test_changed_file_is_reparsed(tmp_path):
+    file_path = _copy_fixture(tmp_path, "scene.lsf.lsx")
+    TimelineSceneTree.create(file_path)
+    with open(file_path, "rb") as f:
+        data = f.read()
+    with open(file_path, "wb") as f:
+        f.write(data.replace(b'<save>', b'<save>\n\t<!--changed-->', 1))
+    scene = TimelineSceneTree.create(file_path)
+    full, incremental = _written(scene, tmp_path, "changed")
+    assert b"<!--changed-->" in incremental
+    assert full == _written(TimelineSceneTree.create(file_path, use_cache=False), tmp_path, "uncached")[0]
+
+def test_unreadable_snapshot_is_rebuilt(tmp_path):
+    file_path = _copy_fixture(tmp_path, "scene.lsf.lsx")
+    expected = _written(TimelineSceneTree.create(file_path, use_cache=False), tmp_path, "uncached")
+    TimelineSceneTree.create(file_path)
+    (snapshot,) = _snapshots()
+    with open(os.path.join(cache_utils.CACHE_DIR, snapshot), "r+b") as f:
+        f.truncate(os.path.getsize(f.name) // 2)
+    assert _written(TimelineSceneTree.create(file_path), tmp_path, "rebuilt") == expected
+    assert _written(TimelineSceneTree.create(file_path), tmp_path, "warm") == expected
@@ -0,0 +1,116 @@
+import os
+import struct
+
+import pytest
+
+import compression_utils
+from compression_utils import (
+    lz4_block_compress, lz4_block_decompress, lz4_frame_compress, lz4_frame_decompress, xxh32, compress, decompress,
+    COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_LZ4, COMPRESSION_LEVEL_FAST, COMPRESSION_LEVEL_DEFAULT, COMPRESSION_LEVEL_MAX,
+)
+
+# ================ Reference vectors ================
+# blocks and frames encoded by hand following the lz4 spec, and checked against the reference lz4 library
+
+# literals "abc", a 15 byte match 3 back, then the 5 literals every block ends with
+LZ4_BLOCK_OVERLAPPING = (bytes.fromhex("3b616263030050") + b"xyzuv", b"abc" * 6 + b"xyzuv")
+# a 23 byte match 1 back, its length spilling into an extra byte
+LZ4_BLOCK_LONG_MATCH = (bytes.fromhex("1f61010004") + bytes.fromhex("50") + b"bcdef", b"a" * 24 + b"bcdef")
+# only literals, 20 of them so the length spills into an extra byte
+LZ4_BLOCK_LITERALS = (bytes.fromhex("f005") + b"0123456789abcdefghij", b"0123456789abcdefghij")
+
+# version 1 frame with independent blocks and 64KB blocks, a compressed block then a stored one
+LZ4_FRAME = (bytes.fromhex("04224d18604082" "0c000000" "3b616263030050") + b"xyzuv" + bytes.fromhex("03000080") + b"end" + bytes.fromhex("00000000"),
+             b"abc" * 6 + b"xyzuv" + b"end")
+# what the reference library writes for empty input, with a content checksum
+LZ4_FRAME_EMPTY = bytes.fromhex("04224d186440a700000000055dcc02")
+
+XXH32_VECTORS = [
+    (b"", 0, 0x02CC5D05),
+    (b"a", 0, 0x550D7456),
+    (b"abc", 0, 0x32D153FF),
+    (b"Nobody inspects the spammish repetition", 0, 0xE2293B2F),
+]
+
+@pytest.fixture(params=["lz4 package", "plain python"])
+def lz4_implementation(request, monkeypatch):
+    if request.param == "plain python":
+        monkeypatch.setattr(compression_utils, "lz4", None)
+    elif compression_utils.lz4 is None:
+        pytest.skip("lz4 isn't installed")
+    return request.param
+
+def _sample_data() -> list[bytes]:
+    return [
+        b"",
+        b"a",
+        b"short",
+        b"abc" * 1000,
+        os.urandom(5000),
+        bytes(range(256)) * 300 + os.urandom(3000) + b"tail" * 5000,
+    ]
+
+# ================ LZ4 ================
+
+@pytest.mark.parametrize("block, expected", [LZ4_BLOCK_OVERLAPPING, LZ4_BLOCK_LONG_MATCH, LZ4_BLOCK_LITERALS])
+def test_lz4_block_reference(lz4_implementation, block, expected):
+    assert lz4_block_decompress(block, len(expected)) == expected
+
+def test_lz4_block_wrong_size(lz4_implementation):
+    block, expected = LZ4_BLOCK_OVERLAPPING
+    # an assert in plain python, LZ4BlockError from the package
+    with pytest.raises(Exception):
+        lz4_block_decompress(block, len(expected) - 1)
+
+def test_lz4_frame_reference(lz4_implementation):
+    frame, expected = LZ4_FRAME
+    assert lz4_frame_decompress(frame) == expected
+    assert lz4_frame_decompress(LZ4_FRAME_EMPTY) == b""
+    # a skippable frame in front is ignored
+    skippable = struct.pack("<II", 0x184D2A50, 3) + b"xyz"
+    assert lz4_frame_decompress(skippable + frame) == expected
+
+def test_lz4_frame_header():
+    # version 1, independent blocks, 64KB blocks, and its header checksum
+    assert lz4_frame_compress(b"") == bytes.fromhex("04224d18604082" "00000000")
+
+@pytest.mark.parametrize("compression_level", [COMPRESSION_LEVEL_FAST, COMPRESSION_LEVEL_DEFAULT, COMPRESSION_LEVEL_MAX])
+def test_lz4_round_trip(lz4_implementation, compression_level):
+    for data in _sample_data():
+        assert lz4_block_decompress(lz4_block_compress(data, compression_level), len(data)) == data
+        assert lz4_frame_decompress(lz4_frame_compress(data, compression_level)) == data
+
+def test_lz4_matches_reference_library():
+    lz4_block = pytest.importorskip("lz4.block")
+    lz4_frame = pytest.importorskip("lz4.frame")
+    for data in _sample_data():
+        # the plain python compressor writes blocks the reference library reads
+        assert lz4_block.decompress(compression_utils._lz4_block_compress_python(data, COMPRESSION_LEVEL_DEFAULT), uncompressed_size=len(data)) == data
+        # and the plain python decompressor reads what the reference library writes, linked blocks included
+        for block_linked in (False, True):
+            frame = lz4_frame.compress(data, block_size=lz4_frame.BLOCKSIZE_MAX64KB, block_linked=block_linked, block_checksum=True, content_checksum=True)
+            assert lz4_frame_decompress(frame) == data
+            dst = bytearray()
+            compression_utils._lz4_block_decompress_into(lz4_block.compress(data, store_size=False), dst)
+            assert dst == data
+
+# ================ xxh32 ================
+
+@pytest.mark.parametrize("data, seed, expected", XXH32_VECTORS)
+def test_xxh32(data, seed, expected):
+    assert xxh32(data, seed) == expected
+
+def test_xxh32_matches_frame_checksum():
+    lz4_frame = pytest.importorskip("lz4.frame")
+    for data in _sample_data():
+        # the content checksum at the end of a frame is the xxh32 of the data
+        (checksum,) = struct.unpack("<I", lz4_frame.compress(data, content_checksum=True)[-4:])
+        assert xxh32(data) == checksum
+
+# ================ compress/decompress ================
+
+@pytest.mark.parametrize("compression_flags", [COMPRESSION_NONE, COMPRESSION_ZLIB | COMPRESSION_LEVEL_DEFAULT, COMPRESSION_LZ4 | COMPRESSION_LEVEL_DEFAULT])
+@pytest.mark.parametrize("chunked", [False, True])
+def test_round_trip(lz4_implementation, compression_flags, chunked):
+    for data in _sample_data():
+        assert decompress(compress(data, compression_flags, chunked), len(data), compression_flags, chunked) == data
@@ -0,0 +1,62 @@
+import itertools
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from dialog_and_timeline_utils import CopyPhaseJob, copy_phases
+from timeline_parser import TimelineTree
+from timeline_scene_parser import TimelineSceneTree
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+TIMELINE_LSX = os.path.join(DATA_DIR, "timeline.lsf.lsx")
+SCENE_LSX = os.path.join(DATA_DIR, "scene.lsf.lsx")
+
+# phases copied, in order. phase 0 twice so the target already has its dependencies the second time. within the same
+# tree phase 4 is the copy the first job made
+PHASE_INDEXES = [0, 2, 0, 1]
+SAME_TREE_PHASE_INDEXES = [0, 2, 4, 0]
+
+def _load() -> tuple[TimelineTree, TimelineSceneTree]:
+    return TimelineTree.create(TIMELINE_LSX, use_cache=False), TimelineSceneTree.create(SCENE_LSX, use_cache=False)
+
+def _jobs(from_timeline: TimelineTree, from_scene: TimelineSceneTree, phase_indexes: list[int]) -> list[CopyPhaseJob]:
+    uuids = (f"00000000-0000-4000-8000-{i:012d}" for i in itertools.count())
+    ret = []
+    for phase_index in phase_indexes:
+        # the phase may not exist yet, its nodes are the same as the ones it was copied from
+        node_count = len(from_timeline.content.effect.effect_component_phases[phase_index % 4].phase_nodes)
+        ret.append(CopyPhaseJob(
+            from_timeline=from_timeline,
+            from_phase_index=phase_index,
+            from_timeline_scene=from_scene,
+            dialog_node_uuid_for_new_phase=next(uuids),
+            new_node_ids=[next(uuids) for _ in range(node_count)],
+        ))
+    return ret
+
+def _written(tmp_path, name: str, timeline: TimelineTree, scene: TimelineSceneTree) -> tuple[str, str]:
+    # without comments, a batch writes the timeline duration once instead of after every phase
+    ret = []
+    for tree, suffix in ((timeline, "timeline"), (scene, "scene")):
+        file_path = str(tmp_path / f"{name}.{suffix}.lsx")
+        tree.write_tree(file_path)
+        ret.append(ET.canonicalize(from_file=file_path, strip_text=True))
+    return tuple(ret)
+
+@pytest.mark.parametrize("same_tree", [False, True], ids=["other tree", "same tree"])
+def test_batch_matches_one_at_a_time(tmp_path, same_tree):
+    outputs = []
+    for is_batch in (False, True):
+        to_timeline, to_scene = _load()
+        from_timeline, from_scene = (to_timeline, to_scene) if same_tree else _load()
+        phase_indexes = SAME_TREE_PHASE_INDEXES if same_tree else PHASE_INDEXES
+        jobs = _jobs(from_timeline, from_scene, phase_indexes)
+        if is_batch:
+            copy_phases(jobs=jobs, to_timeline=to_timeline, to_timeline_scene=to_scene)
+        else:
+            for job in jobs:
+                copy_phases(jobs=[job], to_timeline=to_timeline, to_timeline_scene=to_scene)
+        assert len(to_timeline.content.effect.effect_component_phases) == 4 + len(phase_indexes)
+        outputs.append(_written(tmp_path, str(is_batch), to_timeline, to_scene))
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,33 @@
+import glob
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import compression_utils
+from lsf_parser import read_lsf
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+# .lsf files written by LSLib 1.18.5 (uncompressed and zlib) from the fixtures in tests/data, and the .lsf.lsx LSLib
+# exports for them. <name>.lsf and <name>.<compression>.lsf share <name>.lsf.lsx
+LSLIB_FILES = sorted(glob.glob(os.path.join(DATA_DIR, "lslib", "*.lsf")))
+
+def _lslib_export_path(lsf_path: str) -> str:
+    name = os.path.basename(lsf_path).split(".")[0]
+    return os.path.join(os.path.dirname(lsf_path), f"{name}.lsf.lsx")
+
+def _canonical(root: ET.Element) -> str:
+    return ET.canonicalize(ET.tostring(root, encoding="unicode"), strip_text=True)
+
+@pytest.mark.parametrize("lsf_path", LSLIB_FILES, ids=os.path.basename)
+@pytest.mark.parametrize("use_lz4_package", [True, False])
+def test_matches_lslib_export(lsf_path, use_lz4_package, monkeypatch):
+    if not use_lz4_package:
+        monkeypatch.setattr(compression_utils, "lz4", None)
+    elif compression_utils.lz4 is None:
+        pytest.skip("lz4 isn't installed")
+    expected = ET.parse(_lslib_export_path(lsf_path)).getroot()
+    assert _canonical(read_lsf(lsf_path).getroot()) == _canonical(expected)
+
+def test_lslib_files_present():
+    assert len(LSLIB_FILES) > 0
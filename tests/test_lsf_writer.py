@@ -0,0 +1,73 @@
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import compression_utils
+from compression_utils import COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_LZ4, COMPRESSION_ZSTD, COMPRESSION_LEVEL_FAST, COMPRESSION_LEVEL_DEFAULT, COMPRESSION_LEVEL_MAX
+from lsf_parser import read_lsf_bytes, read_lsf, read_lsf_metadata, parse_resource_file
+from lsf_writer import write_lsf_bytes, write_resource_file
+from lsx_writer import write_lsx
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+LSX_FILES = [os.path.join(DATA_DIR, name) for name in ("small.lsf.lsx", "scene.lsf.lsx", "timeline.lsf.lsx")]
+# uncompressed .lsf files LSLib wrote for the same fixtures, see test_lsf_parser
+LSLIB_FILES = [os.path.join(DATA_DIR, "lslib", name) for name in ("small.lsf", "scene.lsf", "timeline.lsf")]
+
+COMPRESSION_FLAGS = [
+    COMPRESSION_NONE,
+    COMPRESSION_ZLIB | COMPRESSION_LEVEL_FAST,
+    COMPRESSION_ZLIB | COMPRESSION_LEVEL_DEFAULT,
+    COMPRESSION_LZ4 | COMPRESSION_LEVEL_DEFAULT,
+    COMPRESSION_LZ4 | COMPRESSION_LEVEL_MAX,
+]
+
+def _lsx_body(tree: ET.ElementTree, file_path: str) -> bytes:
+    write_lsx(tree, file_path)
+    with open(file_path, "rb") as f:
+        return f.read().split(b"\n", 1)[1]
+
+@pytest.mark.parametrize("compression_flags", COMPRESSION_FLAGS)
+@pytest.mark.parametrize("lsx_path", LSX_FILES, ids=os.path.basename)
+def test_round_trip(tmp_path, lsx_path, compression_flags):
+    tree = ET.parse(lsx_path)
+    data = write_lsf_bytes(tree, compression_flags=compression_flags)
+    read_back = read_lsf_bytes(data)
+    assert _lsx_body(read_back, str(tmp_path / "a.lsx")) == _lsx_body(tree, str(tmp_path / "b.lsx"))
+    # and writing what was read gives the same file again
+    assert write_lsf_bytes(read_back, compression_flags=compression_flags) == data
+
+def _values_section(data: bytes) -> bytes:
+    # of an uncompressed .lsf, the values come right after strings, nodes and attributes
+    metadata, pos = read_lsf_metadata(data)
+    pos += metadata.strings_uncompressed_size + metadata.nodes_uncompressed_size + metadata.attributes_uncompressed_size
+    return data[pos:pos + metadata.values_uncompressed_size]
+
+@pytest.mark.parametrize("lsf_path", LSLIB_FILES, ids=os.path.basename)
+def test_values_match_lslib(lsf_path):
+    # the other sections differ (keys, adjacency, string buckets), the values are laid out the same way
+    with open(lsf_path, "rb") as f:
+        expected = f.read()
+    data = write_lsf_bytes(read_lsf(lsf_path), compression_flags=COMPRESSION_NONE)
+    assert _values_section(data) == _values_section(expected)
+
+@pytest.mark.parametrize("compression_flags", [COMPRESSION_LZ4 | COMPRESSION_LEVEL_DEFAULT, COMPRESSION_LZ4 | COMPRESSION_LEVEL_MAX])
+def test_plain_python_lz4(tmp_path, monkeypatch, compression_flags):
+    tree = ET.parse(LSX_FILES[2])
+    expected = _lsx_body(tree, str(tmp_path / "b.lsx"))
+    monkeypatch.setattr(compression_utils, "lz4", None)
+    data = write_lsf_bytes(tree, compression_flags=compression_flags)
+    assert _lsx_body(read_lsf_bytes(data), str(tmp_path / "a.lsx")) == expected
+
+def test_zstd(tmp_path):
+    pytest.importorskip("zstandard")
+    tree = ET.parse(LSX_FILES[0])
+    data = write_lsf_bytes(tree, compression_flags=COMPRESSION_ZSTD | COMPRESSION_LEVEL_DEFAULT)
+    assert _lsx_body(read_lsf_bytes(data), str(tmp_path / "a.lsx")) == _lsx_body(tree, str(tmp_path / "b.lsx"))
+
+def test_resource_file_by_extension(tmp_path):
+    tree = ET.parse(LSX_FILES[0])
+    lsf_path = str(tmp_path / "small.lsf")
+    write_resource_file(tree, lsf_path)
+    assert _lsx_body(parse_resource_file(lsf_path), str(tmp_path / "a.lsx")) == _lsx_body(read_lsf(lsf_path), str(tmp_path / "b.lsx"))
+    assert _lsx_body(parse_resource_file(lsf_path), str(tmp_path / "c.lsx")) == _lsx_body(tree, str(tmp_path / "d.lsx"))
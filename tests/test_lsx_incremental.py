@@ -0,0 +1,87 @@
+import itertools
+import os
+import shutil
+
+import pytest
+
+from lsf_parser import parse_resource_file_with_source
+from lsf_writer import write_resource_file
+from lsx_incremental import is_dirty
+from lsx_writer import write_lsx
+from timeline_parser import TimelineTree
+from timeline_scene_parser import TimelineSceneTree
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+TIMELINE_LSX = os.path.join(DATA_DIR, "timeline.lsf.lsx")
+SCENE_LSX = os.path.join(DATA_DIR, "scene.lsf.lsx")
+SMALL_LSX = os.path.join(DATA_DIR, "small.lsf.lsx")
+
+def _read(file_path: str) -> bytes:
+    with open(file_path, "rb") as f:
+        return f.read()
+
+def _body(file_path: str) -> bytes:
+    # everything after the xml declaration, write_lsx writes its own while the incremental writer keeps the source's
+    return _read(file_path).split(b"\n", 1)[1]
+
+def edit_timeline(timeline: TimelineTree) -> None:
+    uuids = (f"00000000-0000-4000-8000-{i:012d}" for i in itertools.count())
+    phases = timeline.content.effect.effect_component_phases
+    timeline.extend_phase_duration(phase_index=1, adjustment_amount=1.5, new_nodes_for_subduration=[], extend_subdurations_of_types=[])
+    phase = phases[0]
+    timeline.content.create_new_phase(copying_from_phase=phase, new_dialog_duration=2, new_dialog_node_id=next(uuids),
+                                      update_node_ids=[next(uuids) for _ in phase.phase_nodes], should_remove_last_subduration=True)
+
+@pytest.mark.parametrize("file_path", [TIMELINE_LSX, SCENE_LSX, SMALL_LSX], ids=os.path.basename)
+def test_untouched_is_copied(tmp_path, file_path):
+    tree, source = parse_resource_file_with_source(file_path)
+    output_file_path = str(tmp_path / "out.lsx")
+    write_resource_file(tree, output_file_path, source=source)
+    assert _read(output_file_path) == _read(file_path)
+
+def test_edited_timeline_matches_full_write(tmp_path):
+    timeline = TimelineTree.create(TIMELINE_LSX, use_cache=False)
+    edit_timeline(timeline)
+    timeline.write_tree(str(tmp_path / "full.lsx"))
+    timeline.write_tree(str(tmp_path / "incremental.lsx"), incremental=True)
+    assert _body(str(tmp_path / "incremental.lsx")) == _body(str(tmp_path / "full.lsx"))
+    assert _read(str(tmp_path / "incremental.lsx")) != _read(TIMELINE_LSX)
+
+def test_scene_matches_full_write(tmp_path):
+    scene = TimelineSceneTree.create(SCENE_LSX, use_cache=False)
+    scene.write_tree(str(tmp_path / "full.lsx"))
+    scene.write_tree(str(tmp_path / "incremental.lsx"), incremental=True)
+    assert _body(str(tmp_path / "incremental.lsx")) == _body(str(tmp_path / "full.lsx"))
+
+def test_source_changed_since_parse(tmp_path):
+    # the source file is only read when writing, if it changed by then everything is written out in full
+    file_path = str(tmp_path / "timeline.lsf.lsx")
+    shutil.copy(TIMELINE_LSX, file_path)
+    timeline = TimelineTree.create(file_path, use_cache=False)
+    edit_timeline(timeline)
+    with open(file_path, "ab") as f:
+        f.write(b"\n")
+    timeline.write_tree(str(tmp_path / "full.lsx"))
+    timeline.write_tree(str(tmp_path / "incremental.lsx"), incremental=True)
+    assert _read(str(tmp_path / "incremental.lsx")) == _read(str(tmp_path / "full.lsx"))
+
+def test_full_write_round_trips(tmp_path):
+    # the fixtures are in the layout write_lsx produces, so the full writer is checked against them as well
+    tree, _ = parse_resource_file_with_source(TIMELINE_LSX)
+    write_lsx(tree, str(tmp_path / "out.lsx"))
+    assert _body(str(tmp_path / "out.lsx")) == _body(TIMELINE_LSX)
+
+def test_second_write_matches_full_write(tmp_path):
+    # the first write becomes the source and clears the marks, the second one only rewrites what changed after it
+    timeline = TimelineTree.create(TIMELINE_LSX, use_cache=False)
+    edit_timeline(timeline)
+    timeline.write_tree(str(tmp_path / "first.lsx"), incremental=True)
+    assert not any(is_dirty(x) for x in timeline._tree_ref.getroot().iter())
+    timeline.extend_phase_duration(phase_index=2, adjustment_amount=0.5, new_nodes_for_subduration=[], extend_subdurations_of_types=[])
+    timeline.write_tree(str(tmp_path / "full.lsx"))
+    timeline.write_tree(str(tmp_path / "incremental.lsx"), incremental=True)
+    assert _body(str(tmp_path / "incremental.lsx")) == _body(str(tmp_path / "full.lsx"))
+    assert _read(str(tmp_path / "incremental.lsx")) != _read(str(tmp_path / "first.lsx"))
+    # nothing changed since, so it's all copied
+    timeline.write_tree(str(tmp_path / "again.lsx"), incremental=True)
+    assert _read(str(tmp_path / "again.lsx")) == _read(str(tmp_path / "incremental.lsx"))
@@ -0,0 +1,26 @@
+import os
+
+from lsf_parser import parse_resource_file_with_source
+from lsx_loader import load_lsx
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+TIMELINE_LSX = os.path.join(DATA_DIR, "timeline.lsf.lsx")
+SCENE_LSX = os.path.join(DATA_DIR, "scene.lsf.lsx")
+SCENE_LSF = os.path.join(DATA_DIR, "lslib", "scene.lsf")
+
+def _attributes(file_path: str) -> list[dict[str, str]]:
+    tree, _ = load_lsx(file_path) if file_path.endswith(".lsx") else parse_resource_file_with_source(file_path)
+    return [x.attrib for x in tree.getroot().iter("attribute")]
+
+def test_values_are_interned():
+    # the same string object wherever it repeats, within a file and across files, and the .lsf parser does the same
+    seen: dict[str, str] = {}
+    for file_path in (TIMELINE_LSX, SCENE_LSX, SCENE_LSF):
+        for attrib in _attributes(file_path):
+            keys = ["id", "type"] + (["value"] if attrib["type"] == "guid" else [])
+            for key in keys:
+                value = attrib[key]
+                assert seen.setdefault(value, value) is value
+    timeline_guids = {x["value"] for x in _attributes(TIMELINE_LSX) if x["type"] == "guid"}
+    scene_guids = {x["value"] for x in _attributes(SCENE_LSX) if x["type"] == "guid"}
+    assert len(timeline_guids & scene_guids) > 0
@@ -0,0 +1,120 @@
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import cache_utils
+import pak_utils
+from compression_utils import COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_LZ4, COMPRESSION_LEVEL_DEFAULT, compression_method, lz4_block_decompress
+from lsf_parser import read_lsf_bytes
+from lsf_writer import write_lsf_bytes
+from lsx_writer import write_lsx
+from pak_utils import PakBuilder, read_pak, pak_file_entry_struct, pak_header_struct, pak_file_list_header_struct
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+SMALL_LSX = os.path.join(DATA_DIR, "small.lsf.lsx")
+
+def _file_entries(file_path: str) -> list[tuple]:
+    with open(file_path, "rb") as f:
+        data = f.read()
+    _, _, file_list_offset, _, _, _, _, _ = pak_header_struct.unpack_from(data, 0)
+    file_count, compressed_size = pak_file_list_header_struct.unpack_from(data, file_list_offset)
+    start = file_list_offset + pak_file_list_header_struct.size
+    file_list = lz4_block_decompress(data[start:start + compressed_size], file_count * pak_file_entry_struct.size)
+    return list(pak_file_entry_struct.iter_unpack(file_list))
+
+@pytest.fixture(autouse=True)
+def _entry_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_utils, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(pak_utils, "PAK_ENTRY_CACHE_DIR", str(tmp_path / "cache" / cache_utils.PAK_ENTRY_CACHE_DIR_NAME))
+
+@pytest.mark.parametrize("compression_flags", [
+    COMPRESSION_NONE,
+    COMPRESSION_ZLIB | COMPRESSION_LEVEL_DEFAULT,
+    COMPRESSION_LZ4 | COMPRESSION_LEVEL_DEFAULT,
+])
+@pytest.mark.parametrize("use_cache", [False, True])
+def test_round_trip(tmp_path, compression_flags, use_cache):
+    tree = ET.parse(SMALL_LSX)
+    text = b"some text that repeats, " * 200
+    builder = PakBuilder()
+    builder.add_bytes("Mods/Test/meta.lsx", text)
+    builder.add_tree("Public/Test/Timeline/small.lsf", tree)
+    builder.add_bytes("Mods/Test/empty.txt", b"")
+
+    pak_path = str(tmp_path / "test.pak")
+    builder.write(pak_path, compression_flags=compression_flags, use_cache=use_cache)
+    # a second write goes through the entry cache when it's on
+    builder.write(pak_path, compression_flags=compression_flags, use_cache=use_cache)
+
+    entries = read_pak(pak_path)
+    assert [entry.virtual_path for entry in entries] == ["Mods/Test/meta.lsx", "Public/Test/Timeline/small.lsf", "Mods/Test/empty.txt"]
+    assert entries[0].data == text
+    assert entries[1].data == write_lsf_bytes(tree, compression_flags=COMPRESSION_NONE)
+    write_lsx(read_lsf_bytes(entries[1].data), str(tmp_path / "small.lsx"))
+    with open(tmp_path / "small.lsx", "rb") as f, open(SMALL_LSX, "rb") as g:
+        assert f.read() == g.read()
+    assert entries[2].data == b""
+
+    flags = [entry[4] for entry in _file_entries(pak_path)]
+    if compression_method(compression_flags) == COMPRESSION_NONE:
+        assert flags == [COMPRESSION_NONE] * 3
+    else:
+        assert flags[:2] == [compression_flags] * 2
+
+def test_incompressible_entry_is_stored(tmp_path):
+    data = os.urandom(4096)
+    builder = PakBuilder()
+    builder.add_bytes("Mods/Test/random.bin", data)
+    pak_path = str(tmp_path / "test.pak")
+    builder.write(pak_path, compression_flags=COMPRESSION_ZLIB | COMPRESSION_LEVEL_DEFAULT, use_cache=False)
+
+    (entry,) = _file_entries(pak_path)
+    assert entry[4] == COMPRESSION_NONE
+    assert entry[5] == len(data) and entry[6] == 0
+    assert read_pak(pak_path)[0].data == data
+
+def test_plain_python_lz4(tmp_path, monkeypatch):
+    import compression_utils
+    monkeypatch.setattr(compression_utils, "lz4", None)
+    data = b"abcdefgh" * 1000
+    builder = PakBuilder()
+    builder.add_bytes("Mods/Test/a.txt", data)
+    builder.add_bytes("Mods/Test/b.txt", data[::-1])
+    pak_path = str(tmp_path / "test.pak")
+    builder.write(pak_path, compression_flags=COMPRESSION_LZ4 | COMPRESSION_LEVEL_DEFAULT, use_cache=False)
+    assert [entry.data for entry in read_pak(pak_path)] == [data, data[::-1]]
+
+def _cached_entries() -> list[str]:
+    return sorted(os.listdir(pak_utils.PAK_ENTRY_CACHE_DIR))
+
+def test_entry_cache_is_pruned(tmp_path):
+    compression_flags = COMPRESSION_ZLIB | COMPRESSION_LEVEL_DEFAULT
+    pak_path = str(tmp_path / "test.pak")
+    builder = PakBuilder()
+    builder.add_bytes("Mods/Test/a.txt", b"old contents " * 100)
+    builder.write(pak_path, compression_flags=compression_flags)
+    (old_entry,) = _cached_entries()
+    # not used since, and older than the max age
+    old_time = os.path.getmtime(os.path.join(pak_utils.PAK_ENTRY_CACHE_DIR, old_entry)) - pak_utils.PAK_ENTRY_CACHE_MAX_AGE - 1
+    os.utime(os.path.join(pak_utils.PAK_ENTRY_CACHE_DIR, old_entry), (old_time, old_time))
+
+    builder = PakBuilder()
+    builder.add_bytes("Mods/Test/a.txt", b"new contents " * 100)
+    builder.write(pak_path, compression_flags=compression_flags)
+    (new_entry,) = _cached_entries()
+    assert new_entry != old_entry
+
+    # an old entry that gets used again is kept
+    os.utime(os.path.join(pak_utils.PAK_ENTRY_CACHE_DIR, new_entry), (old_time, old_time))
+    builder.write(pak_path, compression_flags=compression_flags)
+    assert _cached_entries() == [new_entry]
+    assert read_pak(pak_path)[0].data == b"new contents " * 100
+
+def test_clear_cache_removes_entries(tmp_path):
+    builder = PakBuilder()
+    builder.add_bytes("Mods/Test/a.txt", b"contents " * 100)
+    builder.write(str(tmp_path / "test.pak"), compression_flags=COMPRESSION_ZLIB | COMPRESSION_LEVEL_DEFAULT)
+    assert len(_cached_entries()) == 1
+    cache_utils.clear_cache()
+    assert not os.path.exists(pak_utils.PAK_ENTRY_CACHE_DIR)
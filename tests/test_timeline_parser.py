@@ -0,0 +1,54 @@
+import os
+
+from timeline_parser import TimelineTree
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+TIMELINE_LSX = os.path.join(DATA_DIR, "timeline.lsf.lsx")
+
+# phase index and amount of each extend_phase_duration, these round differently when added up first
+EXTENSIONS = [(0, 0.7), (1, 1.3), (0, 0.11), (2, 2.9)]
+
+def _start_and_key_times(timeline: TimelineTree) -> dict[str, tuple[str, list[str]]]:
+    # uuid -> StartTime and key Times of every EffectComponent, as written in the tree
+    ret = {}
+    for phase in timeline.content.effect.effect_component_phases:
+        for node in phase.phase_nodes:
+            ret[node.uuid] = (node.get_attribute_value("StartTime"), [x.attrib["value"] for _, x in node.get_time_attributes()])
+    return ret
+
+def _extend(timeline: TimelineTree) -> None:
+    for phase_index, adjustment_amount in EXTENSIONS:
+        timeline.extend_phase_duration(phase_index=phase_index, adjustment_amount=adjustment_amount, new_nodes_for_subduration=[], extend_subdurations_of_types=[])
+
+def test_shifts_are_applied_one_after_another():
+    timeline = TimelineTree.create(TIMELINE_LSX, use_cache=False)
+    phase_indexes = {node.uuid: phase.phase_index for phase in timeline.content.effect.effect_component_phases for node in phase.phase_nodes}
+    before = _start_and_key_times(timeline)
+    _extend(timeline)
+    timeline.flush_time_shifts()
+
+    expected = {}
+    for uuid, (start_time, key_times) in before.items():
+        # what shifting every later phase right away gave
+        start_time = float(start_time or "0")
+        key_times = [float(x) for x in key_times]
+        for phase_index, adjustment_amount in EXTENSIONS:
+            if phase_indexes[uuid] > phase_index:
+                start_time += adjustment_amount
+                key_times = [adjustment_amount + x for x in key_times]
+        expected[uuid] = (start_time, key_times)
+    after = _start_and_key_times(timeline)
+    for uuid, (start_time, key_times) in expected.items():
+        if phase_indexes[uuid] > 0:
+            assert after[uuid] == (str(start_time), [str(x) for x in key_times])
+
+def test_phase_nodes_see_pending_shifts():
+    # built phases get their nodes rewritten on flush, reading them through phase_nodes flushes first
+    timeline = TimelineTree.create(TIMELINE_LSX, use_cache=False)
+    phases = timeline.content.effect.effect_component_phases
+    last_phase = phases[len(phases) - 1]
+    start_time = last_phase.full_duration_nodes.start_time
+    _extend(timeline)
+    node = next(x for x in last_phase.phase_nodes if x in last_phase.full_duration_nodes.nodes_by_type[x.type_str])
+    assert node.start_time == last_phase.full_duration_nodes.start_time != start_time
+    assert node.get_attribute_value("StartTime") == str(node.start_time)
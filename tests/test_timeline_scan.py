@@ -0,0 +1,56 @@
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import timeline_scan
+from lsf_parser import parse_resource_file_with_source
+from lsf_writer import write_lsf
+from lsx_writer import write_lsx
+from timeline_parser import TimelineTree
+from timeline_scan import scan_timeline, scan_timelines
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+TIMELINE_LSX = os.path.join(DATA_DIR, "timeline.lsf.lsx")
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    # the fixture fits in a single batch otherwise, this spreads it over several workers
+    monkeypatch.setattr(timeline_scan, "_CHUNK_BATCH_SIZE", 4096)
+
+def test_parallel_matches_serial(tmp_path, small_batches):
+    lsf_path = str(tmp_path / "timeline.lsf")
+    tree, _ = parse_resource_file_with_source(TIMELINE_LSX)
+    write_lsf(tree, lsf_path)
+    serial = scan_timelines([TIMELINE_LSX, lsf_path], max_workers=1)
+    parallel = scan_timelines([TIMELINE_LSX, lsf_path], max_workers=2)
+    assert parallel == serial
+    # the .lsf is read in one go, it has to come out the same as the chunked .lsx
+    assert serial[lsf_path].phases == serial[TIMELINE_LSX].phases
+
+def test_matches_timeline_tree(small_batches):
+    summary = scan_timeline(TIMELINE_LSX, max_workers=2)
+    timeline = TimelineTree.create(TIMELINE_LSX, use_cache=False)
+    phases = timeline.content.effect.effect_component_phases
+    assert list(summary.phases) == list(range(len(phases)))
+    for phase in phases:
+        phase_summary = summary.phases[phase.phase_index]
+        assert [x.uuid for x in phase_summary.components] == [x.uuid for x in phase.phase_nodes]
+        assert [x.type_str for x in phase_summary.components] == [x.type_str for x in phase.phase_nodes]
+        assert phase_summary.referenced_guids == phase.get_referenced_guids()
+        assert (phase_summary.start_time, phase_summary.end_time) == (phase.full_duration_nodes.start_time, phase.full_duration_nodes.end_time)
+    assert summary.phase_index_by_dialog_uuid == {x.dialog_node_uuid: x.phase_index for x in timeline.content.phases.phases}
+
+def test_phase_without_effect_components(tmp_path):
+    tree, _ = parse_resource_file_with_source(TIMELINE_LSX)
+    container = next(x for x in tree.getroot().iter("node") if x.attrib.get("id") == "EffectComponents").find("children")
+    for element in list(container):
+        if any(x.attrib["id"] == "PhaseIndex" and x.attrib["value"] == "1" for x in element.findall("attribute")):
+            container.remove(element)
+    file_path = str(tmp_path / "timeline.lsf.lsx")
+    write_lsx(tree, file_path)
+    summary = scan_timeline(file_path, max_workers=1)
+    assert 1 not in summary.phases
+    assert sorted(summary.phases) == [0, 2, 3]
+    dialog_uuid = next(x for x, phase_index in summary.phase_index_by_dialog_uuid.items() if phase_index == 1)
+    assert summary.get_phase_by_dialog_uuid(dialog_uuid) is None
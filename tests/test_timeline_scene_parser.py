@@ -0,0 +1,31 @@
+import os
+
+from timeline_parser import TimelineTree
+from timeline_scene_parser import TimelineSceneTree
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+TIMELINE_LSX = os.path.join(DATA_DIR, "timeline.lsf.lsx")
+SCENE_LSX = os.path.join(DATA_DIR, "scene.lsf.lsx")
+
+REMAPPED_TEMPLATE_ID = "00000000-0000-4000-8000-000000000001"
+
+def test_add_actor_after_template_remap():
+    scene = TimelineSceneTree.create(SCENE_LSX, use_cache=False)
+    actors = scene.content.actors
+    template_id = actors.actors[0].template_id
+    # built before the remap, the add below has to see the new template id
+    assert actors.get_actors_by_template_id()[template_id] is actors.actors[0]
+
+    timeline = TimelineTree.create(TIMELINE_LSX, use_cache=False)
+    timeline.content.get_dependency_nodes_used_in_phase(phase_index=0, scene_tree=scene, companion_mapping={template_id: REMAPPED_TEMPLATE_ID})
+    assert actors.actors[0].template_id == REMAPPED_TEMPLATE_ID
+
+    # the same actor from another copy of the scene, already remapped
+    node = TimelineSceneTree.create(SCENE_LSX, use_cache=False).content.actors.actors[0]
+    node.update_value_for_attribute(name="TemplateId", new_value=REMAPPED_TEMPLATE_ID)
+    node.template_id = REMAPPED_TEMPLATE_ID
+    actor_count = len(actors.actors)
+    actors.add_actors_node(node)
+    assert len(actors.actors) == actor_count
+    assert sum(x.template_id == REMAPPED_TEMPLATE_ID for x in actors.actors) == 1
+    assert template_id not in actors.get_actors_by_template_id()
@@ -0,0 +1,61 @@
+import json
+import uuid
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from uuid_allocator import UuidAllocator
+
+PREGENERATED = [f"00000000-0000-4000-8000-{i:012d}" for i in range(4)]
+
+def _allocator(tmp_path, mod_name: str = "test_mod") -> UuidAllocator:
+    return UuidAllocator(mod_name=mod_name, pregenerated=PREGENERATED, ledger_path=str(tmp_path / f"{mod_name}.json"))
+
+def _tree(*values: str) -> ET.Element:
+    root = ET.Element("save")
+    for value in values:
+        ET.SubElement(root, "attribute", {"id": "UUID", "type": "guid", "value": value})
+    return root
+
+def test_uuid_for_key_is_stable(tmp_path):
+    a = _allocator(tmp_path)
+    b = _allocator(tmp_path)
+    one = a.uuid_for_key("kiss A/phase 3")
+    assert one == b.uuid_for_key("kiss A/phase 3")
+    assert uuid.UUID(one).version == 5
+    assert one != a.uuid_for_key("kiss A/phase 4")
+    assert one != _allocator(tmp_path, mod_name="other_mod").uuid_for_key("kiss A/phase 3")
+
+def test_ledger_keeps_keys(tmp_path):
+    a = _allocator(tmp_path)
+    pregenerated = a.pop_one_uuid()
+    keyed = a.uuid_for_key("new node")
+    a.save_ledger()
+    with open(a.ledger_path, "r", encoding="utf-8") as f:
+        ledger = json.load(f)
+    assert ledger["namespace"] == str(a.namespace)
+    assert ledger["issued"] == {pregenerated: None, keyed: "new node"}
+    # a later run adds to it
+    b = _allocator(tmp_path)
+    other = b.uuid_for_key("other node")
+    b.save_ledger()
+    assert b.load_ledger() == {pregenerated: None, keyed: "new node", other: "other node"}
+
+def test_collisions_with_earlier_runs(tmp_path):
+    a = _allocator(tmp_path)
+    keyed = a.uuid_for_key("new node")
+    a.save_ledger()
+    # nothing was issued yet in this run, the keyed uuid is only known from the ledger
+    b = _allocator(tmp_path)
+    assert b.find_collisions([_tree("11111111-2222-3333-4444-555555555555")]) == set()
+    assert b.find_collisions([_tree(keyed.upper())]) == {keyed}
+    with pytest.raises(AssertionError):
+        b.assert_no_collisions([_tree(keyed)])
+
+def test_ledger_of_another_namespace(tmp_path):
+    a = _allocator(tmp_path)
+    a.uuid_for_key("new node")
+    a.save_ledger()
+    b = UuidAllocator(mod_name="test_mod", namespace=uuid.uuid4(), ledger_path=a.ledger_path)
+    with pytest.raises(AssertionError):
+        b.load_ledger()
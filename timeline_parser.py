@@ -1,11 +1,19 @@
 import xml.etree.ElementTree as ET
+import heapq
+from copy import copy, deepcopy
 from dataclasses import dataclass, field
 from typing import TypeAlias, Literal
+from collections.abc import Iterator
 from timeline_scene_parser import TimelineSceneTree
 
-from base_objects import NewTimelinePhasesNode, NewPhasesNode, NewAttribute, BaseNode, create_comment, NewNode, NewBaseNode, Guid, EffectComponentChildType, EffectComponentType,emotions_labels,known_effect_component_child_type, known_effect_component_types
+from base_objects import NewTimelinePhasesNode, NewPhasesNode, NewAttribute, BaseNode, create_comment, index_of_child, insert_child, append_child, remove_child, set_attribute_value, cached_wrapper, structure_version, guid_version, NewNode, NewBaseNode, Guid, EffectComponentChildType, EffectComponentType,emotions_labels,known_effect_component_child_type, known_effect_component_types
+from cache_utils import load_cached
+from lsf_writer import write_resource_file
+from lsf_parser import parse_resource_file_with_source
+from lsx_incremental import LsxSource
 from dialog_tree_objects import DialogContent
 from text_utils import TextEntry, TextKey
+
 VERBOSE = False
 
 @dataclass
@@ -50,6 +58,7 @@ class EmotionData:
 
 @dataclass
 class PhaseNode(BaseNode):
+    __slots__ = ("duration", "duration_str", "dialog_node_id")
     duration: float
     duration_str: str
     dialog_node_id: Guid
@@ -66,14 +75,40 @@ class PhaseNode(BaseNode):
 
 @dataclass
 class EffectComponentChildNode(BaseNode):
+    __slots__ = ("child_type", "_guid_attributes", "_guid_attributes_version", "_time_attributes", "_time_attributes_version")
     child_type: EffectComponentChildType
     def __init__(self, element: ET.Element) -> None:
         super().__init__(element)
         self.child_type = element.attrib.get("id", "")
+        # (node, attribute) for every guid attribute in this node and its children, in document order
+        self._guid_attributes: list[tuple[ET.Element, ET.Element]] | None = None
+        self._guid_attributes_version: object | None = None
+        # same for the float Time attributes of the keys
+        self._time_attributes: list[tuple[ET.Element, ET.Element]] | None = None
+        self._time_attributes_version: object | None = None
+
+    def get_guid_attributes(self) -> list[tuple[ET.Element, ET.Element]]:
+        # one walk over the elements instead of a wrapper per child, redone only after nodes got added or removed
+        if self._guid_attributes is None or self._guid_attributes_version is not structure_version(self._node):
+            self._guid_attributes = [
+                (node, x) for node in self._node.iter("node") for x in node
+                if x.tag == "attribute" and x.attrib.get("type") == "guid"
+            ]
+            self._guid_attributes_version = structure_version(self._node)
+        return self._guid_attributes
+
+    def get_time_attributes(self) -> list[tuple[ET.Element, ET.Element]]:
+        if self._time_attributes is None or self._time_attributes_version is not structure_version(self._node):
+            self._time_attributes = [
+                (node, x) for node in self._node.iter("node") for x in node
+                if x.tag == "attribute" and x.attrib.get("id") == "Time" and x.attrib.get("type") == "float"
+            ]
+            self._time_attributes_version = structure_version(self._node)
+        return self._time_attributes
 
     def get_children_nodes(self, child_type: str | None) -> list["EffectComponentChildNode"]:
         children_elements = self._get_children_elements(child_type=child_type)
-        return [EffectComponentChildNode(element=x) for x in children_elements]
+        return [cached_wrapper(x, EffectComponentChildNode) for x in children_elements]
     
 
     def get_key_nodes(self) -> list["EffectComponentChildNode"]:
@@ -86,60 +121,27 @@ class EffectComponentChildNode(BaseNode):
         return self.get_children_nodes(child_type="Keys")
     
     def map_all_guid_children(self, guid_map: dict[Guid, Guid]) -> None:
-        # iterate all children and map any attribute that has Guid type and matches existing_guid
-
-        # check all attributes
-        for attribute_name, attribute_element in self._attribute_elements.items():
-            attr_type = attribute_element.attrib.get("type", "")
-            if attr_type == "guid":
-                value = attribute_element.attrib["value"]
-                if value in guid_map:
-                    old = attribute_element.attrib["value"] 
-                    attribute_element.attrib["value"] = guid_map[value]
-                    if VERBOSE:
-                        print(f"Mapped {attribute_name} - {old} to {guid_map[value]}")
-
-        # check all children
-        children_elements = [EffectComponentChildNode(x) for x in self._get_children_elements(child_type=None)]
-        for child in children_elements:
-            child.map_all_guid_children(guid_map=guid_map)
-
-    def shift_all_time_attributes(self, shift_amount: float) -> None:
-        # iterate all children and map any attribute that has Guid type and matches existing_guid
-        attributes_for_timestamps = [
-            "Time"
-        ]
-        # check all attributes
-        for attribute_name, attribute_element in self._attribute_elements.items():
-            attr_type = attribute_element.attrib.get("type", "")
-            if attribute_name in attributes_for_timestamps and attr_type == "float":
-                old_value = float(attribute_element.attrib["value"])
-                new_value = str(shift_amount + old_value)
-                attribute_element.attrib["value"] = new_value
+        # map any attribute in this node or its children that has Guid type and matches existing_guid
+        for node, attribute_element in self.get_guid_attributes():
+            value = attribute_element.attrib["value"]
+            if value in guid_map:
+                set_attribute_value(node, attribute_element, guid_map[value])
                 if VERBOSE:
-                    print(f"Shifted {attribute_name} - {old_value} to {new_value}")
+                    print(f"Mapped {attribute_element.attrib['id']} - {value} to {guid_map[value]}")
 
-        # check all children
-        children_elements = [EffectComponentChildNode(x) for x in self._get_children_elements(child_type=None)]
-        for child in children_elements:
-            child.shift_all_time_attributes(shift_amount=shift_amount)
+    def shift_all_time_attributes(self, shift_amount: float) -> None:
+        # shift the Time of every key in this node or its children
+        for node, attribute_element in self.get_time_attributes():
+            old_value = float(attribute_element.attrib["value"])
+            new_value = str(shift_amount + old_value)
+            set_attribute_value(node, attribute_element, new_value)
+            if VERBOSE:
+                print(f"Shifted Time - {old_value} to {new_value}")
 
     def get_all_guid_children(self) -> list[Guid]:
         # blindly get all guids
-        # check all attributes
-        ret = []
-        for attribute_name, attribute_element in self._attribute_elements.items():
-            attr_type = attribute_element.attrib.get("type", "")
-            if attr_type == "guid":
-                value = attribute_element.attrib["value"]
-                ret.append(value)
+        return [x.attrib["value"] for _, x in self.get_guid_attributes()]
 
-        # check all children
-        children_elements = [EffectComponentChildNode(x) for x in self._get_children_elements(child_type=None)]
-        for child in children_elements:
-            child_guids = child.get_all_guid_children()
-            ret.extend(child_guids)
-        return ret
     def get_texture_channel_value(self) -> str | None:
         textures = self.get_children_nodes("TextureChannel")
         assert len(textures) == 1
@@ -163,6 +165,7 @@ class EffectComponentChildNode(BaseNode):
 
 @dataclass
 class EffectComponentNode(EffectComponentChildNode):
+    __slots__ = ("type_str", "uuid", "end_time", "end_time_str", "start_time", "start_time_str", "phase_index")
     type_str: EffectComponentType
     uuid: Guid
     end_time: float
@@ -219,8 +222,12 @@ class EffectComponentNode(EffectComponentChildNode):
     
     def shift_timestamp(self, shift_amount: float) -> None:
         # start and end times need to be adjusted
-        self.start_time += shift_amount
-        self.end_time += shift_amount
+        self._write_start_and_end_time(start_time=self.start_time + shift_amount, end_time=self.end_time + shift_amount)
+        self.shift_all_time_attributes(shift_amount=shift_amount)
+
+    def _write_start_and_end_time(self, start_time: float, end_time: float) -> None:
+        self.start_time = start_time
+        self.end_time = end_time
         self.start_time_str = str(self.start_time)
         self.end_time_str = str(self.end_time)
         self._add_or_update_attribute_node(
@@ -228,8 +235,6 @@ class EffectComponentNode(EffectComponentChildNode):
         )
         self.update_value_for_attribute(name="EndTime", new_value=self.end_time_str)
 
-        self.shift_all_time_attributes(shift_amount=shift_amount)
-
     def get_keys(self) -> list[EffectComponentChildNode]:
         return self.get_children_nodes(child_type="Keys")
     
@@ -442,6 +447,9 @@ class DurationNodes:
     start_time: float
     end_time: float
     nodes_by_type: dict[str, list[EffectComponentNode]]
+    # shifts that start_time/end_time already include but the nodes haven't been written with yet, in the order they
+    # were made, see flush_time_shift
+    _pending_shifts: list[float] = field(default_factory=list)
     def __post_init__(self) -> None:
         self.duration = self.end_time - self.start_time
     
@@ -449,7 +457,7 @@ class DurationNodes:
         for _, nodes in self.nodes_by_type.items():
             for node in nodes:
                 print(f"Remove {node.uuid} {node.type_str}")
-                self._container_element.remove(node._node)
+                remove_child(self._container_element, node._node)
         self.nodes_by_type = {}
         self.end_time = self.start_time
     
@@ -462,16 +470,17 @@ class DurationNodes:
         return False
 
     def append_new_node(self, new_node: NewNode) -> None:
+        self.flush_time_shift()
         element = new_node.create_element(phase_index=self._phase_index, is_effect_component=True, start_time=self.start_time, end_time=self.end_time)
 
         # insert under one of the existing nodes
         existing_node = list(self.nodes_by_type.values())[-1][-1]._node
-        existing_node_index = list(self._container_element).index(existing_node)
-        self._container_element.insert(existing_node_index + 1, element)
+        existing_node_index = index_of_child(self._container_element, existing_node)
+        insert_child(self._container_element, existing_node_index + 1, element)
         comment_str = "Added new node"
         if new_node.debug_comment is not None:
             comment_str = f"{new_node.debug_comment} - {comment_str}"
-        self._container_element.insert(existing_node_index + 1, create_comment(comment_str))
+        insert_child(self._container_element, existing_node_index + 1, create_comment(comment_str))
 
         new_effect_component = EffectComponentNode(element=element)
         if new_effect_component.type_str not in self.nodes_by_type:
@@ -481,6 +490,7 @@ class DurationNodes:
 
 
     def update_end_time(self, new_end_time: str) -> None:
+        self.flush_time_shift()
         self.end_time = float(new_end_time)
         for _, nodes in self.nodes_by_type.items():
             for n in nodes:
@@ -490,11 +500,21 @@ class DurationNodes:
         self.duration = self.end_time - self.start_time
 
     def shift_timestamp(self, shift_amount: float) -> None:
+        # nodes get rewritten once on flush instead of on every shift
         self.start_time += shift_amount
         self.end_time += shift_amount
+        self._pending_shifts.append(shift_amount)
+
+    def flush_time_shift(self) -> None:
+        # one shift after the other like they were made, adding them up first rounds differently
+        if len(self._pending_shifts) == 0:
+            return
+        shift_amounts = self._pending_shifts
+        self._pending_shifts = []
         for _, nodes in self.nodes_by_type.items():
             for n in nodes:
-                n.shift_timestamp(shift_amount=shift_amount)
+                for shift_amount in shift_amounts:
+                    n.shift_timestamp(shift_amount=shift_amount)
 
     def num_nodes(self) -> int:
         return sum([len(x) for x in self.nodes_by_type.values()])
@@ -511,7 +531,14 @@ class DurationNodes:
                 nodes_by_type[node.type_str].append(node)
         assert len(all_nodes) == sum([len(x) for x in nodes_by_type.values()])
         return DurationNodes(_phase_index=phase_index, _container_element=container_element, start_time=start_time, end_time=end_time, nodes_by_type=nodes_by_type)
-    
+
+    def clone(self, cloned_nodes: dict[int, EffectComponentNode], container_element: ET.Element) -> "DurationNodes":
+        # cloned_nodes maps id() of each original node to its copy
+        nodes_by_type = {type_str: [cloned_nodes[id(x)] for x in nodes] for type_str, nodes in self.nodes_by_type.items()}
+        new_duration_nodes = DurationNodes(_phase_index=self._phase_index, _container_element=container_element, start_time=self.start_time, end_time=self.end_time, nodes_by_type=nodes_by_type)
+        new_duration_nodes.duration = self.duration
+        return new_duration_nodes
+
     def print_info(self, context: TimelinePrintInfoContext) -> None:
         did_print_header = False
         for node_type, nodes in sorted(self.nodes_by_type.items()):
@@ -541,14 +568,47 @@ class DurationNodes:
 class EffectComponentPhase:
     _container_element: ET.Element
     phase_index: int
-    phase_nodes: list[EffectComponentNode] # only used for init, may not be up to date if stuff gets added to subdurations directly
+    _phase_nodes: list[EffectComponentNode] # only used for init, may not be up to date if stuff gets added to subdurations directly
 
     full_duration_nodes: DurationNodes = field(init=False)
     sub_duration_nodes: list[DurationNodes] = field(init=False)
 
     nodes_by_uuid: dict[str, EffectComponentNode] | None = None
+    # guid -> (phase node, node, attribute) of every guid attribute in phase_nodes with that value
+    _guid_index: dict[Guid, list[tuple[EffectComponentNode, ET.Element, ET.Element]]] | None = None
+    _guid_index_versions: tuple[object, object] | None = None
+
+    @property
+    def phase_nodes(self) -> list[EffectComponentNode]:
+        # the nodes' times are only current once the pending shifts are written
+        self.flush_time_shift()
+        return self._phase_nodes
+
+    def get_guid_index(self) -> dict[Guid, list[tuple[EffectComponentNode, ET.Element, ET.Element]]]:
+        # rebuilt from the per node lists once nodes or guid values changed
+        if self._guid_index is None or self._guid_index_versions[0] is not structure_version(self._container_element) or self._guid_index_versions[1] is not guid_version(self._container_element):
+            self._guid_index = {}
+            for phase_node in self.phase_nodes:
+                for node, attribute_element in phase_node.get_guid_attributes():
+                    self._guid_index.setdefault(attribute_element.attrib["value"], []).append((phase_node, node, attribute_element))
+            self._guid_index_versions = (structure_version(self._container_element), guid_version(self._container_element))
+        return self._guid_index
+
+    def references_guid(self, guid: Guid) -> bool:
+        return guid in self.get_guid_index()
+
+    def map_guids(self, guid_map: dict[Guid, Guid], node_type: str | None = None) -> None:
+        # same as map_all_guid_children on every phase node (of node_type), only the matching attributes get looked at
+        guid_index = self.get_guid_index()
+        for guid in [x for x in guid_map if x in guid_index]:
+            for phase_node, node, attribute_element in guid_index[guid]:
+                if node_type is None or phase_node.type_str == node_type:
+                    set_attribute_value(node, attribute_element, guid_map[guid])
+                    if VERBOSE:
+                        print(f"Mapped {attribute_element.attrib['id']} - {guid} to {guid_map[guid]}")
 
     def get_node_by_uuid(self, node_uuid: str, node_type_str: str) -> EffectComponentNode:
+        self.flush_time_shift()
         if self.nodes_by_uuid is None:
             self.nodes_by_uuid = {}
             for node in self.phase_nodes:
@@ -557,7 +617,40 @@ class EffectComponentPhase:
         n =  self.nodes_by_uuid[node_uuid]
         assert n.type_str == node_type_str
         return n
-    
+
+    def clone(self) -> "EffectComponentPhase":
+        # copies only the EffectComponent elements of this phase, not the whole shared EffectComponents container.
+        # the copies live in a detached container until the phase gets appended to a timeline
+        self.flush_time_shift()
+        container_element = ET.Element("children")
+        cloned_nodes: dict[int, EffectComponentNode] = {}
+
+        def clone_node(node: EffectComponentNode) -> None:
+            if id(node) in cloned_nodes:
+                return
+            element = deepcopy(node._node)
+            container_element.append(element)
+            cloned_nodes[id(node)] = EffectComponentNode(element=element)
+
+        for node in self.phase_nodes:
+            clone_node(node)
+        # nodes added to durations directly aren't in phase_nodes, copy them too so the groupings stay intact
+        for duration_nodes in [self.full_duration_nodes] + self.sub_duration_nodes:
+            for nodes in duration_nodes.nodes_by_type.values():
+                for node in nodes:
+                    clone_node(node)
+
+        # shallow copy skips __post_init__, the groupings are rebuilt from the originals instead
+        new_phase = copy(self)
+        new_phase._container_element = container_element
+        new_phase._phase_nodes = [cloned_nodes[id(x)] for x in self.phase_nodes]
+        new_phase.full_duration_nodes = self.full_duration_nodes.clone(cloned_nodes=cloned_nodes, container_element=container_element)
+        new_phase.sub_duration_nodes = [x.clone(cloned_nodes=cloned_nodes, container_element=container_element) for x in self.sub_duration_nodes]
+        new_phase.nodes_by_uuid = None
+        new_phase._guid_index = None
+        new_phase._guid_index_versions = None
+        return new_phase
+
     def get_referenced_guids(self) -> list[str]:
         # return uuids used by nodes in this phase
         # for camera container, actor, animation, stage... everything basically
@@ -573,14 +666,14 @@ class EffectComponentPhase:
             if self.nodes_by_uuid is not None:
                 del self.nodes_by_uuid[node.uuid]
             self.phase_nodes.remove(node)
-            self._container_element.remove(node._node)
+            remove_child(self._container_element, node._node)
             return # removed from full duration
         for sub_duration in self.sub_duration_nodes:
             if sub_duration.remove_node(node=node):
                 if self.nodes_by_uuid is not None:
                     del self.nodes_by_uuid[node.uuid]
                 self.phase_nodes.remove(node)
-                self._container_element.remove(node._node)
+                remove_child(self._container_element, node._node)
                 return # removed from subduration
         assert False, "Did not find node"
 
@@ -622,6 +715,7 @@ class EffectComponentPhase:
         self.sub_duration_nodes.append(new_subduration)
     
     def extend_end_timestamp(self, adjustment_amount: float, nodes_for_new_subduration: list[NewNode], extend_subdurations_of_types: list[str]) -> None:
+        self.flush_time_shift()
         current_end_time = self.full_duration_nodes.end_time
         new_end_time =self.full_duration_nodes.end_time + adjustment_amount
 
@@ -659,13 +753,14 @@ class EffectComponentPhase:
             last_existing_node = self.phase_nodes[-1]
             self.phase_nodes.extend(new_nodes)
 
-            last_existing_node_index = list(self._container_element).index(last_existing_node._node)
+            last_existing_node_index = index_of_child(self._container_element, last_existing_node._node)
             for n in reversed(new_elements):
-                self._container_element.insert(last_existing_node_index+1, n)
-                self._container_element.insert(last_existing_node_index + 1, create_comment(f"Added new node for extended duration {adjustment_amount}s"))
+                insert_child(self._container_element, last_existing_node_index+1, n)
+                insert_child(self._container_element, last_existing_node_index + 1, create_comment(f"Added new node for extended duration {adjustment_amount}s"))
 
 
     def print_info(self, context:TimelinePrintInfoContext) -> None:
+        self.flush_time_shift()
         print(f"Info for EffectComponent: PhaseIndex={self.phase_index}")
         print(f"Full duration: {self.full_duration_nodes.num_nodes()} nodes")
         self.full_duration_nodes.print_info(context=context)
@@ -674,10 +769,16 @@ class EffectComponentPhase:
             node.print_info(context=context)
 
     def shift_timestamp(self, shift_amount: float) -> None:
+        # deferred, durations see the new times right away but the xml only gets updated in flush_time_shift
         self.full_duration_nodes.shift_timestamp(shift_amount=shift_amount)
         for s in self.sub_duration_nodes:
             s.shift_timestamp(shift_amount=shift_amount)
 
+    def flush_time_shift(self) -> None:
+        self.full_duration_nodes.flush_time_shift()
+        for s in self.sub_duration_nodes:
+            s.flush_time_shift()
+
     def remove_shapeshift_by_template_id(self, template_id: str , actor: str | None) -> None:
         for node in self.phase_nodes:
             if node.type_str == "TLShapeShift":
@@ -708,6 +809,7 @@ class EffectComponentPhase:
 
 
     def force_show_armor_to_camp_clothing(self, actor: str, clothing_type: Literal["Camp", "Armor","All", "Naked"]) -> None:
+        self.flush_time_shift()
         total_slots = 11
         # channels default to true (armor visible) and inherit the overrides from nodes before them.
         # so empty nodes inherit from previous nodes
@@ -784,7 +886,7 @@ class EffectComponentPhase:
         # find start and end time ranges
         min_start_time = None
         max_end_time = None
-        for node in self.phase_nodes:
+        for node in self._phase_nodes:
             if min_start_time is None or node.start_time < min_start_time:
                 min_start_time = node.start_time
             if max_end_time is None or node.end_time > max_end_time:
@@ -798,7 +900,7 @@ class EffectComponentPhase:
         # calculate sub duration nodes
         sub_duration_nodes_by_type: dict[tuple[float, float], list[EffectComponentNode]] = {}
 
-        for node in self.phase_nodes:
+        for node in self._phase_nodes:
             if node.start_time == min_start_time and node.end_time == max_end_time:
                 # full duration node
                 if node.type_str in full_duration_nodes_by_type:
@@ -827,24 +929,109 @@ class EffectComponentPhase:
 
 
 
+def _read_phase_index(element: ET.Element) -> int:
+    # same as EffectComponentNode(element).phase_index without building the wrapper
+    phase_index = None
+    for child in element:
+        if child.tag == "attribute" and child.attrib["id"] == "PhaseIndex":
+            phase_index = child.attrib["value"]
+    return int(phase_index or "0")
+
+class EffectComponentPhases:
+    # list of EffectComponentPhase by phase index. only the phase boundaries get indexed up front, the node wrappers and
+    # duration groupings of a phase are built the first time it is accessed, so copying one phase out of a big timeline
+    # doesn't wrap every node in it
+    def __init__(self, container_element: ET.Element, phase_elements: list[list[ET.Element]]) -> None:
+        self._container_element = container_element
+        self._phase_elements: list[list[ET.Element] | None] = phase_elements
+        self._phases: list[EffectComponentPhase | None] = [None] * len(phase_elements)
+        # shifts of phases that weren't built yet in the order they were made, applied when they are built or flushed
+        self._pending_shifts: list[list[float]] = [[] for _ in phase_elements]
+
+    @classmethod
+    def create(cls, container_element: ET.Element, effect_component_elements: list[ET.Element]) -> "EffectComponentPhases":
+        elements_by_phase: dict[int, list[ET.Element]] = {}
+        for element in effect_component_elements:
+            elements_by_phase.setdefault(_read_phase_index(element), []).append(element)
+        phase_elements = []
+        for (phase_index, elements) in sorted(elements_by_phase.items()):
+            assert len(phase_elements) == phase_index
+            phase_elements.append(elements)
+        return cls(container_element=container_element, phase_elements=phase_elements)
+
+    def _get_phase(self, phase_index: int) -> EffectComponentPhase:
+        phase = self._phases[phase_index]
+        if phase is None:
+            phase = EffectComponentPhase(
+                _container_element=self._container_element,
+                phase_index=phase_index,
+                _phase_nodes=[EffectComponentNode(x) for x in self._phase_elements[phase_index]],
+            )
+            self._phases[phase_index] = phase
+            self._phase_elements[phase_index] = None
+            for shift_amount in self._pending_shifts[phase_index]:
+                phase.shift_timestamp(shift_amount=shift_amount)
+            self._pending_shifts[phase_index] = []
+        return phase
+
+    def __getitem__(self, index: int | slice) -> "EffectComponentPhase | list[EffectComponentPhase]":
+        if isinstance(index, slice):
+            return [self._get_phase(i) for i in range(len(self._phases))[index]]
+        return self._get_phase(range(len(self._phases))[index])
+
+    def __len__(self) -> int:
+        return len(self._phases)
+
+    def __iter__(self) -> Iterator[EffectComponentPhase]:
+        for i in range(len(self._phases)):
+            yield self._get_phase(i)
+
+    def append(self, phase: EffectComponentPhase) -> None:
+        self._phases.append(phase)
+        self._phase_elements.append(None)
+        self._pending_shifts.append([])
+
+    def built_phases(self) -> list[EffectComponentPhase]:
+        # phases that were accessed, the others can't have been edited
+        return [x for x in self._phases if x is not None]
+
+    def shift_timestamps_from(self, phase_index: int, shift_amount: float) -> None:
+        # shifts every phase from phase_index on, without building the ones that weren't accessed yet
+        for i in range(phase_index, len(self._phases)):
+            phase = self._phases[i]
+            if phase is not None:
+                phase.shift_timestamp(shift_amount=shift_amount)
+            else:
+                self._pending_shifts[i].append(shift_amount)
+
+    def flush_time_shifts(self) -> None:
+        for phase in self.built_phases():
+            phase.flush_time_shift()
+        # phases nobody accessed only need their nodes rewritten, not the durations
+        for i, shift_amounts in enumerate(self._pending_shifts):
+            if len(shift_amounts) > 0 and self._phases[i] is None:
+                for element in self._phase_elements[i]:
+                    node = EffectComponentNode(element)
+                    for shift_amount in shift_amounts:
+                        node.shift_timestamp(shift_amount=shift_amount)
+                self._pending_shifts[i] = []
+
+
 @dataclass
 class TimelineContentEffect(BaseNode):
+    __slots__ = ("duration", "duration_str", "phases", "effect_component_phases", "_effect_components_children_container", "_phases_children_container")
     duration: float
     duration_str: str
     phases: list[PhaseNode]
-    effect_component_phases: list[EffectComponentPhase]
+    effect_component_phases: EffectComponentPhases
     _effect_components_children_container: ET.Element
     _phases_children_container: ET.Element
 
     def map_all_guid_children(self, guid_map: dict[str, str], node_type: str) -> None:
         for phase in self.effect_component_phases:
-            for phase_node in phase.phase_nodes:
-                if phase_node.type_str == node_type:
-                    phase_node.map_all_guid_children(
-                    guid_map=guid_map
-                )
+            phase.map_guids(guid_map=guid_map, node_type=node_type)
 
-    def append_new_phase(self, existing_phase_to_append: EffectComponentPhase, actor_map_context: ActorMapContext, new_dialog_node_id: Guid, new_reference_id: Guid | None = None) -> int:
+    def append_new_phase(self, existing_phase_to_append: EffectComponentPhase, actor_map_context: ActorMapContext, new_dialog_node_id: Guid, new_reference_id: Guid | None = None, should_write_duration: bool = True) -> int:
         # we need to copy this phase and adjust the timestamps + phase index + actors
         # plus add new phase node higher up and add a new phase here, and adjust total duration. phew
         # TODO swap positions for reverse kisses
@@ -856,6 +1043,7 @@ class TimelineContentEffect(BaseNode):
         assert len(self.effect_component_phases) == new_phase_index, f"{len(self.effect_component_phases)} == {new_phase_index}"
 
         new_start_time = self.effect_component_phases[-1].full_duration_nodes.end_time
+        existing_phase_to_append.flush_time_shift()
         new_phase = existing_phase_to_append
         new_phase_nodes = []
         old_start_time = existing_phase_to_append.full_duration_nodes.start_time
@@ -890,19 +1078,24 @@ class TimelineContentEffect(BaseNode):
                 guid_map=actor_map_context.create_map(node_type=phase_node.type_str)
             )
             new_phase_nodes.append(phase_node)
-            self._effect_components_children_container.append(phase_node._node)
-        new_phase_component = EffectComponentPhase(_container_element=self._effect_components_children_container, phase_index=new_phase_index, phase_nodes=new_phase_nodes)
+            append_child(self._effect_components_children_container, phase_node._node)
+        new_phase_component = EffectComponentPhase(_container_element=self._effect_components_children_container, phase_index=new_phase_index, _phase_nodes=new_phase_nodes)
         self.effect_component_phases.append(new_phase_component)
         
         self.duration += new_phase_dur
-        self.duration_str = str(self.duration)
-        self.update_value_for_attribute(name="Duration", new_value=self.duration_str)
+        if should_write_duration:
+            self.write_duration()
         new_phase_node = NewPhasesNode(duration=str(new_phase_dur), dialog_node_id=new_dialog_node_id)
         new_element = new_phase_node.create_element()
-        self._phases_children_container.append(new_element)
+        append_child(self._phases_children_container, new_element)
         self.phases.append(PhaseNode(new_element))
         return new_phase_index
     
+    def write_duration(self) -> None:
+        # when appending a batch of phases the Duration attribute only needs writing once at the end
+        self.duration_str = str(self.duration)
+        self.update_value_for_attribute(name="Duration", new_value=self.duration_str)
+
     def __init__(self, element: ET.Element) -> None:
         super().__init__(element)
         self.duration_str = self.get_attribute_value("Duration")
@@ -912,19 +1105,11 @@ class TimelineContentEffect(BaseNode):
         self.phases = [PhaseNode(x) for x in phases_container._get_children_elements(child_type="Phase")]
         effect_component_container_element = self._get_children_elements(child_type="EffectComponents")[0]
         effect_component_container = BaseNode(element=effect_component_container_element)
-        effect_components = [EffectComponentNode(x) for x in effect_component_container._get_children_elements(child_type="EffectComponent")]
         self._effect_components_children_container = effect_component_container._children_element_container
-
-        nodes_by_phase: dict[int, list[EffectComponentNode]] = {}
-        for node in effect_components:
-            if node.phase_index not in nodes_by_phase:
-                nodes_by_phase[node.phase_index] = [node]
-            else:
-                nodes_by_phase[node.phase_index].append(node)
-        self.effect_component_phases = []
-        for (phase_index, nodes) in sorted(nodes_by_phase.items()):
-            assert len(self.effect_component_phases) == phase_index
-            self.effect_component_phases.append(EffectComponentPhase(_container_element=self._effect_components_children_container, phase_index=phase_index, phase_nodes=nodes))
+        self.effect_component_phases = EffectComponentPhases.create(
+            container_element=self._effect_components_children_container,
+            effect_component_elements=effect_component_container._get_children_elements(child_type="EffectComponent"),
+        )
 
         
     def adjust_duration(self, phase_index: int, adjustment_amount: float) -> None:
@@ -948,8 +1133,12 @@ class TimelineContentEffect(BaseNode):
         for e in self.effect_component_phases:
             e.map_emotions(actor=actor, emotion_map=emotion_map)
 
+    def flush_time_shifts(self) -> None:
+        self.effect_component_phases.flush_time_shifts()
+
 @dataclass
 class TimelineSpeakerNode(BaseNode):
+    __slots__ = ("index", "speaker_guid")
     index: int
     speaker_guid: Guid
     def __init__(self, element: ET.Element) -> None:
@@ -961,6 +1150,7 @@ class TimelineSpeakerNode(BaseNode):
 
 @dataclass
 class TimelinePhaseNode(BaseNode):
+    __slots__ = ("dialog_node_uuid", "phase_index")
     dialog_node_uuid: Guid
     phase_index: int
     def __init__(self, element: ET.Element) -> None:
@@ -971,6 +1161,7 @@ class TimelinePhaseNode(BaseNode):
 
 
 class TimelineSpeakers(BaseNode):
+    __slots__ = ("speakers", "speakers_container")
     speakers: list[TimelineSpeakerNode]
     speakers_container: BaseNode
 
@@ -1020,7 +1211,7 @@ class TimelinePhases:
             map_key=dialog_node_id, map_value=phase_index
         )
         element = new_node.create_element()
-        self._objects_children_container.append(element)
+        append_child(self._objects_children_container, element)
         phases_node = TimelinePhaseNode(element=element)
         self.phases.append(phases_node)
         if  self.phases_by_uuid is not None:
@@ -1029,6 +1220,7 @@ class TimelinePhases:
 
 @dataclass
 class ActorObjectValueNode(BaseNode):
+    __slots__ = ("speaker", "actor_type_id", "actor_type", "is_player", "default_step_out_delay", "audience_slot", "scene_actor_type", "scene_actor_index", "camera", "attach_to", "look_at", "resource_id")
     speaker: str | None
     actor_type_id: str
     actor_type: str
@@ -1068,7 +1260,7 @@ class ActorObjectValueNode(BaseNode):
                 value = attribute_element.attrib["value"]
                 if value in guid_map:
                     old = attribute_element.attrib["value"] 
-                    attribute_element.attrib["value"] = guid_map[value]
+                    self._set_attribute_value(attribute_element, guid_map[value])
                     if VERBOSE:
                         print(f"Mapped {attribute_name} - {old} to {guid_map[value]}")
 
@@ -1086,6 +1278,7 @@ class ActorObjectValueNode(BaseNode):
 
 @dataclass
 class ActorObjectNode(BaseNode):
+    __slots__ = ("actor_data_uuid", "values")
     actor_data_uuid: Guid
     values: list[ActorObjectValueNode]
     def __init__(self, element: ET.Element):
@@ -1105,10 +1298,11 @@ class ActorObjectNode(BaseNode):
 
 @dataclass
 class TimelineActorDataNode(BaseNode):
+    __slots__ = ("actor_objects", "_actor_objects_children_container_node", "_actor_objects_map")
     actor_objects: list[ActorObjectNode]
 
-    _actor_objects_children_container_node: BaseNode = field(init=False)
-    _actor_objects_map: dict[str, ActorObjectNode] | None = None
+    _actor_objects_children_container_node: BaseNode
+    _actor_objects_map: dict[str, ActorObjectNode] | None
     def __init__(self, element: ET.Element):
         assert element.attrib["id"] == "TimelineActorData"
         super().__init__(element=element)
@@ -1116,6 +1310,7 @@ class TimelineActorDataNode(BaseNode):
         self._actor_objects_children_container_node = intermediate_container
         self.actor_objects = [ActorObjectNode(x) for x in intermediate_container._get_children_elements("Object")]
         assert len(self.actor_objects) > 4
+        self._actor_objects_map = None
 
     def add_actor_object(self, actor_object: ActorObjectNode, guid_map: dict[Guid, Guid]) -> None:
         if self._actor_objects_map is None:
@@ -1150,6 +1345,7 @@ class PhaseDepdenencies:
 
 @dataclass
 class PeanutObjectNode(BaseNode):
+    __slots__ = ("map_key", "map_value")
     map_key: str
     map_value: str
     def __init__(self, element: ET.Element):
@@ -1160,6 +1356,7 @@ class PeanutObjectNode(BaseNode):
 
 @dataclass
 class TimelinePeanutSlotIdMap(BaseNode):
+    __slots__ = ("objects", "object_container_node")
     objects: list[PeanutObjectNode]
     object_container_node: BaseNode
     def __init__(self, element: ET.Element):
@@ -1170,6 +1367,7 @@ class TimelinePeanutSlotIdMap(BaseNode):
 
 @dataclass
 class TimelineContent(BaseNode):
+    __slots__ = ("effect", "speakers", "phases", "actor_data", "peanut_slot_id_map")
     effect: TimelineContentEffect
     speakers: TimelineSpeakers
     phases: TimelinePhases
@@ -1186,9 +1384,8 @@ class TimelineContent(BaseNode):
         self.peanut_slot_id_map = TimelinePeanutSlotIdMap(element=self._get_children_elements(child_type="PeanutSlotIdMap")[0])
         assert len(self.speakers.speakers) >= 2, self.speakers.speakers
 
-    def append_new_phase(self, existing_phase_to_append: EffectComponentPhase, actor_map_context: ActorMapContext, new_dialog_node_id: Guid, new_reference_id: Guid | None = None, update_node_ids: list[Guid] | None = None) -> int:
-        from copy import deepcopy
-        existing_phase_to_append = deepcopy(existing_phase_to_append)
+    def append_new_phase(self, existing_phase_to_append: EffectComponentPhase, actor_map_context: ActorMapContext, new_dialog_node_id: Guid, new_reference_id: Guid | None = None, update_node_ids: list[Guid] | None = None, should_write_duration: bool = True) -> int:
+        existing_phase_to_append = existing_phase_to_append.clone()
         if actor_map_context.has_actor_removal():
             nodes = list( existing_phase_to_append.phase_nodes)
             for node in nodes:
@@ -1207,6 +1404,7 @@ class TimelineContent(BaseNode):
             actor_map_context=actor_map_context,
             new_dialog_node_id=new_dialog_node_id,
             new_reference_id=new_reference_id,
+            should_write_duration=should_write_duration,
         )
         self.phases.append_new_phase(phase_index=new_phase_id, dialog_node_id=new_dialog_node_id)
         return new_phase_id
@@ -1220,8 +1418,7 @@ class TimelineContent(BaseNode):
                          new_reference_id: Guid | None = None, 
                          update_node_ids: list[Guid] | None = None,
                          should_remove_last_subduration: bool = False) -> int:
-        from copy import deepcopy
-        copying_from_phase = deepcopy(copying_from_phase) # not sure this will work....
+        copying_from_phase = copying_from_phase.clone()
         if should_remove_last_subduration:
             copying_from_phase.remove_last_subduration()
         if update_node_ids is not None:
@@ -1281,53 +1478,71 @@ class TimelineContent(BaseNode):
     # return linked actor nodes
     def get_actor_data_nodes_used_in_phase(self, phase_index: int) -> list[ActorObjectNode]:
         phase = self.effect.effect_component_phases[phase_index]
-        all_guids_in_phase = phase.get_referenced_guids()
-        all_guids = set(all_guids_in_phase)
         ret = []
         for node in self.actor_data.actor_objects:
-            if node.actor_data_uuid in all_guids:
+            if phase.references_guid(node.actor_data_uuid):
                 ret.append(node)
         return ret
     
     def get_dependency_nodes_used_in_phase(self, phase_index: int, scene_tree: "TimelineSceneTree", companion_mapping: dict[str,str]) -> PhaseDepdenencies:
-        phase = self.effect.effect_component_phases[phase_index]
-        all_guids_in_phase = phase.get_referenced_guids()
-        all_guids = set(all_guids_in_phase)
-        actor_nodes = []
-        switch_stage_ids = []
-        for node in self.actor_data.actor_objects:
-            if node.actor_data_uuid in all_guids:
-                if VERBOSE:
-                    print(f"Taking node with actor_data_uuid {node.actor_data_uuid}")
-                actor_nodes.append(node)
-                for value_node in node.values:
-                    if value_node.camera is not None:
-                        all_guids.add(value_node.camera)
-    
-        stage_nodes = []
-        switch_stage_ids = []
-        camera_nodes = []
-        for dependent_guid in all_guids:
-            stage_node = scene_tree.content.get_stage(stage_id=dependent_guid)
-            if stage_node is not None:
-                stage_nodes.append(stage_node)
-                switch_stage_ids.append(stage_node.identifier)
-            camera_node = scene_tree.content.cameras.get_camera_object(camera_uuid=dependent_guid)
-            if camera_node is not None:
-                camera_nodes.append(camera_node)
+        return self.get_dependency_nodes_used_in_phases(phase_indexes=[phase_index], scene_tree=scene_tree, companion_mapping=companion_mapping)[0]
 
+    def get_dependency_nodes_used_in_phases(self, phase_indexes: list[int], scene_tree: "TimelineSceneTree", companion_mapping: dict[str,str]) -> list[PhaseDepdenencies]:
+        # one PhaseDepdenencies per phase index, the actor objects only get indexed once for all of them
+        actor_objects_by_uuid: dict[str, list[tuple[int, ActorObjectNode]]] = {}
+        for i, node in enumerate(self.actor_data.actor_objects):
+            actor_objects_by_uuid.setdefault(node.actor_data_uuid, []).append((i, node))
+
+        # the template ids get remapped in place, so only the first phase picks the companion actors up. same as calling it once per phase
         companion_scene_actors = [x for x in scene_tree.content.actors.actors if x.template_id in companion_mapping]
         for actor in companion_scene_actors:
             actor.update_value_for_attribute(name="TemplateId", new_value=companion_mapping[actor.template_id])
             actor.template_id = companion_mapping[actor.template_id] # kidna dirty
-        return PhaseDepdenencies(
-            scene_nodes=[],
-            stage_nodes=stage_nodes,
-            camera_nodes=camera_nodes,
-            scene_actor_nodes=companion_scene_actors,
-            actor_nodes=actor_nodes,
-            switch_stage_ids=switch_stage_ids
-        )
+
+        ret = []
+        for phase_index in phase_indexes:
+            phase = self.effect.effect_component_phases[phase_index]
+            all_guids = set(phase.get_guid_index())
+            # (actor data position, node), popped in actor data order
+            matched_actor_nodes = []
+            for guid in all_guids:
+                matched_actor_nodes.extend(actor_objects_by_uuid.get(guid, []))
+            heapq.heapify(matched_actor_nodes)
+            actor_nodes = []
+            while len(matched_actor_nodes) > 0:
+                position, node = heapq.heappop(matched_actor_nodes)
+                if VERBOSE:
+                    print(f"Taking node with actor_data_uuid {node.actor_data_uuid}")
+                actor_nodes.append(node)
+                for value_node in node.values:
+                    if value_node.camera is not None and value_node.camera not in all_guids:
+                        all_guids.add(value_node.camera)
+                        # actor objects further down can be picked up by the camera guid too
+                        for later in actor_objects_by_uuid.get(value_node.camera, []):
+                            if later[0] > position:
+                                heapq.heappush(matched_actor_nodes, later)
+
+            stage_nodes = []
+            switch_stage_ids = []
+            camera_nodes = []
+            for dependent_guid in all_guids:
+                stage_node = scene_tree.content.get_stage(stage_id=dependent_guid)
+                if stage_node is not None:
+                    stage_nodes.append(stage_node)
+                    switch_stage_ids.append(stage_node.identifier)
+                camera_node = scene_tree.content.cameras.get_camera_object(camera_uuid=dependent_guid)
+                if camera_node is not None:
+                    camera_nodes.append(camera_node)
+
+            ret.append(PhaseDepdenencies(
+                scene_nodes=[],
+                stage_nodes=stage_nodes,
+                camera_nodes=camera_nodes,
+                scene_actor_nodes=companion_scene_actors if len(ret) == 0 else [],
+                actor_nodes=actor_nodes,
+                switch_stage_ids=switch_stage_ids
+            ))
+        return ret
 
     def print_actor_info(self, context: TimelinePrintInfoContext) -> None:
         for node in self.actor_data.actor_objects:
@@ -1411,14 +1626,19 @@ class TimelineContent(BaseNode):
 class TimelineTree:
     _tree_ref: ET.ElementTree
     content: TimelineContent
+    _source: LsxSource | None = None
 
 
     @classmethod
-    def create(cls, file_path: str) -> "TimelineTree":
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        assert root.tag == "save"
-        return TimelineTree(_tree_ref=tree, content=TimelineContent(timeline_content_element=root.find("region").find("node")))
+    def create(cls, file_path: str, use_cache: bool = True) -> "TimelineTree":
+        def parse() -> "TimelineTree":
+            tree, source = parse_resource_file_with_source(file_path)
+            root = tree.getroot()
+            assert root.tag == "save"
+            return TimelineTree(_tree_ref=tree, content=TimelineContent(timeline_content_element=root.find("region").find("node")), _source=source)
+        if not use_cache:
+            return parse()
+        return load_cached(file_path=file_path, cls=cls, build=parse)
 
     def extend_phase_duration(self, phase_index: int, adjustment_amount: float, new_nodes_for_subduration: list[NewNode], extend_subdurations_of_types: list[str]) -> None:
         assert adjustment_amount > 0
@@ -1430,10 +1650,12 @@ class TimelineTree:
         # update phase duration
         self.content.effect.adjust_duration(phase_index=phase_index, adjustment_amount=adjustment_amount)
 
-        # push timestamps of all nodes after this one forward
-        for effect_component_phase in self.content.effect.effect_component_phases[phase_index+1:]:
-            effect_component_phase.shift_timestamp(shift_amount=adjustment_amount)
+        # push timestamps of all nodes after this one forward. only the durations of built phases move here,
+        # the nodes themselves get rewritten once in flush_time_shifts
+        self.content.effect.effect_component_phases.shift_timestamps_from(phase_index=phase_index+1, shift_amount=adjustment_amount)
 
+    def flush_time_shifts(self) -> None:
+        self.content.effect.flush_time_shifts()
         
 
     def print_info_for_phase_index(self, phase_index: int, context: TimelinePrintInfoContext):
@@ -1444,6 +1666,7 @@ class TimelineTree:
 
         self.content.effect.effect_component_phases[phase_index].print_info(context=context)
     
-    def write_tree(self, output_file_path: str) -> None:
-        ET.indent(self._tree_ref, space="\t", level=0)
-        self._tree_ref.write(output_file_path, encoding='utf-8', method='xml', xml_declaration=True)
+    def write_tree(self, output_file_path: str, incremental: bool = False) -> None:
+        # incremental copies whatever the edits didn't touch straight from the source .lsx
+        self.flush_time_shifts()
+        write_resource_file(self._tree_ref, output_file_path, source=self._source if incremental else None)
@@ -0,0 +1,203 @@
+import os
+import re
+import xml.etree.ElementTree as ET
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from base_objects import BaseNode, Guid
+from lsf_parser import read_lsf
+from timeline_parser import TimelinePhases
+
+# ================ Timeline Scan ================
+# read only summary of a timeline for discovery and analysis, without building the tree wrappers.
+# the EffectComponents block is nearly all of a timeline and its EffectComponents don't depend on each other, so
+# their spans are found with a byte scan and parsed in worker processes while this one parses everything else.
+# callers have to be behind `if __name__ == '__main__'` for the workers on windows.
+# with a single worker (or core) there's nothing to run in parallel, everything is parsed in this process instead
+
+# batches of EffectComponents sent to one worker, small ones aren't worth the round trip
+_CHUNK_BATCH_SIZE = 1 << 16
+
+_effect_components_tag = re.compile(rb'<node\s+id="EffectComponents"')
+# any node start, end or empty element tag. quoted values are skipped as a whole, they can have a > in them
+_node_tag = re.compile(rb"""<(/?)node\b(?:[^>"']|"[^"]*"|'[^']*')*?(/?)>""")
+
+@dataclass
+class EffectComponentSummary:
+    uuid: Guid
+    type_str: str
+    start_time: float
+    end_time: float
+    phase_index: int
+    # every guid attribute in the component, same order as EffectComponentNode.get_all_guid_children
+    referenced_guids: list[Guid]
+
+@dataclass
+class PhaseSummary:
+    phase_index: int
+    start_time: float
+    end_time: float
+    components: list[EffectComponentSummary]
+    referenced_guids: list[Guid] = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.referenced_guids = [x for component in self.components for x in component.referenced_guids]
+
+    @property
+    def duration(self) -> float:
+        return self.end_time - self.start_time
+
+@dataclass
+class TimelineSummary:
+    file_path: str
+    # by phase index, phases without EffectComponents aren't in here
+    phases: dict[int, PhaseSummary]
+    phase_index_by_dialog_uuid: dict[Guid, int]
+
+    def get_phase_by_dialog_uuid(self, dialog_uuid: Guid) -> PhaseSummary | None:
+        return self.phases.get(self.phase_index_by_dialog_uuid[dialog_uuid])
+
+# ---------------- Chunks ----------------
+
+def find_effect_component_spans(source: bytes) -> list[tuple[int, int]]:
+    # byte range of every node directly in the EffectComponents container, in document order
+    match = _effect_components_tag.search(source)
+    if match is None:
+        return []
+    ret = []
+    depth = 0
+    chunk_start = -1
+    for tag in _node_tag.finditer(source, match.start()):
+        is_end_tag = tag.group(1) == b"/"
+        is_empty = tag.group(2) == b"/"
+        if is_end_tag:
+            depth -= 1
+            if depth == 1:
+                ret.append((chunk_start, tag.end()))
+            elif depth == 0:
+                break
+        elif is_empty:
+            if depth == 1:
+                ret.append((tag.start(), tag.end()))
+            elif depth == 0:
+                break
+        else:
+            if depth == 1:
+                chunk_start = tag.start()
+            depth += 1
+    assert depth == 0, "EffectComponents isn't closed"
+    return ret
+
+def _summarize_effect_component(element: ET.Element) -> EffectComponentSummary | None:
+    if element.attrib.get("id") != "EffectComponent":
+        return None
+    values = {x.attrib["id"]: x.attrib.get("value") for x in element if x.tag == "attribute"}
+    # same defaults as EffectComponentNode
+    return EffectComponentSummary(
+        uuid=values["ID"],
+        type_str=values["Type"],
+        start_time=float(values.get("StartTime") or "0"),
+        end_time=float(values["EndTime"]),
+        phase_index=int(values.get("PhaseIndex") or "0"),
+        # attributes come before the children in a node, so this is the same walk get_all_guid_children does
+        referenced_guids=[x.attrib["value"] for x in element.iter("attribute") if x.attrib.get("type") == "guid"],
+    )
+
+def _summarize_chunks(chunks: list[bytes]) -> list[EffectComponentSummary | None]:
+    # runs in the workers
+    return [_summarize_effect_component(ET.fromstring(x)) for x in chunks]
+
+def _group_phases(components: list[EffectComponentSummary]) -> dict[int, PhaseSummary]:
+    components_by_phase: dict[int, list[EffectComponentSummary]] = {}
+    for component in components:
+        components_by_phase.setdefault(component.phase_index, []).append(component)
+    ret = {}
+    for (phase_index, phase_components) in sorted(components_by_phase.items()):
+        ret[phase_index] = PhaseSummary(
+            phase_index=phase_index,
+            start_time=min(x.start_time for x in phase_components),
+            end_time=max(x.end_time for x in phase_components),
+            components=phase_components,
+        )
+    return ret
+
+def _read_phase_index_by_dialog_uuid(root: ET.Element) -> dict[Guid, int]:
+    timeline_content = BaseNode(element=root.find("region").find("node"))
+    assert timeline_content._node.attrib["id"] == "TimelineContent"
+    timeline_phases_container = BaseNode(element=timeline_content._get_children_elements(child_type="TimelinePhases")[0])
+    timeline_phases = TimelinePhases(timeline_phases_element=timeline_phases_container._get_children_elements(child_type="Object")[0])
+    return {x.dialog_node_uuid: x.phase_index for x in timeline_phases.phases}
+
+# ---------------- Scans ----------------
+
+class _SerialExecutor(Executor):
+    # runs each call right away in this process
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+def scan_executor(max_workers: int | None = None) -> Executor:
+    # a process pool, unless there's only one worker to give it
+    worker_count = max_workers if max_workers is not None else (os.cpu_count() or 1)
+    if worker_count <= 1:
+        return _SerialExecutor()
+    return ProcessPoolExecutor(max_workers=worker_count)
+
+class TimelineScan:
+    # starts parsing the EffectComponents on the executor right away, result() waits for them.
+    # a binary .lsf can't be split by bytes, that one is read here in one go
+    def __init__(self, file_path: str, executor: Executor) -> None:
+        self.file_path = file_path
+        self._futures: list[Future] = []
+        self._components: list[EffectComponentSummary | None] = []
+        if file_path.lower().endswith(".lsf"):
+            root = read_lsf(file_path).getroot()
+            effect_components = [x for x in root.iter("node") if x.attrib.get("id") == "EffectComponents"]
+            for container in effect_components:
+                for children in container.findall("children"):
+                    self._components.extend(_summarize_effect_component(x) for x in children)
+            self._phase_index_by_dialog_uuid = _read_phase_index_by_dialog_uuid(root)
+            return
+
+        with open(file_path, "rb") as f:
+            source = f.read()
+        spans = find_effect_component_spans(source)
+        batch: list[bytes] = []
+        batch_size = 0
+        for (start, end) in spans:
+            batch.append(source[start:end])
+            batch_size += end - start
+            if batch_size >= _CHUNK_BATCH_SIZE:
+                self._futures.append(executor.submit(_summarize_chunks, batch))
+                batch = []
+                batch_size = 0
+        if len(batch) > 0:
+            self._futures.append(executor.submit(_summarize_chunks, batch))
+
+        # the rest of the file without the EffectComponents, parsed while the workers are busy
+        if len(spans) > 0:
+            source = source[:spans[0][0]] + source[spans[-1][1]:]
+        self._phase_index_by_dialog_uuid = _read_phase_index_by_dialog_uuid(ET.fromstring(source))
+
+    def result(self) -> TimelineSummary:
+        components = self._components
+        for future in self._futures:
+            components.extend(future.result())
+        return TimelineSummary(
+            file_path=self.file_path,
+            phases=_group_phases([x for x in components if x is not None]),
+            phase_index_by_dialog_uuid=self._phase_index_by_dialog_uuid,
+        )
+
+def scan_timelines(file_paths: list[str], max_workers: int | None = None) -> dict[str, TimelineSummary]:
+    # every file's EffectComponents go into the same pool, so a few big timelines spread over all cores
+    with scan_executor(max_workers=max_workers) as executor:
+        scans = [TimelineScan(file_path=x, executor=executor) for x in file_paths]
+        return {x.file_path: x.result() for x in scans}
+
+def scan_timeline(file_path: str, max_workers: int | None = None) -> TimelineSummary:
+    return scan_timelines([file_path], max_workers=max_workers)[file_path]
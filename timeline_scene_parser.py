@@ -1,8 +1,12 @@
 import xml.etree.ElementTree as ET
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from typing import TypeAlias, Literal
 
-from base_objects import NewTimelinePhasesNode, NewPhasesNode, NewAttribute, BaseNode, create_comment, NewNode, NewBaseNode, Guid, EffectComponentChildType, EffectComponentType,emotions_labels,known_effect_component_child_type, known_effect_component_types
+from base_objects import NewTimelinePhasesNode, NewPhasesNode, NewAttribute, BaseNode, create_comment, append_child, guid_version, NewNode, NewBaseNode, Guid, EffectComponentChildType, EffectComponentType,emotions_labels,known_effect_component_child_type, known_effect_component_types
+from cache_utils import load_cached
+from lsf_writer import write_resource_file
+from lsf_parser import parse_resource_file_with_source
+from lsx_incremental import LsxSource
 from dialog_tree_objects import DialogContent
 from text_utils import TextEntry, TextKey
 VERBOSE = False
@@ -11,6 +15,7 @@ VERBOSE = False
 # ================ Timeilne Scene classes =======================
 @dataclass
 class LightNode(BaseNode):
+    __slots__ = ("light_name", "light_uuid")
     light_name: str
     light_uuid: str
     def __init__(self, element: ET.Element) -> None:
@@ -21,6 +26,7 @@ class LightNode(BaseNode):
 
 @dataclass
 class TimelineSceneLightingSetups(BaseNode):
+    __slots__ = ("lights",)
     lights: list[LightNode]
     def __init__(self, element: ET.Element) -> None:
         assert element.attrib["id"] == "LightingSetups"
@@ -38,6 +44,7 @@ class TimelineSceneLightingSetups(BaseNode):
 
 @dataclass
 class LightObjectLightsNode(BaseNode):
+    __slots__ = ("attach_to", "light_uuid", "light_name", "template_id", "light_type")
     attach_to: int
     light_uuid: Guid
     light_name: str
@@ -55,6 +62,7 @@ class LightObjectLightsNode(BaseNode):
 
 @dataclass
 class LightObjectNode(BaseNode):
+    __slots__ = ("lights", "map_key")
     lights: list[LightObjectLightsNode]
     map_key: Guid
     def __init__(self, element: ET.Element) -> None:
@@ -65,6 +73,7 @@ class LightObjectNode(BaseNode):
 
 @dataclass
 class TimelineSceneLightsNode(BaseNode):
+    __slots__ = ("lights",)
     lights: list[LightObjectNode]
     def __init__(self, element: ET.Element) -> None:
         assert element.attrib["id"] == "Lights"
@@ -73,6 +82,7 @@ class TimelineSceneLightsNode(BaseNode):
 
 @dataclass
 class ActorTransformObjectNode(BaseNode):
+    __slots__ = ("map_key",)
     map_key: str
     def __init__(self, element: ET.Element) -> None:
         assert element.attrib["id"] == "Object"
@@ -82,6 +92,7 @@ class ActorTransformObjectNode(BaseNode):
 
 @dataclass
 class ActorTransformsNode(BaseNode):
+    __slots__ = ("transform_objects",)
     transform_objects: list[ActorTransformObjectNode]
 
     def __init__(self, element: ET.Element) -> None:
@@ -100,6 +111,7 @@ class ActorTransformsNode(BaseNode):
 
 @dataclass
 class ActorNode(BaseNode):
+    __slots__ = ("actor_type", "template_id", "important_for_staging", "transforms")
     actor_type: str
     template_id: str | None
     important_for_staging: str | None
@@ -124,32 +136,48 @@ class ActorNode(BaseNode):
 
 @dataclass
 class TimelineSceneActorsNode(BaseNode):
+    __slots__ = ("actors", "_actors_by_template_id", "_actors_by_template_id_version")
     actors: list[ActorNode]
     def __init__(self, element: ET.Element) -> None:
         assert element.attrib["id"] == "TLActors"
         super().__init__(element=element)
         self.actors = [ActorNode(x) for x in self._get_children_elements("TLActor")] 
         assert len(self.actors) > 4
+        self._actors_by_template_id: dict[str, ActorNode] | None = None
+        self._actors_by_template_id_version: object | None = None
+
+    def get_actors_by_template_id(self) -> dict[str, ActorNode]:
+        # the companion template ids get remapped in place when phases are copied, rebuilt once a guid changed
+        if self._actors_by_template_id is None or self._actors_by_template_id_version is not guid_version(self._node):
+            self._actors_by_template_id = {}
+            for actor in self.actors:
+                if actor.template_id is not None:
+                    self._actors_by_template_id.setdefault(actor.template_id, actor)
+            self._actors_by_template_id_version = guid_version(self._node)
+        return self._actors_by_template_id
 
     def add_actors_node(self, node: ActorNode) -> None:
         if node.template_id is None:
             if VERBOSE:
                 print(f"Not adding actor with empty template id")
             return
-        for actor in self.actors:
-            if actor.template_id == node.template_id:
-                if node.transforms is None:
-                    return
-                print(f"Actor for template {actor.template_id} already exists, combining children instead")
-                for transform_object in node.transforms.transform_objects:
-                    actor.transforms.add_transform(transform_object=transform_object)
+        actors_by_template_id = self.get_actors_by_template_id()
+        actor = actors_by_template_id.get(node.template_id)
+        if actor is not None:
+            if node.transforms is None:
                 return
+            print(f"Actor for template {actor.template_id} already exists, combining children instead")
+            for transform_object in node.transforms.transform_objects:
+                actor.transforms.add_transform(transform_object=transform_object)
+            return
             
         self.add_child_node(node=node._node, child_index=-1, debug_comment="Adding scene actor node")
         self.actors.append(node)
+        actors_by_template_id[node.template_id] = node
 
 @dataclass
 class CamerasChildObjectNode(BaseNode):
+    __slots__ = ("map_key",)
     map_key: str
     def __init__(self, element: ET.Element) -> None:
         super().__init__(element=element)
@@ -157,6 +185,7 @@ class CamerasChildObjectNode(BaseNode):
 
 @dataclass
 class CamerasChildNode(BaseNode):
+    __slots__ = ("node_id", "objects")
     node_id: str
     objects: list[CamerasChildObjectNode]
 
@@ -184,6 +213,7 @@ class NewCamerasChildNode(NewBaseNode):
 
 @dataclass
 class CamerasNode(BaseNode):
+    __slots__ = ("attach_to", "camera_type", "identifier", "look_at", "name", "children")
     attach_to: str | None
     camera_type:str | None
     identifier: Guid
@@ -223,6 +253,7 @@ class CamerasNode(BaseNode):
 
 @dataclass
 class CameraObjectNode(BaseNode):
+    __slots__ = ("map_key", "camera")
     map_key: str
     camera: CamerasNode
     def __init__(self, element: ET.Element) -> None:
@@ -236,65 +267,71 @@ class CameraObjectNode(BaseNode):
 
 @dataclass
 class TimelineSceneCamerasNode(BaseNode):
+    __slots__ = ("cameras", "cameras_by_uuid")
     cameras: list[CameraObjectNode]
+    cameras_by_uuid: dict[Guid, CameraObjectNode]
     def __init__(self, element: ET.Element) -> None:
         assert element.attrib["id"] == "TLCameras"
         super().__init__(element=element)
         self.cameras = [CameraObjectNode(x) for x in self._get_children_elements("Object")]
+        self.cameras_by_uuid = {}
+        for camera in self.cameras:
+            self.cameras_by_uuid.setdefault(camera.map_key, camera)
 
     def add_camera_object(self, camera_node: CameraObjectNode, stage_ids: list[str], pull_in_camera: bool = False) -> None:
         # make sure it doesn't already exist
         camera_uuid = camera_node.map_key
-        for existing_camera in self.cameras:
-            if existing_camera.map_key == camera_uuid:
-                if VERBOSE:
-                    print(f"Not adding camera {camera_uuid} because it already exists, combining children instead for {stage_ids}")
-                for child in camera_node.camera.children:
-                    # get all object nodes for our stages
-                    object_nodes_to_add = []
-                    for object_node in child.objects:
-                        #if object_node.map_key in stage_ids:
-                        object_nodes_to_add.append(object_node)
-                        if VERBOSE:
-                            print(f"Adding child for {object_node.map_key}")
-                    if len(object_nodes_to_add) == 0:
-                        continue
-
-                    node_id = child.node_id
-                    existing_child = existing_camera.camera.get_child(node_id=node_id)
-                    if existing_child is None:
-                        # create child
-                        existing_child = existing_camera.camera.add_child(node_id=node_id)
-                    for object_node in object_nodes_to_add:
-                        existing_child.add_object_node(object_node, cam_name=existing_camera.camera.name)
+        existing_camera = self.cameras_by_uuid.get(camera_uuid)
+        if existing_camera is not None:
+            if VERBOSE:
+                print(f"Not adding camera {camera_uuid} because it already exists, combining children instead for {stage_ids}")
+            for child in camera_node.camera.children:
+                # get all object nodes for our stages
+                object_nodes_to_add = []
+                for object_node in child.objects:
+                    #if object_node.map_key in stage_ids:
+                    object_nodes_to_add.append(object_node)
+                    if VERBOSE:
+                        print(f"Adding child for {object_node.map_key}")
+                if len(object_nodes_to_add) == 0:
+                    continue
+
+                node_id = child.node_id
+                existing_child = existing_camera.camera.get_child(node_id=node_id)
+                if existing_child is None:
+                    # create child
+                    existing_child = existing_camera.camera.add_child(node_id=node_id)
+                for object_node in object_nodes_to_add:
+                    existing_child.add_object_node(object_node, cam_name=existing_camera.camera.name)
                     
-                        if pull_in_camera and node_id == "Transform":
-                            map_value_nodes = object_node._get_children_elements(child_type="MapValue")
-                            for n in map_value_nodes:
-                                map_value_node = BaseNode(n)
-                                position_value = map_value_node.get_attribute_value_nonnil("Position")
-
-                                values = position_value.split(" ")
-                                x = float(values[0])
-                                z = float(values[2])
-                                if x < 0:
-                                    x = max(-2.3, x)
-                                else:
-                                    x = min(2.3, x)
-                                if z < 0:
-                                    z = max(-2.3, z)
-                                else:
-                                    z = min(2,3, z)
-                                values[0] = str(x)
-                                values[2] = str(z)
-                                if VERBOSE:
-                                    print(f"Updating camera position from {position_value} to {values}")
-                                map_value_node.update_value_for_attribute(name="Position", new_value=" ".join(values))
+                    if pull_in_camera and node_id == "Transform":
+                        map_value_nodes = object_node._get_children_elements(child_type="MapValue")
+                        for n in map_value_nodes:
+                            map_value_node = BaseNode(n)
+                            position_value = map_value_node.get_attribute_value_nonnil("Position")
+
+                            values = position_value.split(" ")
+                            x = float(values[0])
+                            z = float(values[2])
+                            if x < 0:
+                                x = max(-2.3, x)
+                            else:
+                                x = min(2.3, x)
+                            if z < 0:
+                                z = max(-2.3, z)
+                            else:
+                                z = min(2,3, z)
+                            values[0] = str(x)
+                            values[2] = str(z)
+                            if VERBOSE:
+                                print(f"Updating camera position from {position_value} to {values}")
+                            map_value_node.update_value_for_attribute(name="Position", new_value=" ".join(values))
 
 
-                return
+            return
         self.add_child_node(node=camera_node._node, child_index=-1)
         self.cameras.append(camera_node)
+        self.cameras_by_uuid[camera_uuid] = camera_node
         if pull_in_camera:
             for child in camera_node.camera.children:
                 node_id = child.node_id
@@ -325,14 +362,12 @@ class TimelineSceneCamerasNode(BaseNode):
                         map_value_node.update_value_for_attribute(name="Position", new_value=" ".join(values))
 
     def get_camera_object(self, camera_uuid: Guid) -> CameraObjectNode | None:
-        for existing_camera in self.cameras:
-            if existing_camera.map_key == camera_uuid:
-                return existing_camera
-        return None
+        return self.cameras_by_uuid.get(camera_uuid)
 
 
 @dataclass
 class SceneNode(BaseNode):
+    __slots__ = ("object_str",)
     object_str: str
     def __init__(self, element: ET.Element) -> None:
         assert element.attrib["id"] == "TLScene"
@@ -341,6 +376,7 @@ class SceneNode(BaseNode):
 
 @dataclass
 class StageNode(BaseNode):
+    __slots__ = ("name", "variation_conditions_id", "variation_target_id", "identifier")
     name: str | None
     variation_conditions_id: str | None
     variation_target_id: str | None
@@ -356,6 +392,7 @@ class StageNode(BaseNode):
 
 @dataclass
 class TimelineSceneContent(BaseNode):
+    __slots__ = ("lighting_setups", "lights", "actors", "cameras", "inherited_scenes", "stages", "_stages_children_container", "_inherited_scenes_children_container", "stages_by_identifier", "inherited_scenes_by_object")
     # todo conditions
     lighting_setups: TimelineSceneLightingSetups
     lights: TimelineSceneLightsNode
@@ -364,8 +401,11 @@ class TimelineSceneContent(BaseNode):
     inherited_scenes: list[SceneNode]
     stages: list[StageNode]
 
-    _stages_children_container: ET.Element = field(init=False)
-    _inherited_scenes_children_container: ET.Element = field(init=False)
+    _stages_children_container: ET.Element
+    _inherited_scenes_children_container: ET.Element
+    # kept in sync by add_stage / add_scene
+    stages_by_identifier: dict[Guid, StageNode]
+    inherited_scenes_by_object: dict[str, SceneNode]
 
     def get_camera_id_to_name_mapping(self) -> dict[str, str]:
         ret = {}
@@ -378,29 +418,24 @@ class TimelineSceneContent(BaseNode):
         return ret
     
     def add_stage(self, stage: StageNode) -> None:
-        for existing_stage in self.stages:
-            if existing_stage.identifier == stage.identifier:
-                if VERBOSE:
-                    print(f"Not adding stage {stage.identifier} because it already exists")
-                return
-        self._stages_children_container.append(stage._node)
+        if stage.identifier in self.stages_by_identifier:
+            if VERBOSE:
+                print(f"Not adding stage {stage.identifier} because it already exists")
+            return
+        append_child(self._stages_children_container, stage._node)
         self.stages.append(stage)
+        self.stages_by_identifier[stage.identifier] = stage
 
     def get_stage(self, stage_id: Guid) -> StageNode | None:
-        for stage in self.stages:
-            if stage.identifier == stage_id:
-                return stage
-        return None
+        return self.stages_by_identifier.get(stage_id)
 
     def add_scene(self, scene: SceneNode) -> None:
-        self._inherited_scenes_children_container.append(scene._node)
-        self.inherited_scenes.append
+        append_child(self._inherited_scenes_children_container, scene._node)
+        self.inherited_scenes.append(scene)
+        self.inherited_scenes_by_object.setdefault(scene.object_str, scene)
     
     def get_scene(self, scene_value: str) -> SceneNode | None:
-        for scene in self.inherited_scenes:
-            if scene.value == scene_value:
-                return scene
-        return None
+        return self.inherited_scenes_by_object.get(scene_value)
 
     def __init__(self, timeline_scenecontent_element: ET.Element):
         super().__init__(element=timeline_scenecontent_element)
@@ -408,11 +443,17 @@ class TimelineSceneContent(BaseNode):
         stage_node = BaseNode(stages_element)
         self._stages_children_container = stage_node._children_element_container
         self.stages = [StageNode(x) for x in stage_node._get_children_elements("TLStage")]
+        self.stages_by_identifier = {}
+        for stage in self.stages:
+            self.stages_by_identifier.setdefault(stage.identifier, stage)
         scenes_element = self._get_children_elements("TLInheritedScenes")[0]
 
         scenes_node =BaseNode(scenes_element)
         self._inherited_scenes_children_container=scenes_node._children_element_container
         self.inherited_scenes = [SceneNode(x) for x in scenes_node._get_children_elements("TLScene")]
+        self.inherited_scenes_by_object = {}
+        for scene in self.inherited_scenes:
+            self.inherited_scenes_by_object.setdefault(scene.object_str, scene)
 
         self.cameras = TimelineSceneCamerasNode(element=self._get_children_elements("TLCameras")[0])
         self.actors = TimelineSceneActorsNode(element=self._get_children_elements("TLActors")[0])
@@ -428,17 +469,22 @@ class TimelineSceneContent(BaseNode):
 class TimelineSceneTree:
     _tree_ref: ET.ElementTree
     content: TimelineSceneContent
+    _source: LsxSource | None = None
 
     @classmethod
-    def create(cls, file_path: str) -> "TimelineSceneTree":
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        assert root.tag == "save"
-        return TimelineSceneTree(_tree_ref=tree, content=TimelineSceneContent(timeline_scenecontent_element=root.find("region").find("node")))
-
-    def write_tree(self, output_file_path: str) -> None:
-        ET.indent(self._tree_ref, space="\t", level=0)
-        self._tree_ref.write(output_file_path, encoding='utf-8', method='xml', xml_declaration=True)
+    def create(cls, file_path: str, use_cache: bool = True) -> "TimelineSceneTree":
+        def parse() -> "TimelineSceneTree":
+            tree, source = parse_resource_file_with_source(file_path)
+            root = tree.getroot()
+            assert root.tag == "save"
+            return TimelineSceneTree(_tree_ref=tree, content=TimelineSceneContent(timeline_scenecontent_element=root.find("region").find("node")), _source=source)
+        if not use_cache:
+            return parse()
+        return load_cached(file_path=file_path, cls=cls, build=parse)
+
+    def write_tree(self, output_file_path: str, incremental: bool = False) -> None:
+        # incremental copies whatever the edits didn't touch straight from the source .lsx
+        write_resource_file(self._tree_ref, output_file_path, source=self._source if incremental else None)
 
 
 
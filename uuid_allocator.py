@@ -0,0 +1,89 @@
+import json
+import os
+import uuid
+import xml.etree.ElementTree as ET
+
+LEDGER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uuid_ledgers")
+
+class UuidAllocator:
+    # hands out uuids for one mod, either from a pregenerated pool (in order, so rebuilding a mod gives the same ids)
+    # or as uuid5 of the mod namespace and a stable key. everything handed out gets recorded in a json ledger per mod
+    def __init__(self, mod_name: str, pregenerated: list[str] | None = None, namespace: uuid.UUID | None = None, ledger_path: str | None = None) -> None:
+        self.mod_name = mod_name
+        self._pregenerated = pregenerated or []
+        assert len(set(self._pregenerated)) == len(self._pregenerated), "No dups"
+        self._cursor = 0
+        self.namespace = namespace or uuid.uuid5(uuid.NAMESPACE_URL, f"bg3-dialog-timeline-edits/{mod_name}")
+        self.ledger_path = ledger_path or os.path.join(LEDGER_DIR, f"{mod_name}.json")
+        # uuid -> key it was made from, or None for pregenerated ones
+        self._issued: dict[str, str | None] = {}
+
+    def remaining(self) -> int:
+        return len(self._pregenerated) - self._cursor
+
+    def pop_one_uuid(self) -> str:
+        assert self._cursor < len(self._pregenerated)
+        one = self._pregenerated[self._cursor]
+        self._cursor += 1
+        self._issued[one] = None
+        return one
+
+    def pop_n_uuids(self, n: int) -> list[str]:
+        assert self.remaining() >= n
+        n_uuids = self._pregenerated[self._cursor:self._cursor + n]
+        self._cursor += n
+        for one in n_uuids:
+            self._issued[one] = None
+        return n_uuids
+
+    def uuid_for_key(self, key: str) -> str:
+        # same key always gives the same uuid for this mod
+        one = str(uuid.uuid5(self.namespace, key))
+        existing_key = self._issued.get(one, key)
+        assert existing_key == key, f"{one} was already issued for {existing_key}, not {key}"
+        self._issued[one] = key
+        return one
+
+    # ================ Collisions ================
+
+    def find_collisions(self, trees: list) -> set[str]:
+        # all uuids this allocator can, did or did in an earlier run (per the ledger) hand out that already show up as
+        # an attribute value in one of the trees. run it on freshly loaded trees, before anything got added to them
+        candidates = set(x.lower() for x in self._pregenerated[self._cursor:])
+        candidates.update(x.lower() for x in self._issued.keys())
+        candidates.update(x.lower() for x in self.load_ledger().keys())
+        collisions: set[str] = set()
+        for tree in trees:
+            root = tree._tree_ref.getroot() if hasattr(tree, "_tree_ref") else tree
+            assert isinstance(root, ET.Element)
+            values = set(e.get("value", "").lower() for e in root.iter("attribute"))
+            collisions.update(candidates & values)
+        return collisions
+
+    def assert_no_collisions(self, trees: list) -> None:
+        collisions = self.find_collisions(trees)
+        assert len(collisions) == 0, f"{len(collisions)} uuids of {self.mod_name} already exist in the loaded trees: {sorted(collisions)[:10]}"
+
+    # ================ Ledger ================
+
+    def load_ledger(self) -> dict[str, str | None]:
+        if not os.path.exists(self.ledger_path):
+            return {}
+        with open(self.ledger_path, "r", encoding="utf-8") as f:
+            ledger = json.load(f)
+        assert ledger["mod_name"] == self.mod_name
+        # keyed uuids from a ledger with another namespace wouldn't come out the same again
+        assert ledger.get("namespace", str(self.namespace)) == str(self.namespace), f"{self.ledger_path} was written for namespace {ledger['namespace']}, not {self.namespace}"
+        return ledger["issued"]
+
+    def save_ledger(self) -> None:
+        # merged with what earlier runs issued, so the ledger lists every id the mod ever used
+        issued = self.load_ledger()
+        for one, key in self._issued.items():
+            assert issued.get(one, key) == key, f"{one} was issued for {issued[one]} before, now for {key}"
+            issued[one] = key
+        os.makedirs(os.path.dirname(self.ledger_path), exist_ok=True)
+        tmp_path = f"{self.ledger_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"mod_name": self.mod_name, "namespace": str(self.namespace), "issued": issued}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.ledger_path)